@@ -45,7 +45,7 @@ from dotenv import load_dotenv
 env_path = Path(__file__).parent.parent / "rapport_extraktor" / ".env"
 load_dotenv(env_path)
 
-from pipeline import extract_pdf_multi_pass
+from pipeline import extract_pdf_multi_pass, get_anthropic_client
 from pipeline_mistral_v2 import extract_pdf_mistral_v2, get_mistral_client
 from excel_builder import build_databook
 from supabase_client import (
@@ -64,7 +64,6 @@ from extraction_log import (
     get_embedding_stats,
     collect_all_errors,
 )
-from anthropic import AsyncAnthropic
 
 # ============================================
 # APP CONFIG
@@ -156,14 +155,11 @@ async def save_pdf_file(content: bytes, filename: str, job_id: str) -> str:
             file_options={"content-type": "application/pdf"}
         )
 
-        # Ladda ner till temp-fil för extraktion
+        # Lokal kopia för hash/retry/Excel - vi har redan innehållet, ingen nedladdning
         temp_dir = tempfile.mkdtemp()
         local_path = os.path.join(temp_dir, filename)
-
-        # Hämta filen tillbaka
-        data = client.storage.from_(STORAGE_BUCKET).download(storage_path)
         with open(local_path, "wb") as f:
-            f.write(data)
+            f.write(content)
 
         return local_path
     else:
@@ -175,6 +171,22 @@ async def save_pdf_file(content: bytes, filename: str, job_id: str) -> str:
         return pdf_path
 
 
+def get_pdf_url(job_id: str, filename: str) -> str | None:
+    """
+    Signerad URL till uppladdad PDF (None vid lokal lagring).
+    Låter Anthropic hämta PDF:en själv istället för att vi skickar base64.
+    """
+    if not USE_CLOUD_STORAGE:
+        return None
+    try:
+        client = get_client()
+        url = client.storage.from_(STORAGE_BUCKET).create_signed_url(f"uploads/{job_id}/{filename}", 3600)
+        return url.get("signedURL")
+    except Exception as e:
+        print(f"[WARNING] Kunde inte skapa signerad URL, använder base64: {e}")
+        return None
+
+
 async def save_excel_file(local_path: str, job_id: str, filename: str) -> str:
     """
     Spara Excel-fil lokalt eller i Supabase Storage.
@@ -366,14 +378,15 @@ async def run_extraction(job_id: str, pdf_path: str, company_name: str, filename
             if not api_key:
                 raise ValueError("ANTHROPIC_API_KEY saknas")
 
-            client = AsyncAnthropic(api_key=api_key, timeout=300)
+            client = get_anthropic_client(api_key)
             result = await extract_pdf_multi_pass(
                 pdf_path=pdf_path,
                 client=client,
                 semaphore=semaphore,
                 company_id=company_id,
                 progress_callback=on_progress,
-                use_cache=True
+                use_cache=True,
+                pdf_url=get_pdf_url(job_id, filename),
             )
 
         # Skapa Excel
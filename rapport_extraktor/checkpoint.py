@@ -6,6 +6,7 @@ från där den slutade istället för att börja om från början.
 """
 
 import json
+import os
 from pathlib import Path
 from datetime import datetime
 from typing import TypedDict
@@ -30,6 +31,19 @@ def get_checkpoint_file() -> Path:
     return DEFAULT_CHECKPOINT_FILE
 
 
+def _write_checkpoints(data: dict[str, CheckpointData]) -> None:
+    """
+    Skriv checkpoint-filen atomiskt (skriv till temp, sedan rename).
+
+    Temp-filen är unik per process så att två samtidiga körningar inte
+    skriver över varandras halvfärdiga filer.
+    """
+    checkpoint_file = get_checkpoint_file()
+    temp_file = checkpoint_file.with_suffix(f".{os.getpid()}.tmp")
+    temp_file.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(temp_file, checkpoint_file)
+
+
 def save_checkpoint(
     batch_id: str,
     completed: list[str],
@@ -49,8 +63,6 @@ def save_checkpoint(
         total_files: Totalt antal filer i batchen
         batch_started: Tidsstämpel när batchen startade
     """
-    checkpoint_file = get_checkpoint_file()
-
     # Ladda befintlig data
     data = load_all_checkpoints()
 
@@ -64,10 +76,7 @@ def save_checkpoint(
         batch_started=batch_started or datetime.now().isoformat()
     )
 
-    # Spara atomiskt (skriv till temp, sedan rename)
-    temp_file = checkpoint_file.with_suffix(".tmp")
-    temp_file.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
-    temp_file.replace(checkpoint_file)
+    _write_checkpoints(data)
 
 
 def load_all_checkpoints() -> dict[str, CheckpointData]:
@@ -179,13 +188,54 @@ def add_failed_file(
         )
 
 
+def add_files(
+    batch_id: str,
+    completed: list[str],
+    failed: list[dict],
+    total_files: int = 0
+) -> None:
+    """
+    Lägg till flera färdiga/misslyckade filer med en enda läsning och skrivning.
+
+    Args:
+        batch_id: Batch-ID
+        completed: Sökvägar till färdiga filer
+        failed: Dicts {path, error, timestamp} för misslyckade filer
+        total_files: Totalt antal filer i batchen
+    """
+    checkpoint = load_checkpoint(batch_id) or {}
+
+    all_completed = checkpoint.get("completed", [])
+    known = set(all_completed)
+    for file_path in completed:
+        if file_path not in known:
+            all_completed.append(file_path)
+            known.add(file_path)
+
+    all_failed = checkpoint.get("failed", [])
+    failed_paths = {f["path"] for f in all_failed}
+    for entry in failed:
+        if entry["path"] not in failed_paths:
+            all_failed.append(entry)
+            failed_paths.add(entry["path"])
+
+    last = failed[-1]["path"] if failed else (completed[-1] if completed else None)
+    save_checkpoint(
+        batch_id=batch_id,
+        completed=all_completed,
+        failed=all_failed,
+        last_file=last or checkpoint.get("last_file"),
+        total_files=total_files or checkpoint.get("total_files", 0),
+        batch_started=checkpoint.get("batch_started")
+    )
+
+
 def clear_checkpoint(batch_id: str) -> None:
     """Ta bort checkpoint för en specifik batch."""
     data = load_all_checkpoints()
     if batch_id in data:
         del data[batch_id]
-        checkpoint_file = get_checkpoint_file()
-        checkpoint_file.write_text(json.dumps(data, indent=2, ensure_ascii=False))
+        _write_checkpoints(data)
 
 
 def clear_all_checkpoints() -> None:
@@ -6,14 +6,44 @@ Förenklad version - endast resultaträkning, balansräkning och kassaflöde.
 Inkluderar AI-driven radnormalisering för att matcha liknande radnamn mellan kvartal.
 """
 
+import datetime
+import functools
 import json
 import os
 import re
+from collections import Counter
+from itertools import islice
+from zipfile import ZipFile, ZIP_DEFLATED
 
 from openpyxl import Workbook
+from openpyxl.chart.shapes import GraphicalProperties
+from openpyxl.drawing.line import LineProperties
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
+from openpyxl.writer.excel import ExcelWriter
 
+# Kvartalsperiod, t.ex. "Q3 2025"
+_QUARTER_PERIOD_RE = re.compile(r'Q(\d)\s*(\d{4})')
+
+# Bullet-rad ("• ", "- ", "* ", "– ") - fångar upp till 50 tecken efter bulleten
+_BULLET_RE = re.compile(r'^[^\S\n]*[•\-*–] (.{0,50})', re.M)
+
+# Kandidatrad för "första meningen": minst 51 tecken och innehåller punkt eller bullet
+_SENTENCE_LINE_RE = re.compile(r'^[^\S\n]*(?=.*[.•])(.{51,})$', re.M)
+
+# Summarader, och bland dem balansräkningens totaler (tillgångar/skulder)
+_SUM_ROW_RE = re.compile(r'summa|total')
+_BALANCE_TOTAL_RE = re.compile(r'tillgångar|skulder')
+
+# Låg zlib-nivå vid sparning - databöcker är små och sparas ofta,
+# så CPU-tid väger tyngre än några extra kB på disk
+XLSX_COMPRESS_LEVEL = 1
+
+# Kolumnbokstäver A..ZZ indexerade på 1-baserat kolumnnummer (index 0 = "")
+COLUMN_LETTERS = ("",) + tuple(get_column_letter(i) for i in range(1, 703))
+
+
+@functools.lru_cache(maxsize=1024)
 def sanitize_sheet_name(name: str) -> str:
     """Sanera fliknamn för Excel (tar bort ogiltiga tecken)."""
     if not name:
@@ -27,6 +57,19 @@ def sanitize_sheet_name(name: str) -> str:
     return sanitized[:31]
 
 
+def save_workbook(wb: Workbook, output_path: str) -> None:
+    """
+    Spara arbetsbok med snabb komprimering.
+
+    Motsvarar wb.save() men öppnar ZIP-arkivet själv så att
+    komprimeringsnivån kan sänkas (openpyxl använder zlib-standard).
+    """
+    wb.properties.modified = datetime.datetime.now(tz=datetime.timezone.utc).replace(tzinfo=None)
+    archive = ZipFile(output_path, 'w', ZIP_DEFLATED, allowZip64=True, compresslevel=XLSX_COMPRESS_LEVEL)
+    ExcelWriter(wb, archive).save()
+
+
+@functools.lru_cache(maxsize=4096)
 def normalize_row_name(name: str) -> str:
     """Normalisera radnamn för matchning mellan perioder."""
     if not name:
@@ -133,6 +176,8 @@ LABEL_FONT = Font(name='Arial', size=9, color=GS_DARK_GRAY)
 DATA_FONT = Font(name='Arial', size=9, color=COLOR_HARDCODED)
 TOTAL_FONT = Font(name='Arial', size=9, bold=True, color=GS_BLACK)
 SUBTOTAL_FONT = Font(name='Arial', size=9, bold=True, color=GS_DARK_GRAY)
+SUBTOTAL_DATA_FONT = Font(name='Arial', size=9, bold=True, color=COLOR_HARDCODED)  # Värdeceller i summarader
+TOTAL_DATA_FONT = SUBTOTAL_DATA_FONT
 SOURCE_FONT = Font(name='Arial', size=7, italic=True, color="808080")
 
 # Fyllningar
@@ -160,6 +205,69 @@ INDENT_ALIGN = Alignment(horizontal='left', vertical='center', indent=2)
 NUMBER_FORMAT = '#,##0_);(#,##0);"-"_)'
 PERCENT_FORMAT = '0.0%_);(0.0%)'
 
+# Cellstilar per radtyp: (etikettcell, värdecell), där varje stil är
+# (font, fill, border, alignment, number_format) och None lämnar attributet orört
+ROW_STYLES = {
+    "section": (
+        (SECTION_FONT, None, SECTION_BORDER, LEFT_ALIGN, None),
+        (SECTION_FONT, None, SECTION_BORDER, LEFT_ALIGN, None),
+    ),
+    "subtotal": (
+        (SUBTOTAL_FONT, SUBTOTAL_FILL, SUBTOTAL_BORDER, LEFT_ALIGN, None),
+        (SUBTOTAL_DATA_FONT, SUBTOTAL_FILL, SUBTOTAL_BORDER, RIGHT_ALIGN, NUMBER_FORMAT),
+    ),
+    "total": (
+        (TOTAL_FONT, TOTAL_FILL, TOTAL_BORDER, LEFT_ALIGN, None),
+        (TOTAL_DATA_FONT, TOTAL_FILL, TOTAL_BORDER, RIGHT_ALIGN, NUMBER_FORMAT),
+    ),
+    "data": (
+        (LABEL_FONT, None, NO_BORDER, INDENT_ALIGN, None),
+        (DATA_FONT, None, NO_BORDER, RIGHT_ALIGN, NUMBER_FORMAT),
+    ),
+}
+
+# Tabelltyper i flikordning med respektive fliknamn
+TABLE_TYPE_SHEETS = (
+    ("income_statement", "Resultaträkning"),
+    ("balance_sheet", "Balansräkning"),
+    ("cash_flow", "Kassaflöde"),
+    ("kpi", "Nyckeltal"),
+    ("segment", "Segment"),
+    ("other", "Övrigt"),
+)
+
+# Delade serie-stilar för grafer - samma objekt återanvänds av alla serier
+NAVY_BAR_PROPS = GraphicalProperties(solidFill=GS_NAVY, ln=LineProperties(noFill=True))
+NAVY_AREA_PROPS = GraphicalProperties(solidFill=GS_NAVY, ln=LineProperties(solidFill=GS_NAVY, w=12700))  # 1pt linje
+NAVY_LINE_PROPS = GraphicalProperties(ln=LineProperties(solidFill=GS_NAVY, w=28575))  # 2.25pt
+NAVY_MARKER_PROPS = GraphicalProperties(solidFill=GS_NAVY, ln=LineProperties(solidFill=GS_NAVY))
+
+
+def style_line_series(series):
+    """Linjefärg navy, tjockare linje och cirkelmarkörer."""
+    series.graphicalProperties = NAVY_LINE_PROPS
+    series.smooth = False
+    series.marker.symbol = "circle"
+    series.marker.size = 7
+    series.marker.graphicalProperties = NAVY_MARKER_PROPS
+
+
+def style_area_series(series):
+    """Ytdiagram - navy fyllning och tunn navy kantlinje."""
+    series.graphicalProperties = NAVY_AREA_PROPS
+
+
+def style_bar_series(series):
+    """Staplar - solid navy fyllning utan kantlinje."""
+    series.graphicalProperties = NAVY_BAR_PROPS
+
+
+# Serie-stil per graftyp (övriga typer ritas som staplar, pie färgsätts per datapunkt)
+CHART_SERIES_STYLERS = {
+    "line": style_line_series,
+    "area": style_area_series,
+}
+
 # Font för periodavdelare
 PERIOD_SEPARATOR_FONT = Font(name='Arial', size=12, bold=True, color="FFFFFF")
 PERIOD_SEPARATOR_FILL = PatternFill(start_color=GS_NAVY, end_color=GS_NAVY, fill_type="solid")
@@ -219,16 +327,35 @@ def sort_by_period(data: list[dict]) -> list[dict]:
     def period_key(item):
         period = item.get("metadata", {}).get("period", "")
         # Extrahera Q-nummer och år
-        match = re.search(r'Q(\d)\s*(\d{4})', period)
+        match = _QUARTER_PERIOD_RE.search(period)
         if match:
             quarter = int(match.group(1))
             year = int(match.group(2))
             return (year, quarter)
         return (0, 0)
 
+    # sorted() anropar key-funktionen exakt en gång per element
     return sorted(data, key=period_key)
 
 
+def index_period_rows(data_list: list[dict], data_key: str) -> list[dict[str, tuple[str, dict]]]:
+    """
+    Indexera raderna i varje period på normaliserat radnamn.
+
+    Returnerar en dict per period: normaliserat namn -> (originalnamn, rad).
+    Första förekomsten inom en period vinner och periodens radordning bevaras.
+    """
+    period_maps = []
+    for item in data_list:
+        row_map = {}
+        for row in item.get(data_key, []):
+            row_name = row.get("rad") or row.get("namn") or row.get("region", "")
+            if row_name:
+                row_map.setdefault(normalize_row_name(row_name), (row_name, row))
+        period_maps.append(row_map)
+    return period_maps
+
+
 def collect_all_rows(data_list: list[dict], data_key: str) -> list[str]:
     """
     Samla alla unika radnamn från alla perioder med smart ordning.
@@ -238,12 +365,15 @@ def collect_all_rows(data_list: list[dict], data_key: str) -> list[str]:
     2. När nya rader dyker upp i senare kvartal, försök placera dem
        på rätt position baserat på omgivande rader
     3. Normalisera radnamn för jämförelse (t.ex. "receivables" -> "receivable")
+
+    Går igenom periodernas råa rader (inte index_period_rows) - upprepade
+    radnamn inom en period påverkar vilken rad nya rader placeras efter.
     """
     if not data_list:
         return []
 
     # Samla alla rader med normaliserade namn för jämförelse
-    # Key: normaliserat namn, Value: (originalnamn, första_index_per_period)
+    # Key: normaliserat namn, Value: originalnamn
     seen_normalized = {}
 
     # Bygg ordnad lista baserad på alla perioders ordning
@@ -253,7 +383,7 @@ def collect_all_rows(data_list: list[dict], data_key: str) -> list[str]:
         rows = item.get(data_key, [])
         prev_normalized = None
 
-        for row_idx, row in enumerate(rows):
+        for row in rows:
             row_name = row.get("rad") or row.get("namn") or row.get("region", "")
             if not row_name:
                 continue
@@ -292,56 +422,42 @@ def detect_row_type(row_data: dict, row_name: str) -> str:
     Detektera radtyp baserat på data och namn.
     """
     # Explicit typ från extraktionen
-    if row_data.get("typ") == "total":
-        return "total"
-    if row_data.get("typ") == "subtotal":
-        return "subtotal"
+    explicit_type = row_data.get("typ")
+    if explicit_type in ("total", "subtotal"):
+        return explicit_type
 
-    # Detektera baserat på nyckelord
+    # Detektera baserat på nyckelord ("netto"/"resultat efter" ger vanlig datarad,
+    # bara summa-/totalrader stylas)
     name_lower = row_name.lower()
-
-    total_keywords = ["summa", "total", "netto", "resultat efter"]
-    if any(kw in name_lower for kw in total_keywords):
-        if "summa" in name_lower or "total" in name_lower:
-            return "total" if "tillgångar" in name_lower or "skulder" in name_lower else "subtotal"
+    if _SUM_ROW_RE.search(name_lower):
+        return "total" if _BALANCE_TOTAL_RE.search(name_lower) else "subtotal"
 
     return "data"
 
 
-def apply_row_style(ws, row_num: int, num_cols: int, row_type: str, row_name: str):
+def apply_row_style(ws, row_num: int, num_cols: int, row_type: str, row_name: str, values: list | None = None):
     """
     Applicera stil på en rad baserat på typ.
+
+    Om values anges skrivs värdena i samma pass som stilen, så att varje
+    cell bara slås upp en gång.
     """
+    values = values or ()
+    num_values = len(values)
+    # Okända radtyper (från extraktionen) stylas som vanliga datarader
+    label_style, value_style = ROW_STYLES.get(row_type if isinstance(row_type, str) else "data", ROW_STYLES["data"])
+
     for col in range(1, num_cols + 1):
-        cell = ws.cell(row=row_num, column=col)
-
-        if row_type == "section":
-            cell.font = SECTION_FONT
-            cell.border = SECTION_BORDER
-            cell.alignment = LEFT_ALIGN
-        elif row_type == "subtotal":
-            cell.fill = SUBTOTAL_FILL
-            cell.border = SUBTOTAL_BORDER
-            cell.font = SUBTOTAL_FONT if col == 1 else Font(name='Arial', size=9, bold=True, color=COLOR_HARDCODED)
-            cell.alignment = LEFT_ALIGN if col == 1 else RIGHT_ALIGN
-            if col > 1:
-                cell.number_format = NUMBER_FORMAT
-        elif row_type == "total":
-            cell.fill = TOTAL_FILL
-            cell.border = TOTAL_BORDER
-            cell.font = TOTAL_FONT if col == 1 else Font(name='Arial', size=9, bold=True, color=COLOR_HARDCODED)
-            cell.alignment = LEFT_ALIGN if col == 1 else RIGHT_ALIGN
-            if col > 1:
-                cell.number_format = NUMBER_FORMAT
-        else:  # data
-            cell.border = NO_BORDER
-            if col == 1:
-                cell.font = LABEL_FONT
-                cell.alignment = INDENT_ALIGN
-            else:
-                cell.font = DATA_FONT
-                cell.alignment = RIGHT_ALIGN
-                cell.number_format = NUMBER_FORMAT
+        cell = ws.cell(row=row_num, column=col, value=values[col - 1] if col <= num_values else None)
+        font, fill, border, alignment, number_format = label_style if col == 1 else value_style
+
+        cell.font = font
+        cell.border = border
+        cell.alignment = alignment
+        if fill is not None:
+            cell.fill = fill
+        if number_format is not None:
+            cell.number_format = number_format
 
 
 def populate_financial_sheet(
@@ -357,7 +473,7 @@ def populate_financial_sheet(
     num_periods = len(periods)
 
     # Titel
-    ws.merge_cells(f'A1:{get_column_letter(num_periods + 1)}1')
+    ws.merge_cells(f'A1:{COLUMN_LETTERS[num_periods + 1]}1')
     ws['A1'] = company_name.upper()
     ws['A1'].font = TITLE_FONT
     ws['A1'].alignment = LEFT_ALIGN
@@ -368,7 +484,7 @@ def populate_financial_sheet(
         "balansrakning": "Balansräkning",
         "kassaflodesanalys": "Kassaflödesanalys",
     }
-    ws.merge_cells(f'A2:{get_column_letter(num_periods + 1)}2')
+    ws.merge_cells(f'A2:{COLUMN_LETTERS[num_periods + 1]}2')
     ws['A2'] = titles.get(data_key, data_key.replace("_", " ").title())
     ws['A2'].font = SUBTITLE_FONT
 
@@ -389,38 +505,24 @@ def populate_financial_sheet(
     valuta = data_list[0].get("metadata", {}).get("valuta", "TSEK") if data_list else "TSEK"
     ws.cell(row=4, column=1, value=valuta)
 
-    # Samla alla radnamn
+    # Radordning från periodernas råa rader, index per period för värdeuppslag
     all_rows = collect_all_rows(data_list, data_key)
+    period_maps = index_period_rows(data_list, data_key)
 
     # Skriv data
     current_row = 6
-    row_name_normalized = normalize_row_name  # Referens för snabbare anrop
 
-    for row_name in all_rows:
+    for row_name, target_norm in zip(all_rows, map(normalize_row_name, all_rows)):
         # Hämta värden för varje period
-        values = [row_name]
-        row_data = {}
-        target_norm = row_name_normalized(row_name)
-
-        for item in data_list:
-            rows = item.get(data_key, [])
-            value = None
-            for r in rows:
-                r_name = r.get("rad") or r.get("namn") or r.get("region", "")
-                # Använd normaliserad jämförelse för att matcha liknande radnamn
-                if row_name_normalized(r_name) == target_norm:
-                    value = r.get("varde")
-                    row_data = r
-                    break
-            values.append(value)
-
-        # Skriv rad
-        for col, val in enumerate(values, 1):
-            ws.cell(row=current_row, column=col, value=val)
-
-        # Detektera och applicera stil
+        # Använd normaliserad jämförelse för att matcha liknande radnamn
+        matches = [row_map.get(target_norm) for row_map in period_maps]
+        values = [row_name, *(match[1].get("varde") if match else None for match in matches)]
+        # Stil bestäms av senaste periodens rad
+        row_data = next((match[1] for match in reversed(matches) if match), {})
+
+        # Detektera stil och skriv rad
         row_type = detect_row_type(row_data, row_name)
-        apply_row_style(ws, current_row, num_periods + 1, row_type, row_name)
+        apply_row_style(ws, current_row, num_periods + 1, row_type, row_name, values)
 
         current_row += 1
 
@@ -431,7 +533,7 @@ def populate_financial_sheet(
     # Kolumnbredder
     ws.column_dimensions['A'].width = 36
     for col in range(2, num_periods + 2):
-        ws.column_dimensions[get_column_letter(col)].width = 14
+        ws.column_dimensions[COLUMN_LETTERS[col]].width = 14
 
     # Frys rubriker
     ws.freeze_panes = 'A5'
@@ -454,44 +556,38 @@ def populate_notes_sheet(ws, data_list: list[dict], company_name: str):
 
     current_row = 4
 
-    # Samla alla noter från alla perioder
+    # Samla alla noter från alla perioder - bara senaste versionen av varje not
+    # behövs, så senare perioder skriver över tidigare (data_list är sorterad)
     all_notes = {}
     for item in data_list:
-        period = item.get("metadata", {}).get("period", "?")
         for note in item.get("noter", []):
             note_num = note.get("nummer", 0)
             if note_num not in all_notes:
-                all_notes[note_num] = {
-                    "titel": note.get("titel", ""),
-                    "perioder": {}
-                }
-            all_notes[note_num]["perioder"][period] = note
+                all_notes[note_num] = {"titel": note.get("titel", "")}
+            all_notes[note_num]["latest"] = note
 
     # Skriv noter
     for note_num in sorted(all_notes.keys()):
         note_info = all_notes[note_num]
 
         # Not-rubrik
-        ws.cell(row=current_row, column=1, value=f"Not {note_num}: {note_info['titel']}")
-        ws.cell(row=current_row, column=1).font = SECTION_FONT
+        ws.cell(row=current_row, column=1, value=f"Not {note_num}: {note_info['titel']}").font = SECTION_FONT
         current_row += 1
 
         # Tabeller från noten (ta från senaste period)
-        if note_info["perioder"]:
-            latest_note = list(note_info["perioder"].values())[-1]
+        latest_note = note_info["latest"]
+        if latest_note:
             for table in latest_note.get("tabeller", []):
                 # Tabellrubrik
-                ws.cell(row=current_row, column=1, value=table.get("rubrik", ""))
-                ws.cell(row=current_row, column=1).font = SUBTOTAL_FONT
+                ws.cell(row=current_row, column=1, value=table.get("rubrik", "")).font = SUBTOTAL_FONT
                 current_row += 1
 
                 # Tabellrader
                 for rad in table.get("rader", []):
-                    ws.cell(row=current_row, column=1, value=rad.get("rad", ""))
-                    ws.cell(row=current_row, column=2, value=rad.get("varde"))
-                    ws.cell(row=current_row, column=1).font = LABEL_FONT
-                    ws.cell(row=current_row, column=2).font = DATA_FONT
-                    ws.cell(row=current_row, column=2).number_format = NUMBER_FORMAT
+                    ws.cell(row=current_row, column=1, value=rad.get("rad", "")).font = LABEL_FONT
+                    value_cell = ws.cell(row=current_row, column=2, value=rad.get("varde"))
+                    value_cell.font = DATA_FONT
+                    value_cell.number_format = NUMBER_FORMAT
                     current_row += 1
 
         current_row += 1
@@ -613,9 +709,10 @@ def populate_dynamic_table_sheet(
         values_have_unit_columns = (num_values_in_data >= num_value_cols_in_header)
 
         # Header-rad
-        ws.cell(row=current_row, column=1, value="").font = HEADER_FONT
-        ws.cell(row=current_row, column=1).fill = HEADER_FILL
-        ws.cell(row=current_row, column=1).border = HEADER_BORDER
+        cell = ws.cell(row=current_row, column=1, value="")
+        cell.font = HEADER_FONT
+        cell.fill = HEADER_FILL
+        cell.border = HEADER_BORDER
 
         for col_idx, col_name in enumerate(value_columns, 2):
             cell = ws.cell(row=current_row, column=col_idx, value=col_name)
@@ -634,25 +731,19 @@ def populate_dynamic_table_sheet(
             values = row_data.get("values", [])
             row_type = row_data.get("type", "data")
 
-            # Radnamn
-            ws.cell(row=current_row, column=1, value=label)
-
             # Värden - hantera skillnaden mellan headers och values
             # values[0] är alltid label, values[1:] är faktiska värden
             # Om values-arrayen har färre element än headers (enhetskolumner saknas i data),
             # filtrera INTE värden, bara headers
             if skip_col_indices and values_have_unit_columns:
                 # Values har motsvarande enhetskolumner - filtrera bort dem
-                filtered_values = [v for i, v in enumerate(values[1:]) if i not in skip_col_indices]
+                filtered_values = (v for i, v in enumerate(islice(values, 1, None)) if i not in skip_col_indices)
             else:
                 # Values saknar enhetskolumner - använd alla värden direkt
-                filtered_values = values[1:]
-            for val_idx, value in enumerate(filtered_values):
-                if val_idx + 2 <= num_cols:
-                    ws.cell(row=current_row, column=val_idx + 2, value=value)
-
-            # Applicera stil
-            apply_row_style(ws, current_row, num_cols, row_type, label)
+                filtered_values = islice(values, 1, None)
+            # Radnamn + värden (som ryms i tabellens kolumner) skrivs tillsammans med stilen
+            row_values = [label, *islice(filtered_values, num_cols - 1)]
+            apply_row_style(ws, current_row, num_cols, row_type, label, row_values)
             current_row += 1
 
         # Mellanrum mellan tabeller
@@ -664,7 +755,7 @@ def populate_dynamic_table_sheet(
     # Kolumnbredder
     ws.column_dimensions['A'].width = 45
     for col in range(2, 10):  # Max 8 värdekolumner
-        ws.column_dimensions[get_column_letter(col)].width = 18
+        ws.column_dimensions[COLUMN_LETTERS[col]].width = 18
 
     ws.sheet_view.showGridLines = False
 
@@ -849,8 +940,6 @@ def populate_charts_sheet(ws, data_list: list[dict], company_name: str):
     from openpyxl.chart.series import DataPoint
     from openpyxl.chart.label import DataLabelList
     from openpyxl.drawing.fill import PatternFillProperties, ColorChoice
-    from openpyxl.chart.shapes import GraphicalProperties
-    from openpyxl.drawing.line import LineProperties
     from openpyxl.chart.text import RichText
     from openpyxl.drawing.text import Paragraph, ParagraphProperties, CharacterProperties, Font as DrawingFont
 
@@ -882,7 +971,6 @@ def populate_charts_sheet(ws, data_list: list[dict], company_name: str):
     ws['A2'].font = SUBTITLE_FONT
 
     current_row = 4
-    chart_count = 0
 
     # Kolla om det är multi-period (för periodavdelare)
     is_multi_period = len(data_list) > 1
@@ -956,7 +1044,6 @@ def populate_charts_sheet(ws, data_list: list[dict], company_name: str):
 
             if chart_type == "pie":
                 # Cirkeldiagram - Goldman Sachs stil
-                from openpyxl.chart.series import DataPoint
                 excel_chart = PieChart()
                 labels = Reference(ws, min_col=1, min_row=data_start_row + 1, max_row=data_end_row)
                 data_ref = Reference(ws, min_col=2, min_row=data_start_row, max_row=data_end_row)
@@ -976,13 +1063,14 @@ def populate_charts_sheet(ws, data_list: list[dict], company_name: str):
                 # Sätt färger på varje sektor
                 if excel_chart.series:
                     series = excel_chart.series[0]
-                    num_points = len(data_points)
-                    for i in range(num_points):
+                    pie_points = []
+                    for i in range(len(data_points)):
                         pt = DataPoint(idx=i)
-                        color = pie_colors[i % len(pie_colors)]
-                        pt.graphicalProperties.solidFill = color
+                        pt.graphicalProperties.solidFill = pie_colors[i % len(pie_colors)]
                         pt.graphicalProperties.line.noFill = True
-                        series.data_points.append(pt)
+                        pie_points.append(pt)
+                    # Tilldela hela listan på en gång (Sequence-descriptorn validerar vid tilldelning)
+                    series.data_points = pie_points
 
             elif chart_type == "line":
                 # Linjediagram - Goldman Sachs stil
@@ -1057,38 +1145,16 @@ def populate_charts_sheet(ws, data_list: list[dict], company_name: str):
             excel_chart.plot_area.layout = None
 
             # Sätt färger på serier EFTER att data lagts till
-            if excel_chart.series:
+            if chart_type != "pie":
+                style_series = CHART_SERIES_STYLERS.get(chart_type, style_bar_series)
                 for s in excel_chart.series:
-                    if chart_type == "line":
-                        # Linjefärg navy, tjockare linje
-                        s.graphicalProperties.line.solidFill = GS_NAVY
-                        s.graphicalProperties.line.width = 28575  # 2.25pt
-                        s.smooth = False
-                        # Markörpunkter
-                        s.marker.symbol = "circle"
-                        s.marker.size = 7
-                        s.marker.graphicalProperties.solidFill = GS_NAVY
-                        s.marker.graphicalProperties.line.solidFill = GS_NAVY
-                    elif chart_type == "area":
-                        # Ytdiagram - navy fyllning med lite transparens
-                        s.graphicalProperties.solidFill = GS_NAVY
-                        s.graphicalProperties.line.solidFill = GS_NAVY
-                        s.graphicalProperties.line.width = 12700  # 1pt linje
-                    elif chart_type != "pie":
-                        # Staplar - solid navy fyllning
-                        s.graphicalProperties.solidFill = GS_NAVY
-                        s.graphicalProperties.line.noFill = True
+                    style_series(s)
 
             # Placera grafen till höger om datan (kolumn D)
             ws.add_chart(excel_chart, f"D{data_start_row - 2}")
 
-        current_row += 2  # Mellanrum mellan grafer
-
-        # Extra mellanrum för att inte grafer ska överlappa
-        if data_points:
-            current_row += 10
-
-        chart_count += 1
+        # Mellanrum mellan grafer, plus plats för själva grafen så att de inte överlappar
+        current_row += 12 if data_points else 2
 
     # Kolumnbredder
     ws.column_dimensions['A'].width = 25
@@ -1108,23 +1174,27 @@ def create_separator_sheet(wb, title: str):
     # Sätt kolumnbredd
     ws.column_dimensions['A'].width = 50
 
-    # Titel i mitten
+    # Sätt navy bakgrund på hela arket via kolumnformat - Excel målar då
+    # tomma celler utan att vi behöver skapa en cell per ruta
+    ws.column_dimensions['A'].fill = PERIOD_SEPARATOR_FILL
+    # B-I som ett enda kolumnintervall med standardbredd
+    fill_cols = ws.column_dimensions['B']
+    fill_cols.min, fill_cols.max = 2, 9
+    fill_cols.width = 0
+    fill_cols.fill = PERIOD_SEPARATOR_FILL
+
+    # Titel i mitten (egen cellstil ersätter kolumnens, så fyllningen måste med)
     ws['A10'] = title.upper()
     ws['A10'].font = Font(name='Arial', size=24, bold=True, color="FFFFFF")
     ws['A10'].alignment = Alignment(horizontal='center', vertical='center')
-
-    # Sätt navy bakgrund på hela arket (via rad-/kolumnformat)
-    for row in range(1, 30):
-        for col in range(1, 10):
-            cell = ws.cell(row=row, column=col)
-            cell.fill = PatternFill(start_color="1F3864", end_color="1F3864", fill_type="solid")
+    ws['A10'].fill = PERIOD_SEPARATOR_FILL
 
     return ws
 
 
-def build_databook(extracted_data: list[dict], output_path: str) -> dict | None:
+def create_databook(extracted_data: list[dict]) -> Workbook:
     """
-    Bygg komplett Excel-databok från extraherad data.
+    Bygg komplett Excel-databok i minnet från extraherad data.
 
     Stödjer både legacy-format (resultatrakning, balansrakning, etc.)
     och nya full-extraktion-formatet (tables med dynamisk struktur).
@@ -1138,10 +1208,9 @@ def build_databook(extracted_data: list[dict], output_path: str) -> dict | None:
 
     Args:
         extracted_data: Lista med extraherad data från varje PDF
-        output_path: Sökväg för output Excel-fil
 
     Returns:
-        Token-info från AI-normalisering eller None
+        Osparad Workbook
     """
     if not extracted_data:
         raise ValueError("Ingen data att bygga databok från")
@@ -1184,25 +1253,14 @@ def build_databook(extracted_data: list[dict], output_path: str) -> dict | None:
 
         # Nytt format - skapa flikar för varje tabelltyp som finns
         # (map_table_type hanterar quarterly → rätt typ baserat på titel)
-        table_types_found = set()
-        for item in sorted_data:
-            for table in item.get("tables", []):
-                table_types_found.add(map_table_type(table))
-
-        # Ordning för flikar
-        type_order = ["income_statement", "balance_sheet", "cash_flow", "kpi", "segment", "other"]
-        type_sheet_names = {
-            "income_statement": "Resultaträkning",
-            "balance_sheet": "Balansräkning",
-            "cash_flow": "Kassaflöde",
-            "kpi": "Nyckeltal",
-            "segment": "Segment",
-            "other": "Övrigt",
+        table_types_found = {
+            map_table_type(table)
+            for item in sorted_data
+            for table in item.get("tables", ())
         }
 
-        for table_type in type_order:
+        for table_type, sheet_name in TABLE_TYPE_SHEETS:
             if table_type in table_types_found:
-                sheet_name = type_sheet_names.get(table_type, table_type)
                 ws = wb.create_sheet(sheet_name)
                 populate_dynamic_table_sheet(ws, sorted_data, table_type, company_name)
 
@@ -1216,89 +1274,102 @@ def build_databook(extracted_data: list[dict], output_path: str) -> dict | None:
         # Samla alla unika sektioner (deduplicera baserat på innehåll)
         def get_bullet_fingerprint(text: str) -> set:
             """Extrahera fingerprint baserat på bullet points (mer distinkt)."""
-            # Hitta alla rader som börjar med bullet
-            bullets = set()
-            for line in text.split('\n'):
-                line = line.strip()
-                if line.startswith(('• ', '- ', '* ', '– ')):
-                    # Ta första 50 tecken efter bullet som fingerprint
-                    bullet_text = line[2:52].lower().strip()
-                    if bullet_text:
-                        bullets.add(bullet_text)
+            # Första 50 tecknen efter varje bullet, i ett regex-pass över hela texten
+            bullets = {match.lower().strip() for match in _BULLET_RE.findall(text)}
+            bullets.discard("")
             return bullets
 
-        def is_content_duplicate(c1: str, c2: str) -> bool:
-            """Kolla om två sektioner är dubbletter."""
-            # Metod 1: Jämför bullet points (bäst för rapporter)
-            b1 = get_bullet_fingerprint(c1)
-            b2 = get_bullet_fingerprint(c2)
-            if b1 and b2:
-                # Om minst 3 bullets matchar, är det troligen samma innehåll
-                common = b1 & b2
-                if len(common) >= 3:
-                    return True
-                # Om >70% av bullets matchar
-                min_bullets = min(len(b1), len(b2))
-                if min_bullets > 0 and len(common) / min_bullets > 0.7:
-                    return True
-
-            # Metod 2: Exakt matchning av första meningen efter whitespace-normalisering
-            def first_sentence(t: str) -> str:
-                # Skippa rubriker (korta rader utan punkt)
-                for line in t.split('\n'):
-                    line = line.strip()
-                    if len(line) > 50 and ('.' in line or '•' in line):
-                        return line[:100].lower().replace(' ', '')
-                return ""
-
-            s1 = first_sentence(c1)
-            s2 = first_sentence(c2)
-            if s1 and s2 and s1 == s2:
-                return True
-
-            return False
+        def first_sentence(t: str) -> str:
+            """Första meningen efter whitespace-normalisering (skippar rubriker)."""
+            # Skippa rubriker (korta rader utan punkt)
+            for match in _SENTENCE_LINE_RE.finditer(t):
+                line = match.group(1).strip()
+                if len(line) > 50:
+                    return line[:100].lower().replace(' ', '')
+            return ""
 
         sections_with_page = []
         seen_titles = set()
-        seen_contents = []  # Lista med innehåll för likhetsjämförelse
+        # Fingerprints för redan valda sektioner + inverterat index bullet -> sektioner,
+        # så att dubblettkollen blir uppslag istället för parvis jämförelse
+        seen_fingerprints = []
+        bullet_to_sections = {}
+        seen_sentences = set()
+
+        def is_content_duplicate(fingerprint: set, sentence: str) -> bool:
+            """Kolla om en sektion är dubblett av någon redan vald sektion."""
+            # Metod 1: Jämför bullet points (bäst för rapporter)
+            if fingerprint:
+                common_counts = Counter()
+                for bullet in fingerprint:
+                    common_counts.update(bullet_to_sections.get(bullet, ()))
+                for idx, common in common_counts.items():
+                    # Om minst 3 bullets matchar, är det troligen samma innehåll
+                    if common >= 3:
+                        return True
+                    # Om >70% av bullets matchar
+                    min_bullets = min(len(fingerprint), len(seen_fingerprints[idx]))
+                    if common / min_bullets > 0.7:
+                        return True
+
+            # Metod 2: Exakt matchning av första meningen efter whitespace-normalisering
+            return bool(sentence) and sentence in seen_sentences
 
         for item in sorted_data:
             for section in item.get("sections", []):
                 title = section.get("title", "")
                 content = section.get("content", "")
+                fingerprint = get_bullet_fingerprint(content)
+                sentence = first_sentence(content)
 
                 # Skippa om vi redan har en sektion med samma innehåll
-                is_duplicate = False
-                for existing_content in seen_contents:
-                    if is_content_duplicate(content, existing_content):
-                        is_duplicate = True
-                        break
-
-                if is_duplicate:
+                if is_content_duplicate(fingerprint, sentence):
                     continue
 
                 if title and title not in seen_titles:
                     page = section.get("page", 999)
                     sections_with_page.append((page, title))
                     seen_titles.add(title)
-                    seen_contents.append(content)
+
+                    idx = len(seen_fingerprints)
+                    seen_fingerprints.append(fingerprint)
+                    for bullet in fingerprint:
+                        bullet_to_sections.setdefault(bullet, []).append(idx)
+                    if sentence:
+                        seen_sentences.add(sentence)
 
         # Sortera efter sidnummer (kronologisk ordning)
         sections_with_page.sort(key=lambda x: x[0])
 
         if sections_with_page:
             create_separator_sheet(wb, "═ TEXT ═")
+            existing_sheets = {ws.title for ws in wb.worksheets}
 
             for page, section_title in sections_with_page:
                 # Sanera fliknamn (tar bort ogiltiga tecken och kortar till 31)
                 sheet_name = sanitize_sheet_name(section_title)
                 # Undvik duplicerade bladnamn
-                existing_sheets = [ws.title for ws in wb.worksheets]
-                if sheet_name not in existing_sheets:
-                    ws = wb.create_sheet(sheet_name)
-                    populate_sections_sheet(ws, sorted_data, section_title, company_name)
+                if sheet_name in existing_sheets:
+                    continue
+                ws = wb.create_sheet(sheet_name)
+                existing_sheets.add(ws.title)
+                populate_sections_sheet(ws, sorted_data, section_title, company_name)
 
-    # Spara
-    wb.save(output_path)
+    return wb
+
+
+def build_databook(extracted_data: list[dict], output_path: str) -> dict | None:
+    """
+    Bygg och spara komplett Excel-databok från extraherad data.
+
+    Args:
+        extracted_data: Lista med extraherad data från varje PDF
+        output_path: Sökväg för output Excel-fil
+
+    Returns:
+        Token-info från AI-normalisering eller None
+    """
+    wb = create_databook(extracted_data)
+    save_workbook(wb, output_path)
 
     return None  # Ingen normalisering längre
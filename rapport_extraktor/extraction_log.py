@@ -5,41 +5,150 @@ Skapar och uppdaterar loggfiler per bolag som sammanfattar all extraktion.
 Hanterar också filflyttning efter lyckad extraktion.
 """
 
-import json
+import functools
 import os
 import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 
-from supabase_client import get_client, get_company_by_slug, slugify
+from supabase_client import get_client, get_company_by_slug, get_pdf_hash_cached, slugify
+
+# Antal bolag som loggas parallellt i regenerate_all_logs (begränsas av Supabase-poolen)
+LOG_WORKERS = 8
+
+# Max antal period_ids per .in_()-filter (PostgREST har gräns för URL-längd)
+IN_BATCH_SIZE = 200
+
+# Max antal samtidiga queries från _execute_parallel
+MAX_PARALLEL_QUERIES = 8
+
+# Nycklar i extraction_meta som loggen läser - resten av JSON-bloben hämtas inte
+LOG_META_KEYS = ("pass1_counts", "validation", "missing_tables", "total_cost_sek", "total_elapsed_seconds")
+
+# Håller utskrifter från parallella loggtrådar hela
+_print_lock = threading.Lock()
+
+
+def _print(message: str) -> None:
+    """Trådsäker print för funktioner som körs från regenerate_all_logs."""
+    with _print_lock:
+        print(message)
+
+
+# Mappar som redan skapats/kontrollerats i denna process
+_ENSURED_DIRS: set[str] = set()
+
+
+def _ensure_dir(folder: Path) -> None:
+    """Skapa en mapp om den saknas, men bara en gång per process och sökväg."""
+    key = str(folder)
+    if key not in _ENSURED_DIRS:
+        folder.mkdir(parents=True, exist_ok=True)
+        _ENSURED_DIRS.add(key)
 
 
 def get_extraction_log_path(company_folder: Path) -> Path:
     """Returnera sökväg till loggfilen för ett bolag."""
     db_folder = company_folder / "ligger_i_databasen"
-    db_folder.mkdir(parents=True, exist_ok=True)
+    _ensure_dir(db_folder)
     return db_folder / "extraction_log.txt"
 
 
+@functools.lru_cache(maxsize=32)
+def _row_layout(widths: tuple[int, ...], align: tuple[str, ...]):
+    """
+    Bygg formatmall och specialiserad radskrivare för en fast tabellayout.
+
+    Exempel för widths=(9, 8), align=("<", ">") blir mallen "| %-9s | %8s |"
+    och skrivaren:
+
+        def write_row(buf, v0, v1):
+            buf.append("| %-9s | %8s |\\n" % (v0, v1))
+
+    Samma mall används av format_table_row (rubrik- och totalrader) och av
+    skrivaren (datarader), så kolumnformatet finns bara på ett ställe.
+    Formatmallen och antalet kolumner är inbakade, så varje rad blir ett
+    enda %-anrop utan zip/join. Värdena ska vara strängar.
+    """
+    specs = [f"%{'' if a == '>' else '-'}{w}s" for w, a in zip(widths, align)]
+    template = "| " + " | ".join(specs) + " |"
+    names = [f"v{i}" for i in range(len(specs))]
+    source = (
+        f"def write_row(buf, {', '.join(names)}):\n"
+        f"    buf.append({template + chr(10)!r} % ({', '.join(names)},))\n"
+    )
+    namespace = {}
+    exec(source, namespace)
+    return template, len(specs), namespace["write_row"]
+
+
 def format_table_row(values: list[str], widths: list[int], align: list[str] | None = None) -> str:
     """Formatera en tabellrad."""
     if align is None:
-        align = ["<"] * len(values)
+        align = ("<",) * len(values)
 
-    cells = []
-    for val, width, a in zip(values, widths, align):
-        if a == ">":
-            cells.append(f"{val:>{width}}")
-        else:
-            cells.append(f"{val:<{width}}")
+    template, num_columns, _ = _row_layout(tuple(widths[:len(values)]), tuple(align))
+    return template % tuple(values[:num_columns])
 
-    return "| " + " | ".join(cells) + " |"
+
+@functools.lru_cache(maxsize=32)
+def _separator(widths: tuple[int, ...]) -> str:
+    """Bygg (och cacha) en separatorrad för en tabellayout."""
+    parts = ["-" * (w + 2) for w in widths]
+    return "+" + "+".join(parts) + "+"
 
 
 def format_table_separator(widths: list[int]) -> str:
     """Formatera en tabellseparator."""
-    parts = ["-" * (w + 2) for w in widths]
-    return "+" + "+".join(parts) + "+"
+    return _separator(tuple(widths))
+
+
+def _make_row_writer(widths: tuple[int, ...], align: tuple[str, ...]):
+    """Hämta radskrivaren för en tabellayout (se _row_layout)."""
+    return _row_layout(widths, align)[2]
+
+
+def _execute_parallel(callables: list) -> list:
+    """
+    Kör oberoende DB-anrop parallellt och returnera deras futures i samma ordning.
+
+    Anroparen hämtar resultatet via future.result() så att fel kan hanteras
+    per anrop (t.ex. att charts-tabellen saknas i äldre databaser).
+    """
+    with ThreadPoolExecutor(max_workers=min(len(callables), MAX_PARALLEL_QUERIES)) as executor:
+        return [executor.submit(fn) for fn in callables]
+
+
+def _chunks(items: list, size: int):
+    """Dela upp en lista i bitar om högst size element."""
+    return (items[i:i + size] for i in range(0, len(items), size))
+
+
+def _execute_chunked(period_ids: list[str], *builders) -> list[list]:
+    """
+    Kör en eller flera .in_("period_id", ...)-queries med period_ids i chunkar.
+
+    Varje builder tar en chunk av period_ids och returnerar en (ej exekverad)
+    query. Alla queries för alla chunkar körs parallellt.
+
+    Returns:
+        En lista futures per builder (en future per chunk)
+    """
+    chunks = list(_chunks(period_ids, IN_BATCH_SIZE))
+    futures = _execute_parallel([
+        lambda build=build, ids=ids: build(ids).execute()
+        for build in builders
+        for ids in chunks
+    ])
+    n = len(chunks)
+    return [futures[i * n:(i + 1) * n] for i in range(len(builders))]
+
+
+def _sum_counts(futures: list) -> int:
+    """Summera count från chunkade count="exact"-queries."""
+    return sum(f.result().count or 0 for f in futures)
 
 
 def get_period_counts(client, period_id: str) -> dict:
@@ -70,7 +179,8 @@ def get_period_counts_batch(client, period_ids: list[str]) -> dict[str, dict]:
     """
     Hämta antal tabeller, sektioner och grafer för FLERA perioder effektivt.
 
-    Gör 3 queries totalt istället för 3 * N queries.
+    Räknar i databasen via RPC (1 query, N små rader) istället för att
+    hämta alla rader och räkna i Python.
 
     Args:
         client: Supabase-klient
@@ -82,83 +192,150 @@ def get_period_counts_batch(client, period_ids: list[str]) -> dict[str, dict]:
     if not period_ids:
         return {}
 
-    # Initiera resultat
-    result = {pid: {"tables": 0, "sections": 0, "charts": 0} for pid in period_ids}
+    # Försök använda optimerad RPC-funktion (kräver migration 004)
+    try:
+        rows = client.rpc("period_counts", {"p_period_ids": period_ids}).execute().data or []
+    except Exception as e:
+        # Fallback till legacy-implementation om RPC inte finns
+        if "function" not in str(e).lower():
+            raise
+        return _get_period_counts_batch_legacy(client, period_ids)
 
-    # Hämta tabeller grupperade per period
-    tables = client.table("report_tables").select(
-        "period_id"
-    ).in_("period_id", period_ids).execute()
+    result = {pid: {"tables": 0, "sections": 0, "charts": 0} for pid in period_ids}
+    for row in rows:
+        result[row["period_id"]] = {
+            "tables": row["tables_count"] or 0,
+            "sections": row["sections_count"] or 0,
+            "charts": row["charts_count"] or 0,
+        }
 
-    for t in (tables.data or []):
-        pid = t["period_id"]
-        if pid in result:
-            result[pid]["tables"] += 1
+    return result
 
-    # Hämta sektioner grupperade per period
-    sections = client.table("sections").select(
-        "period_id"
-    ).in_("period_id", period_ids).execute()
 
-    for s in (sections.data or []):
-        pid = s["period_id"]
-        if pid in result:
-            result[pid]["sections"] += 1
+def _get_period_counts_batch_legacy(client, period_ids: list[str]) -> dict[str, dict]:
+    """Räkna per period i Python (3 parallella queries) om RPC saknas."""
+    result = {pid: {"tables": 0, "sections": 0, "charts": 0} for pid in period_ids}
 
-    # Hämta grafer grupperade per period
-    try:
-        charts = client.table("charts").select(
-            "period_id"
-        ).in_("period_id", period_ids).execute()
+    # Hämta tabeller, sektioner och grafer parallellt (i chunkar av period_ids)
+    tables_fs, sections_fs, charts_fs = _execute_chunked(
+        period_ids,
+        lambda ids: client.table("report_tables").select("period_id").in_("period_id", ids),
+        lambda ids: client.table("sections").select("period_id").in_("period_id", ids),
+        lambda ids: client.table("charts").select("period_id").in_("period_id", ids),
+    )
+
+    for tables_f in tables_fs:
+        for t in (tables_f.result().data or []):
+            pid = t["period_id"]
+            if pid in result:
+                result[pid]["tables"] += 1
 
-        for c in (charts.data or []):
-            pid = c["period_id"]
+    for sections_f in sections_fs:
+        for s in (sections_f.result().data or []):
+            pid = s["period_id"]
             if pid in result:
-                result[pid]["charts"] += 1
+                result[pid]["sections"] += 1
+
+    try:
+        for charts_f in charts_fs:
+            for c in (charts_f.result().data or []):
+                pid = c["period_id"]
+                if pid in result:
+                    result[pid]["charts"] += 1
     except Exception:
         pass  # charts-tabell kanske inte finns
 
     return result
 
 
-def get_total_counts_from_db(client, company_id: str) -> dict:
-    """Hämta totalt antal tabeller, sektioner och grafer för ett bolag direkt från DB."""
-    # Hämta alla period_ids för bolaget
-    periods = client.table("periods").select("id").eq("company_id", company_id).execute()
-    period_ids = [p["id"] for p in periods.data] if periods.data else []
+def get_total_counts_from_db(client, company_id: str, period_ids: list[str] | None = None) -> dict:
+    """
+    Hämta totalt antal tabeller, sektioner och grafer för ett bolag direkt från DB.
+
+    Om period_ids redan är hämtade kan de skickas in så att fallback-vägen
+    slipper hämta bolagets perioder igen.
+    """
+    # Försök använda optimerad RPC-funktion (kräver migration 004)
+    try:
+        rows = client.rpc("company_totals", {"p_company_id": company_id}).execute().data or []
+    except Exception as e:
+        # Fallback till legacy-implementation om RPC inte finns
+        if "function" not in str(e).lower():
+            raise
+        return _get_total_counts_from_db_legacy(client, company_id, period_ids)
+
+    totals = {"tables": 0, "sections": 0, "charts": 0}
+    totals.update({row["kind"]: row["n"] or 0 for row in rows})
+    return totals
+
+
+def _get_total_counts_from_db_legacy(client, company_id: str, period_ids: list[str] | None = None) -> dict:
+    """Räkna totaler med 1+3 queries om RPC saknas."""
+    # Hämta alla period_ids för bolaget (om de inte skickats in)
+    if period_ids is None:
+        periods = client.table("periods").select("id").eq("company_id", company_id).execute()
+        period_ids = [p["id"] for p in periods.data] if periods.data else []
 
     if not period_ids:
         return {"tables": 0, "sections": 0, "charts": 0}
 
-    # Räkna totalt för alla perioder
-    tables = client.table("report_tables").select("id", count="exact").in_("period_id", period_ids).execute()
-    sections = client.table("sections").select("id", count="exact").in_("period_id", period_ids).execute()
+    # Räkna totalt för alla perioder (parallellt, i chunkar av period_ids)
+    tables_fs, sections_fs, charts_fs = _execute_chunked(
+        period_ids,
+        lambda ids: client.table("report_tables").select("id", count="exact").in_("period_id", ids),
+        lambda ids: client.table("sections").select("id", count="exact").in_("period_id", ids),
+        lambda ids: client.table("charts").select("id", count="exact").in_("period_id", ids),
+    )
 
     try:
-        charts = client.table("charts").select("id", count="exact").in_("period_id", period_ids).execute()
-        charts_count = charts.count or 0
+        charts_count = _sum_counts(charts_fs)
     except Exception:
         charts_count = 0
 
     return {
-        "tables": tables.count or 0,
-        "sections": sections.count or 0,
+        "tables": _sum_counts(tables_fs),
+        "sections": _sum_counts(sections_fs),
         "charts": charts_count,
     }
 
 
-def get_embedding_stats(client, company_id: str) -> dict:
+def get_embedding_stats(client, company_id: str, period_ids: list[str] | None = None) -> dict:
     """
     Hämta statistik om embeddings för ett bolag.
 
+    Om period_ids redan är hämtade kan de skickas in så att fallback-vägen
+    slipper hämta bolagets perioder igen.
+
     Returns:
         Dict med sections_total, sections_with_embedding, embedding_model
     """
     from supabase_client import VOYAGE_MODEL
 
-    # Hämta alla period_ids för bolaget
-    periods = client.table("periods").select("id").eq("company_id", company_id).execute()
-    period_ids = [p["id"] for p in periods.data] if periods.data else []
+    # Försök använda optimerad RPC-funktion (kräver migration 004)
+    try:
+        rows = client.rpc("embedding_stats", {"p_company_id": company_id}).execute().data or []
+    except Exception as e:
+        # Fallback till legacy-implementation om RPC inte finns
+        if "function" not in str(e).lower():
+            raise
+        return _get_embedding_stats_legacy(client, company_id, period_ids)
+
+    row = rows[0] if rows else {}
+    return {
+        "sections_total": row.get("sections_total") or 0,
+        "sections_with_embedding": row.get("sections_with_embedding") or 0,
+        "embedding_model": VOYAGE_MODEL,
+    }
+
+
+def _get_embedding_stats_legacy(client, company_id: str, period_ids: list[str] | None = None) -> dict:
+    """Räkna embeddings med periods-select + 2 queries om RPC saknas."""
+    from supabase_client import VOYAGE_MODEL
+
+    # Hämta alla period_ids för bolaget (om de inte skickats in)
+    if period_ids is None:
+        periods = client.table("periods").select("id").eq("company_id", company_id).execute()
+        period_ids = [p["id"] for p in periods.data] if periods.data else []
 
     if not period_ids:
         return {
@@ -167,19 +344,74 @@ def get_embedding_stats(client, company_id: str) -> dict:
             "embedding_model": VOYAGE_MODEL,
         }
 
-    # Räkna totalt antal sections
-    sections_total = client.table("sections").select("id", count="exact").in_("period_id", period_ids).execute()
-
-    # Räkna sections med embedding (not null)
-    sections_with_emb = client.table("sections").select("id", count="exact").in_("period_id", period_ids).not_.is_("embedding", "null").execute()
+    # Räkna totalt antal sections och sections med embedding (not null) parallellt
+    total_fs, with_emb_fs = _execute_chunked(
+        period_ids,
+        lambda ids: client.table("sections").select("id", count="exact").in_("period_id", ids),
+        lambda ids: client.table("sections").select("id", count="exact").in_("period_id", ids).not_.is_("embedding", "null"),
+    )
 
     return {
-        "sections_total": sections_total.count or 0,
-        "sections_with_embedding": sections_with_emb.count or 0,
+        "sections_total": _sum_counts(total_fs),
+        "sections_with_embedding": _sum_counts(with_emb_fs),
         "embedding_model": VOYAGE_MODEL,
     }
 
 
+def get_company_report_bundle(client, company_id: str) -> dict:
+    """
+    Hämta allt underlag för ett bolags extraktionslogg i ett anrop.
+
+    Returns:
+        Dict med periods (inkl. tables/sections/charts per period, sorterade
+        senaste först), totals och embeddings (samma format som get_embedding_stats)
+    """
+    from supabase_client import VOYAGE_MODEL
+
+    # Försök använda optimerad RPC-funktion (kräver migration 004)
+    try:
+        bundle = client.rpc("company_report_bundle", {"p_company_id": company_id}).execute().data
+    except Exception as e:
+        # Fallback till legacy-implementation om RPC inte finns
+        if "function" not in str(e).lower():
+            raise
+        return _get_company_report_bundle_legacy(client, company_id)
+
+    bundle["embeddings"]["embedding_model"] = VOYAGE_MODEL
+    return bundle
+
+
+def _get_company_report_bundle_legacy(client, company_id: str) -> dict:
+    """Bygg samma bundle som company_report_bundle med separata queries."""
+    meta_columns = ", ".join(f"{key}:extraction_meta->{key}" for key in LOG_META_KEYS)
+    periods = client.table("periods").select(
+        f"id, quarter, year, source_file, created_at, {meta_columns}"
+    ).eq("company_id", company_id).order("year", desc=True).order("quarter", desc=True).execute()
+    period_rows = periods.data or []
+
+    if not period_rows:
+        return {"periods": [], "totals": {"tables": 0, "sections": 0, "charts": 0}, "embeddings": {}}
+
+    period_ids = [p["id"] for p in period_rows]
+    all_counts = get_period_counts_batch(client, period_ids)
+    for period in period_rows:
+        # Bygg ihop en avskalad extraction_meta av de projicerade JSON-nycklarna
+        meta = {key: period.pop(key) for key in LOG_META_KEYS}
+        period["extraction_meta"] = {key: value for key, value in meta.items() if value is not None}
+        period.update(all_counts.get(period["id"], {"tables": 0, "sections": 0, "charts": 0}))
+
+    totals_f, embeddings_f = _execute_parallel([
+        lambda: get_total_counts_from_db(client, company_id, period_ids),
+        lambda: get_embedding_stats(client, company_id, period_ids),
+    ])
+
+    return {
+        "periods": period_rows,
+        "totals": totals_f.result(),
+        "embeddings": embeddings_f.result(),
+    }
+
+
 def get_status_counts(report_data: dict) -> dict:
     """
     Beräkna extraherade/hittade för tabeller, sektioner och grafer.
@@ -217,23 +449,25 @@ def get_status_counts(report_data: dict) -> dict:
     }
 
 
-def classify_error_severity(error_type: str) -> str:
-    """
-    Klassificera ett fel som Kritiskt, Medel eller Lag.
-    """
+ERROR_SEVERITY = {
     # Kritiska fel - data saknas helt
-    if error_type in ("missing_table", "empty_table", "values_length_mismatch"):
-        return "Kritiskt"
-
+    "missing_table": "Kritiskt",
+    "empty_table": "Kritiskt",
+    "values_length_mismatch": "Kritiskt",
     # Medelfel - data kan vara inkomplett
-    if error_type in ("invalid_label",):
-        return "Medel"
-
+    "invalid_label": "Medel",
     # Låga fel - kosmetiska eller minor issues
-    if error_type in ("first_value_not_null", "missing_title", "empty_content"):
-        return "Lag"
+    "first_value_not_null": "Lag",
+    "missing_title": "Lag",
+    "empty_content": "Lag",
+}
 
-    return "Medel"  # Default
+
+def classify_error_severity(error_type: str) -> str:
+    """
+    Klassificera ett fel som Kritiskt, Medel eller Lag.
+    """
+    return ERROR_SEVERITY.get(error_type, "Medel")  # Default: Medel
 
 
 def collect_all_errors(report_data: list[dict], company_name: str) -> list[dict]:
@@ -301,45 +535,39 @@ def update_extraction_log(company_slug: str, base_folder: Path | str) -> int:
     company_folder = base_folder / company_slug
 
     if not company_folder.exists():
-        print(f"[!] Bolagsmappen hittades inte: {company_folder}")
+        _print(f"[!] Bolagsmappen hittades inte: {company_folder}")
         return 0
 
     # Hämta bolag från databasen
     company = get_company_by_slug(company_slug)
     if not company:
-        print(f"[!] Bolaget finns inte i databasen: {company_slug}")
+        _print(f"[!] Bolaget finns inte i databasen: {company_slug}")
         return 0
 
     company_id = company["id"]
     company_name = company["name"]
 
-    # Hämta alla perioder med extraction_meta och id
+    # Hämta perioder med räkningar, totaler och embedding-status (1 RPC-anrop)
     client = get_client()
-    periods = client.table("periods").select(
-        "id, quarter, year, source_file, extraction_meta, created_at"
-    ).eq("company_id", company_id).order("year", desc=True).order("quarter", desc=True).execute()
+    bundle = get_company_report_bundle(client, company_id)
+    periods = bundle["periods"]
 
-    if not periods.data:
-        print(f"[!] Inga rapporter i databasen för: {company_name}")
+    if not periods:
+        _print(f"[!] Inga rapporter i databasen för: {company_name}")
         return 0
 
-    # Hämta räkningar för ALLA perioder i en batch (3 queries istället för 3*N)
-    period_ids = [p["id"] for p in periods.data]
-    all_counts = get_period_counts_batch(client, period_ids)
-
-    # Bygg upp data med batch-räkningar
+    # Bygg upp data med räkningar per period
     report_data = []
-    for period in periods.data:
-        counts = all_counts.get(period["id"], {"tables": 0, "sections": 0, "charts": 0})
+    for period in periods:
         extraction_meta = period.get("extraction_meta") or {}
 
         report_data.append({
             "period": f"Q{period['quarter']} {period['year']}",
             "quarter": period["quarter"],
             "year": period["year"],
-            "tables": counts["tables"],
-            "sections": counts["sections"],
-            "charts": counts["charts"],
+            "tables": period["tables"],
+            "sections": period["sections"],
+            "charts": period["charts"],
             "cost": extraction_meta.get("total_cost_sek", 0),
             "time": extraction_meta.get("total_elapsed_seconds", 0),
             "source_file": period.get("source_file", ""),
@@ -347,200 +575,208 @@ def update_extraction_log(company_slug: str, base_folder: Path | str) -> int:
             "created_at": period.get("created_at", ""),
         })
 
-    # Beräkna totaler
+    # Tabellayouter
+    widths_overview = [9, 8, 9, 6, 10, 8]
+    align_overview = ["<", ">", ">", ">", ">", ">"]
+    widths_status = [9, 12, 14, 12]
+    align_status = ["<", ">", ">", ">"]
+
+    def format_status(extracted: int, found: int | None) -> str:
+        """Formatera status som 'X/Y' eller 'X/?' om found är okänt."""
+        if found is None:
+            return f"{extracted}/?"
+        return f"{extracted}/{found}"
+
+    # Beräkna totaler och formatera rader för översikt och status i ett pass
     total_reports = len(report_data)
-    total_tables = sum(r["tables"] for r in report_data)
-    total_sections = sum(r["sections"] for r in report_data)
-    total_charts = sum(r["charts"] for r in report_data)
-    total_cost = sum(r["cost"] for r in report_data)
-    total_time = sum(r["time"] for r in report_data)
+    total_tables = 0
+    total_sections = 0
+    total_charts = 0
+    total_cost = 0
+    total_time = 0
+    total_tables_found = 0
+    total_sections_found = 0
+    total_charts_found = 0
+    has_pass1_data = False
+    overview_rows = []
+    status_rows = []
+    write_overview_row = _make_row_writer(tuple(widths_overview), tuple(align_overview))
+    write_status_row = _make_row_writer(tuple(widths_status), tuple(align_status))
+
+    for r in report_data:
+        total_tables += r["tables"]
+        total_sections += r["sections"]
+        total_charts += r["charts"]
+        total_cost += r["cost"]
+        total_time += r["time"]
+
+        write_overview_row(
+            overview_rows,
+            r["period"],
+            str(r["tables"]),
+            str(r["sections"]),
+            str(r["charts"]),
+            f"{r['cost']:.2f}",
+            f"{r['time']:.1f}",
+        )
+
+        # Summera found endast om vi har data
+        status = get_status_counts(r)
+        if status["tables_found"] is not None:
+            total_tables_found += status["tables_found"]
+            has_pass1_data = True
+        if status["sections_found"] is not None:
+            total_sections_found += status["sections_found"]
+        if status["charts_found"] is not None:
+            total_charts_found += status["charts_found"]
+
+        write_status_row(
+            status_rows,
+            r["period"],
+            format_status(status["tables_extracted"], status["tables_found"]),
+            format_status(status["sections_extracted"], status["sections_found"]),
+            format_status(status["charts_extracted"], status["charts_found"]),
+        )
 
     # Skriv loggfil
     log_path = get_extraction_log_path(company_folder)
 
-    with open(log_path, "w", encoding="utf-8") as f:
-        # Header
-        f.write("#" * 80 + "\n")
-        f.write(f"# EXTRAKTIONSLOGG: {company_name.upper()}\n")
-        f.write(f"# Genererad: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("#" * 80 + "\n\n")
-
-        # Sammanfattning
-        f.write("SAMMANFATTNING:\n")
-        f.write(f"  Rapporter: {total_reports}\n")
-        f.write(f"  Tabeller: {total_tables} | Sektioner: {total_sections} | Grafer: {total_charts}\n")
-        f.write(f"  Kostnad: {total_cost:.2f} SEK | Tid: {total_time:.1f} sekunder\n\n")
-
-        # ===== TABELL 1: ÖVERSIKT =====
-        widths_overview = [9, 8, 9, 6, 10, 8]
-        align_overview = ["<", ">", ">", ">", ">", ">"]
-
-        f.write("RAPPORTER - OVERSIKT:\n")
-        f.write(format_table_separator(widths_overview) + "\n")
-        f.write(format_table_row(
-            ["Period", "Tabeller", "Sektioner", "Grafer", "Kostnad", "Tid (s)"],
-            widths_overview, align_overview
-        ) + "\n")
-        f.write(format_table_separator(widths_overview) + "\n")
-
-        for r in report_data:
-            row = [
-                r["period"],
-                str(r["tables"]),
-                str(r["sections"]),
-                str(r["charts"]),
-                f"{r['cost']:.2f}",
-                f"{r['time']:.1f}",
-            ]
-            f.write(format_table_row(row, widths_overview, align_overview) + "\n")
-
-        # Totalrad
-        f.write(format_table_separator(widths_overview) + "\n")
-        total_row_overview = [
-            "TOTALT",
-            str(total_tables),
-            str(total_sections),
-            str(total_charts),
-            f"{total_cost:.2f}",
-            f"{total_time:.1f}",
-        ]
-        f.write(format_table_row(total_row_overview, widths_overview, align_overview) + "\n")
-        f.write(format_table_separator(widths_overview) + "\n")
-
-        # ===== TABELL 2: STATUS (extraherade/hittade) =====
-        f.write("\n\nRAPPORTER - STATUS (extraherade/hittade):\n")
-        widths_status = [9, 12, 14, 12]
-        align_status = ["<", ">", ">", ">"]
-
-        f.write(format_table_separator(widths_status) + "\n")
-        f.write(format_table_row(
-            ["Period", "Tabeller", "Sektioner", "Grafer"],
-            widths_status, align_status
+    buf = []
+    # Header
+    buf.append("#" * 80 + "\n")
+    buf.append(f"# EXTRAKTIONSLOGG: {company_name.upper()}\n")
+    buf.append(f"# Genererad: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    buf.append("#" * 80 + "\n\n")
+
+    # Sammanfattning
+    buf.append("SAMMANFATTNING:\n")
+    buf.append(f"  Rapporter: {total_reports}\n")
+    buf.append(f"  Tabeller: {total_tables} | Sektioner: {total_sections} | Grafer: {total_charts}\n")
+    buf.append(f"  Kostnad: {total_cost:.2f} SEK | Tid: {total_time:.1f} sekunder\n\n")
+
+    # ===== TABELL 1: ÖVERSIKT =====
+    buf.append("RAPPORTER - OVERSIKT:\n")
+    buf.append(format_table_separator(widths_overview) + "\n")
+    buf.append(format_table_row(
+        ["Period", "Tabeller", "Sektioner", "Grafer", "Kostnad", "Tid (s)"],
+        widths_overview, align_overview
+    ) + "\n")
+    buf.append(format_table_separator(widths_overview) + "\n")
+    buf.extend(overview_rows)
+
+    # Totalrad
+    buf.append(format_table_separator(widths_overview) + "\n")
+    total_row_overview = [
+        "TOTALT",
+        str(total_tables),
+        str(total_sections),
+        str(total_charts),
+        f"{total_cost:.2f}",
+        f"{total_time:.1f}",
+    ]
+    buf.append(format_table_row(total_row_overview, widths_overview, align_overview) + "\n")
+    buf.append(format_table_separator(widths_overview) + "\n")
+
+    # ===== TABELL 2: STATUS (extraherade/hittade) =====
+    buf.append("\n\nRAPPORTER - STATUS (extraherade/hittade):\n")
+    buf.append(format_table_separator(widths_status) + "\n")
+    buf.append(format_table_row(
+        ["Period", "Tabeller", "Sektioner", "Grafer"],
+        widths_status, align_status
+    ) + "\n")
+    buf.append(format_table_separator(widths_status) + "\n")
+    buf.extend(status_rows)
+
+    # Totalrad för status (extraherade = antal i databasen = översiktens totaler)
+    buf.append(format_table_separator(widths_status) + "\n")
+    total_row_status = [
+        "TOTALT",
+        format_status(total_tables, total_tables_found if has_pass1_data else None),
+        format_status(total_sections, total_sections_found if has_pass1_data else None),
+        format_status(total_charts, total_charts_found if has_pass1_data else None),
+    ]
+    buf.append(format_table_row(total_row_status, widths_status, align_status) + "\n")
+    buf.append(format_table_separator(widths_status) + "\n")
+
+    # ===== FELLISTA =====
+    all_errors = collect_all_errors(report_data, company_name)
+
+    if all_errors:
+        buf.append("\n\nFEL OCH VARNINGAR:\n")
+        widths_errors = [22, 55, 10]
+        align_errors = ["<", "<", "<"]
+
+        buf.append(format_table_separator(widths_errors) + "\n")
+        buf.append(format_table_row(
+            ["Rapport", "Beskrivning", "Bedomning"],
+            widths_errors, align_errors
         ) + "\n")
-        f.write(format_table_separator(widths_status) + "\n")
-
-        # Räkna totaler för status
-        total_tables_extracted = 0
-        total_tables_found = 0
-        total_sections_extracted = 0
-        total_sections_found = 0
-        total_charts_extracted = 0
-        total_charts_found = 0
-        has_pass1_data = False
-
-        def format_status(extracted: int, found: int | None) -> str:
-            """Formatera status som 'X/Y' eller 'X/?' om found är okänt."""
-            if found is None:
-                return f"{extracted}/?"
-            return f"{extracted}/{found}"
-
-        for r in report_data:
-            status = get_status_counts(r)
-            total_tables_extracted += status["tables_extracted"]
-            total_sections_extracted += status["sections_extracted"]
-            total_charts_extracted += status["charts_extracted"]
-
-            # Summera found endast om vi har data
-            if status["tables_found"] is not None:
-                total_tables_found += status["tables_found"]
-                has_pass1_data = True
-            if status["sections_found"] is not None:
-                total_sections_found += status["sections_found"]
-            if status["charts_found"] is not None:
-                total_charts_found += status["charts_found"]
-
-            row = [
-                r["period"],
-                format_status(status["tables_extracted"], status["tables_found"]),
-                format_status(status["sections_extracted"], status["sections_found"]),
-                format_status(status["charts_extracted"], status["charts_found"]),
-            ]
-            f.write(format_table_row(row, widths_status, align_status) + "\n")
-
-        # Totalrad för status
-        f.write(format_table_separator(widths_status) + "\n")
-        total_row_status = [
-            "TOTALT",
-            format_status(total_tables_extracted, total_tables_found if has_pass1_data else None),
-            format_status(total_sections_extracted, total_sections_found if has_pass1_data else None),
-            format_status(total_charts_extracted, total_charts_found if has_pass1_data else None),
-        ]
-        f.write(format_table_row(total_row_status, widths_status, align_status) + "\n")
-        f.write(format_table_separator(widths_status) + "\n")
-
-        # ===== FELLISTA =====
-        all_errors = collect_all_errors(report_data, company_name)
-
-        if all_errors:
-            f.write("\n\nFEL OCH VARNINGAR:\n")
-            widths_errors = [22, 55, 10]
-            align_errors = ["<", "<", "<"]
-
-            f.write(format_table_separator(widths_errors) + "\n")
-            f.write(format_table_row(
-                ["Rapport", "Beskrivning", "Bedomning"],
-                widths_errors, align_errors
-            ) + "\n")
-            f.write(format_table_separator(widths_errors) + "\n")
-
-            for err in all_errors:
-                # Trunkera beskrivning om den är för lång
-                beskrivning = err["beskrivning"]
-                if len(beskrivning) > 55:
-                    beskrivning = beskrivning[:52] + "..."
-
-                row = [
-                    err["rapport"][:22],
-                    beskrivning,
-                    err["bedomning"],
-                ]
-                f.write(format_table_row(row, widths_errors, align_errors) + "\n")
-
-            f.write(format_table_separator(widths_errors) + "\n")
-        else:
-            f.write("\n\nINGA FEL REGISTRERADE.\n")
+        buf.append(format_table_separator(widths_errors) + "\n")
 
-        # ===== VERIFIERING MOT DATABAS =====
-        db_counts = get_total_counts_from_db(client, company_id)
+        write_error_row = _make_row_writer(tuple(widths_errors), tuple(align_errors))
+        for err in all_errors:
+            # Trunkera beskrivning om den är för lång
+            beskrivning = err["beskrivning"]
+            if len(beskrivning) > 55:
+                beskrivning = beskrivning[:52] + "..."
 
-        f.write("\n\nVERIFIERING (logg vs databas):\n")
-
-        checks_passed = True
-        if total_tables != db_counts["tables"]:
-            f.write(f"  [AVVIKELSE] Tabeller: logg={total_tables}, databas={db_counts['tables']}\n")
-            checks_passed = False
-        if total_sections != db_counts["sections"]:
-            f.write(f"  [AVVIKELSE] Sektioner: logg={total_sections}, databas={db_counts['sections']}\n")
-            checks_passed = False
-        if total_charts != db_counts["charts"]:
-            f.write(f"  [AVVIKELSE] Grafer: logg={total_charts}, databas={db_counts['charts']}\n")
-            checks_passed = False
-
-        if checks_passed:
-            f.write(f"  [OK] Tabeller: {total_tables} | Sektioner: {total_sections} | Grafer: {total_charts}\n")
-
-        # ===== EMBEDDING-STATUS =====
-        emb_stats = get_embedding_stats(client, company_id)
-
-        f.write(f"\nEMBEDDINGS (modell: {emb_stats['embedding_model']}):\n")
-        if emb_stats["sections_total"] == 0:
-            f.write("  Inga sektioner att generera embeddings for.\n")
-        elif emb_stats["sections_with_embedding"] == emb_stats["sections_total"]:
-            f.write(f"  [OK] {emb_stats['sections_with_embedding']}/{emb_stats['sections_total']} sektioner har embeddings\n")
-        else:
-            missing = emb_stats["sections_total"] - emb_stats["sections_with_embedding"]
-            f.write(f"  [SAKNAS] {emb_stats['sections_with_embedding']}/{emb_stats['sections_total']} sektioner har embeddings ({missing} saknas)\n")
+            write_error_row(buf, err["rapport"][:22], beskrivning, err["bedomning"])
 
-    print(f"[OK] Logg uppdaterad: {log_path}")
+        buf.append(format_table_separator(widths_errors) + "\n")
+    else:
+        buf.append("\n\nINGA FEL REGISTRERADE.\n")
+
+    # ===== VERIFIERING MOT DATABAS =====
+    db_counts = bundle["totals"]
+
+    buf.append("\n\nVERIFIERING (logg vs databas):\n")
+
+    checks_passed = True
+    if total_tables != db_counts["tables"]:
+        buf.append(f"  [AVVIKELSE] Tabeller: logg={total_tables}, databas={db_counts['tables']}\n")
+        checks_passed = False
+    if total_sections != db_counts["sections"]:
+        buf.append(f"  [AVVIKELSE] Sektioner: logg={total_sections}, databas={db_counts['sections']}\n")
+        checks_passed = False
+    if total_charts != db_counts["charts"]:
+        buf.append(f"  [AVVIKELSE] Grafer: logg={total_charts}, databas={db_counts['charts']}\n")
+        checks_passed = False
+
+    if checks_passed:
+        buf.append(f"  [OK] Tabeller: {total_tables} | Sektioner: {total_sections} | Grafer: {total_charts}\n")
+
+    # ===== EMBEDDING-STATUS =====
+    emb_stats = bundle["embeddings"]
+
+    buf.append(f"\nEMBEDDINGS (modell: {emb_stats['embedding_model']}):\n")
+    if emb_stats["sections_total"] == 0:
+        buf.append("  Inga sektioner att generera embeddings for.\n")
+    elif emb_stats["sections_with_embedding"] == emb_stats["sections_total"]:
+        buf.append(f"  [OK] {emb_stats['sections_with_embedding']}/{emb_stats['sections_total']} sektioner har embeddings\n")
+    else:
+        missing = emb_stats["sections_total"] - emb_stats["sections_with_embedding"]
+        buf.append(f"  [SAKNAS] {emb_stats['sections_with_embedding']}/{emb_stats['sections_total']} sektioner har embeddings ({missing} saknas)\n")
+
+    log_path.write_text("".join(buf), encoding="utf-8")
+
+    _print(f"[OK] Logg uppdaterad: {log_path}")
 
     # Synkronisera filer - tvåvägssynk med databasen
     sync_result = sync_files_with_database(company_slug, base_folder)
     if sync_result["moved_to_db"] > 0:
-        print(f"[OK] Flyttade {sync_result['moved_to_db']} fil(er) till ligger_i_databasen/")
+        _print(f"[OK] Flyttade {sync_result['moved_to_db']} fil(er) till ligger_i_databasen/")
     if sync_result["moved_to_extract"] > 0:
-        print(f"[OK] Flyttade tillbaka {sync_result['moved_to_extract']} fil(er) till skall_extractas/")
+        _print(f"[OK] Flyttade tillbaka {sync_result['moved_to_extract']} fil(er) till skall_extractas/")
 
-    return len(periods.data)
+    return len(periods)
+
+
+def _move_file(source: Path, target: Path) -> None:
+    """Flytta en fil med en atomisk rename, shutil.move om den korsar filsystem."""
+    try:
+        os.replace(source, target)
+    except OSError:
+        shutil.move(str(source), str(target))
 
 
 def move_file_after_extraction(
@@ -563,13 +799,13 @@ def move_file_after_extraction(
     base_folder = Path(base_folder)
 
     if not source_path.exists():
-        print(f"[!] Filen hittades inte: {source_path}")
+        _print(f"[!] Filen hittades inte: {source_path}")
         return None
 
     # Bestäm målmapp
     company_folder = base_folder / company_slug
     target_folder = company_folder / "ligger_i_databasen"
-    target_folder.mkdir(parents=True, exist_ok=True)
+    _ensure_dir(target_folder)
 
     target_path = target_folder / source_path.name
 
@@ -579,14 +815,24 @@ def move_file_after_extraction(
 
     # Flytta filen
     try:
-        shutil.move(str(source_path), str(target_path))
-        print(f"[OK] Flyttade: {source_path.name} -> ligger_i_databasen/")
+        _move_file(source_path, target_path)
+        _print(f"[OK] Flyttade: {source_path.name} -> ligger_i_databasen/")
         return target_path
     except Exception as e:
-        print(f"[!] Kunde inte flytta fil: {e}")
+        _print(f"[!] Kunde inte flytta fil: {e}")
         return None
 
 
+def _list_pdfs(folder: Path) -> dict[Path, os.DirEntry]:
+    """Lista PDF:er i en mapp med os.scandir (motsvarar glob("*.pdf"))."""
+    with os.scandir(folder) as entries:
+        return {
+            Path(entry.path): entry
+            for entry in entries
+            if entry.name.endswith(".pdf") and entry.is_file()
+        }
+
+
 def sync_files_with_database(company_slug: str, base_folder: Path | str) -> dict:
     """
     Tvåvägssynkronisering av filer med databasen.
@@ -601,8 +847,6 @@ def sync_files_with_database(company_slug: str, base_folder: Path | str) -> dict
     Returns:
         Dict med {moved_to_db: int, moved_to_extract: int, already_correct: int, not_in_db: int}
     """
-    from supabase_client import get_pdf_hash
-
     base_folder = Path(base_folder)
     company_folder = base_folder / company_slug
     skall_extractas = company_folder / "skall_extractas"
@@ -611,8 +855,8 @@ def sync_files_with_database(company_slug: str, base_folder: Path | str) -> dict
     result = {"moved_to_db": 0, "moved_to_extract": 0, "already_correct": 0, "not_in_db": 0}
 
     # Skapa mappar om de inte finns
-    skall_extractas.mkdir(parents=True, exist_ok=True)
-    ligger_i_db.mkdir(parents=True, exist_ok=True)
+    _ensure_dir(skall_extractas)
+    _ensure_dir(ligger_i_db)
 
     # Hämta bolag från databasen
     company = get_company_by_slug(company_slug)
@@ -624,7 +868,7 @@ def sync_files_with_database(company_slug: str, base_folder: Path | str) -> dict
     # Hämta alla perioder med pdf_hash
     client = get_client()
     periods = client.table("periods").select(
-        "id, pdf_hash, source_file"
+        "id, pdf_hash"
     ).eq("company_id", company_id).execute()
 
     # Bygg set med alla pdf_hash som finns i databasen
@@ -632,25 +876,44 @@ def sync_files_with_database(company_slug: str, base_folder: Path | str) -> dict
     if periods.data:
         db_hashes = {p["pdf_hash"] for p in periods.data if p.get("pdf_hash")}
 
-    # 1. Flytta filer från skall_extractas → ligger_i_databasen (om de finns i DB)
-    for pdf_file in list(skall_extractas.glob("*.pdf")):
-        try:
-            file_hash = get_pdf_hash(str(pdf_file))
-
-            if file_hash in db_hashes:
-                # Filen finns i databasen - flytta den
-                new_path = move_file_after_extraction(pdf_file, company_slug, base_folder)
-                if new_path:
-                    result["moved_to_db"] += 1
-            else:
-                result["not_in_db"] += 1
-        except Exception as e:
-            print(f"[!] Fel vid kontroll av {pdf_file.name}: {e}")
+    def _file_hash(pdf_file: Path) -> str:
+        # Hasha alltid filens innehåll - ett filnamn som matchar source_file i DB
+        # kan vara en rättad/ny rapport. Oförändrade (även flyttade) filer tas
+        # från hash-cachen i supabase_client.
+        return get_pdf_hash_cached(str(pdf_file))
+
+    # Hasha alla PDF:er parallellt. Filer i skall_extractas flyttas så fort
+    # deras hash är klar, medan övriga hashar fortfarande beräknas
+    pdfs_to_check = _list_pdfs(skall_extractas)
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as executor:
+        hash_futures = {
+            pdf_file: executor.submit(_file_hash, pdf_file)
+            for pdf_file in (pdfs_to_check | _list_pdfs(ligger_i_db))
+        }
+        pending = {hash_futures[pdf_file]: pdf_file for pdf_file in pdfs_to_check}
+
+        # 1. Flytta filer från skall_extractas → ligger_i_databasen (om de finns i DB)
+        for future in as_completed(pending):
+            pdf_file = pending[future]
+            try:
+                file_hash = future.result()
+
+                if file_hash in db_hashes:
+                    # Filen finns i databasen - flytta den
+                    new_path = move_file_after_extraction(pdf_file, company_slug, base_folder)
+                    if new_path:
+                        hash_futures[new_path] = hash_futures.pop(pdf_file)
+                        result["moved_to_db"] += 1
+                else:
+                    result["not_in_db"] += 1
+            except Exception as e:
+                _print(f"[!] Fel vid kontroll av {pdf_file.name}: {e}")
 
     # 2. Flytta filer från ligger_i_databasen → skall_extractas (om de INTE finns i DB)
-    for pdf_file in list(ligger_i_db.glob("*.pdf")):
+    for pdf_file in _list_pdfs(ligger_i_db):
         try:
-            file_hash = get_pdf_hash(str(pdf_file))
+            future = hash_futures.get(pdf_file)
+            file_hash = future.result() if future else _file_hash(pdf_file)
 
             if file_hash in db_hashes:
                 # Filen finns i databasen - ligger rätt
@@ -658,11 +921,11 @@ def sync_files_with_database(company_slug: str, base_folder: Path | str) -> dict
             else:
                 # Filen finns INTE i databasen - flytta tillbaka
                 target_path = skall_extractas / pdf_file.name
-                shutil.move(str(pdf_file), str(target_path))
-                print(f"[OK] Flyttade tillbaka: {pdf_file.name} -> skall_extractas/")
+                _move_file(pdf_file, target_path)
+                _print(f"[OK] Flyttade tillbaka: {pdf_file.name} -> skall_extractas/")
                 result["moved_to_extract"] += 1
         except Exception as e:
-            print(f"[!] Fel vid kontroll av {pdf_file.name}: {e}")
+            _print(f"[!] Fel vid kontroll av {pdf_file.name}: {e}")
 
     return result
 
@@ -748,17 +1011,22 @@ def regenerate_all_logs(base_folder: str | Path) -> dict:
         Dict med {company_slug: antal_rapporter}
     """
     base_folder = Path(base_folder)
-    results = {}
 
-    for company_folder in sorted(base_folder.iterdir()):
-        if not company_folder.is_dir():
-            continue
-        if company_folder.name.startswith(".") or company_folder.name == "__pycache__":
-            continue
-
-        company_slug = company_folder.name
-        count = update_extraction_log(company_slug, base_folder)
-        results[company_slug] = count
+    company_slugs = [
+        company_folder.name
+        for company_folder in sorted(base_folder.iterdir())
+        if company_folder.is_dir()
+        and not company_folder.name.startswith(".")
+        and company_folder.name != "__pycache__"
+    ]
+
+    # Varje bolag är oberoende I/O-bundet arbete - kör parallellt
+    with ThreadPoolExecutor(max_workers=LOG_WORKERS) as executor:
+        futures = {
+            slug: executor.submit(update_extraction_log, slug, base_folder)
+            for slug in company_slugs
+        }
+        results = {slug: future.result() for slug, future in futures.items()}
 
     # Skapa summeringslogg
     create_summary_log(base_folder)
@@ -766,44 +1034,50 @@ def regenerate_all_logs(base_folder: str | Path) -> dict:
     return results
 
 
-def create_summary_log(base_folder: str | Path) -> None:
+def get_company_summary(client) -> list[dict]:
     """
-    Skapa en summeringslogg för alla bolag i databasen.
+    Hämta rapporter, räkningar, kostnad och tid per bolag, sorterat på namn.
 
-    Args:
-        base_folder: Basmappen med bolagsmappar (t.ex. 'alla_rapporter')
+    Returns:
+        Lista med dict: {name, slug, reports, tables, sections, charts, cost, time}
     """
-    base_folder = Path(base_folder)
-    client = get_client()
+    # Försök använda optimerad RPC-funktion (kräver migration 004)
+    try:
+        rows = client.rpc("company_summary").execute().data or []
+    except Exception as e:
+        # Fallback till legacy-implementation om RPC inte finns
+        if "function" not in str(e).lower():
+            raise
+        return _get_company_summary_legacy(client)
+
+    return [
+        {
+            "name": row["name"],
+            "slug": row["slug"],
+            "reports": row["reports"],
+            "tables": row["tables"],
+            "sections": row["sections"],
+            "charts": row["charts"],
+            "cost": float(row["cost"] or 0),
+            "time": float(row["time_seconds"] or 0),
+        }
+        for row in rows
+    ]
 
-    # Hämta alla bolag från databasen
-    companies = client.table("companies").select("id, name, slug").execute()
 
-    if not companies.data:
-        print("[!] Inga bolag i databasen")
-        return
+def _get_company_summary_legacy(client) -> list[dict]:
+    """Sammanställ per bolag med separata queries om RPC saknas."""
+    companies = client.table("companies").select("id, name, slug").order("name").execute()
 
-    # Samla data per bolag
     company_data = []
-    total_reports = 0
-    total_tables = 0
-    total_sections = 0
-    total_charts = 0
-    total_cost = 0.0
-    total_time = 0.0
-
-    for company in sorted(companies.data, key=lambda c: c["name"]):
+    for company in (companies.data or []):
         company_id = company["id"]
-        company_name = company["name"]
-        company_slug = company["slug"]
 
-        # Hämta perioder för bolaget
+        # Hämta perioder för bolaget (bara kostnad och tid ur extraction_meta)
         periods = client.table("periods").select(
-            "id, extraction_meta"
+            "id, cost:extraction_meta->total_cost_sek, time:extraction_meta->total_elapsed_seconds"
         ).eq("company_id", company_id).execute()
 
-        num_reports = len(periods.data) if periods.data else 0
-
         # Hämta räkningar
         db_counts = get_total_counts_from_db(client, company_id)
 
@@ -811,14 +1085,13 @@ def create_summary_log(base_folder: str | Path) -> None:
         cost = 0.0
         time_s = 0.0
         for p in (periods.data or []):
-            meta = p.get("extraction_meta") or {}
-            cost += meta.get("total_cost_sek", 0) or 0
-            time_s += meta.get("total_elapsed_seconds", 0) or 0
+            cost += p.get("cost") or 0
+            time_s += p.get("time") or 0
 
         company_data.append({
-            "name": company_name,
-            "slug": company_slug,
-            "reports": num_reports,
+            "name": company["name"],
+            "slug": company["slug"],
+            "reports": len(periods.data) if periods.data else 0,
             "tables": db_counts["tables"],
             "sections": db_counts["sections"],
             "charts": db_counts["charts"],
@@ -826,106 +1099,174 @@ def create_summary_log(base_folder: str | Path) -> None:
             "time": time_s,
         })
 
-        total_reports += num_reports
-        total_tables += db_counts["tables"]
-        total_sections += db_counts["sections"]
-        total_charts += db_counts["charts"]
-        total_cost += cost
-        total_time += time_s
+    return company_data
+
+
+def get_global_counts(client) -> dict:
+    """
+    Hämta totalt antal tabeller, sektioner, grafer och sektioner med embedding.
+
+    Returns:
+        Dict med tables, sections, charts, sections_with_embedding
+    """
+    # Försök använda optimerad RPC-funktion (kräver migration 004)
+    try:
+        rows = client.rpc("stats_summary").execute().data or []
+    except Exception as e:
+        # Fallback till legacy-implementation om RPC inte finns
+        if "function" not in str(e).lower():
+            raise
+        return _get_global_counts_legacy(client)
+
+    row = rows[0] if rows else {}
+    return {
+        key: row.get(key) or 0
+        for key in ("tables", "sections", "charts", "sections_with_embedding")
+    }
+
+
+def _get_global_counts_legacy(client) -> dict:
+    """Räkna globala totaler med 4 parallella count-queries om RPC saknas."""
+    tables_f, sections_f, charts_f, with_emb_f = _execute_parallel([
+        lambda: client.table("report_tables").select("id", count="exact").execute(),
+        lambda: client.table("sections").select("id", count="exact").execute(),
+        lambda: client.table("charts").select("id", count="exact").execute(),
+        lambda: client.table("sections").select("id", count="exact").not_.is_("embedding", "null").execute(),
+    ])
+
+    try:
+        charts_count = charts_f.result().count or 0
+    except Exception:
+        charts_count = 0
+
+    return {
+        "tables": tables_f.result().count or 0,
+        "sections": sections_f.result().count or 0,
+        "charts": charts_count,
+        "sections_with_embedding": with_emb_f.result().count or 0,
+    }
+
+
+def create_summary_log(base_folder: str | Path) -> None:
+    """
+    Skapa en summeringslogg för alla bolag i databasen.
+
+    Args:
+        base_folder: Basmappen med bolagsmappar (t.ex. 'alla_rapporter')
+    """
+    base_folder = Path(base_folder)
+    client = get_client()
+
+    # Hämta sammanställning per bolag (1 RPC-anrop istället för N * 5 queries)
+    company_data = get_company_summary(client)
+
+    if not company_data:
+        print("[!] Inga bolag i databasen")
+        return
+
+    total_reports = 0
+    total_tables = 0
+    total_sections = 0
+    total_charts = 0
+    total_cost = 0.0
+    total_time = 0.0
+
+    for c in company_data:
+        total_reports += c["reports"]
+        total_tables += c["tables"]
+        total_sections += c["sections"]
+        total_charts += c["charts"]
+        total_cost += c["cost"]
+        total_time += c["time"]
 
     # Skriv summeringslogg
     log_path = base_folder / "SUMMARY_LOG.txt"
 
-    with open(log_path, "w", encoding="utf-8") as f:
-        f.write("#" * 80 + "\n")
-        f.write("# SUMMERINGSLOGG - ALLA BOLAG\n")
-        f.write(f"# Genererad: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("#" * 80 + "\n\n")
-
-        # Sammanfattning
-        f.write("SAMMANFATTNING:\n")
-        f.write(f"  Bolag: {len(company_data)}\n")
-        f.write(f"  Rapporter: {total_reports}\n")
-        f.write(f"  Tabeller: {total_tables} | Sektioner: {total_sections} | Grafer: {total_charts}\n")
-        f.write(f"  Kostnad: {total_cost:.2f} SEK | Tid: {total_time:.1f} sekunder\n\n")
-
-        # Tabell per bolag
-        widths = [20, 10, 10, 10, 8, 12, 10]
-        align = ["<", ">", ">", ">", ">", ">", ">"]
-
-        f.write("PER BOLAG:\n")
-        f.write(format_table_separator(widths) + "\n")
-        f.write(format_table_row(
-            ["Bolag", "Rapporter", "Tabeller", "Sektioner", "Grafer", "Kostnad", "Tid (s)"],
-            widths, align
-        ) + "\n")
-        f.write(format_table_separator(widths) + "\n")
-
-        for c in company_data:
-            row = [
-                c["name"][:20],
-                str(c["reports"]),
-                str(c["tables"]),
-                str(c["sections"]),
-                str(c["charts"]),
-                f"{c['cost']:.2f}",
-                f"{c['time']:.1f}",
-            ]
-            f.write(format_table_row(row, widths, align) + "\n")
-
-        # Totalrad
-        f.write(format_table_separator(widths) + "\n")
-        f.write(format_table_row(
-            ["TOTALT", str(total_reports), str(total_tables), str(total_sections),
-             str(total_charts), f"{total_cost:.2f}", f"{total_time:.1f}"],
-            widths, align
-        ) + "\n")
-        f.write(format_table_separator(widths) + "\n")
+    buf = []
+    buf.append("#" * 80 + "\n")
+    buf.append("# SUMMERINGSLOGG - ALLA BOLAG\n")
+    buf.append(f"# Genererad: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    buf.append("#" * 80 + "\n\n")
+
+    # Sammanfattning
+    buf.append("SAMMANFATTNING:\n")
+    buf.append(f"  Bolag: {len(company_data)}\n")
+    buf.append(f"  Rapporter: {total_reports}\n")
+    buf.append(f"  Tabeller: {total_tables} | Sektioner: {total_sections} | Grafer: {total_charts}\n")
+    buf.append(f"  Kostnad: {total_cost:.2f} SEK | Tid: {total_time:.1f} sekunder\n\n")
+
+    # Tabell per bolag
+    widths = [20, 10, 10, 10, 8, 12, 10]
+    align = ["<", ">", ">", ">", ">", ">", ">"]
+
+    buf.append("PER BOLAG:\n")
+    buf.append(format_table_separator(widths) + "\n")
+    buf.append(format_table_row(
+        ["Bolag", "Rapporter", "Tabeller", "Sektioner", "Grafer", "Kostnad", "Tid (s)"],
+        widths, align
+    ) + "\n")
+    buf.append(format_table_separator(widths) + "\n")
+
+    write_company_row = _make_row_writer(tuple(widths), tuple(align))
+    for c in company_data:
+        write_company_row(
+            buf,
+            c["name"][:20],
+            str(c["reports"]),
+            str(c["tables"]),
+            str(c["sections"]),
+            str(c["charts"]),
+            f"{c['cost']:.2f}",
+            f"{c['time']:.1f}",
+        )
+
+    # Totalrad
+    buf.append(format_table_separator(widths) + "\n")
+    buf.append(format_table_row(
+        ["TOTALT", str(total_reports), str(total_tables), str(total_sections),
+         str(total_charts), f"{total_cost:.2f}", f"{total_time:.1f}"],
+        widths, align
+    ) + "\n")
+    buf.append(format_table_separator(widths) + "\n")
+
+    # Verifiering mot databas
+    buf.append("\n\nVERIFIERING (direkt fran databas):\n")
+
+    # Hämta totaler direkt från tabellerna (1 RPC-anrop istället för 4 queries)
+    global_counts = get_global_counts(client)
+    db_tables = global_counts["tables"]
+    db_sections = global_counts["sections"]
+    db_charts = global_counts["charts"]
+
+    checks_passed = True
+    if total_tables != db_tables:
+        buf.append(f"  [AVVIKELSE] Tabeller: summerat={total_tables}, databas={db_tables}\n")
+        checks_passed = False
+    if total_sections != db_sections:
+        buf.append(f"  [AVVIKELSE] Sektioner: summerat={total_sections}, databas={db_sections}\n")
+        checks_passed = False
+    if total_charts != db_charts:
+        buf.append(f"  [AVVIKELSE] Grafer: summerat={total_charts}, databas={db_charts}\n")
+        checks_passed = False
+
+    if checks_passed:
+        buf.append(f"  [OK] Tabeller: {total_tables} | Sektioner: {total_sections} | Grafer: {total_charts}\n")
+
+    # ===== EMBEDDING-STATUS =====
+    from supabase_client import VOYAGE_MODEL
 
-        # Verifiering mot databas
-        f.write("\n\nVERIFIERING (direkt fran databas):\n")
+    emb_count = global_counts["sections_with_embedding"]
 
-        # Hämta totaler direkt från tabellerna
-        all_tables = client.table("report_tables").select("id", count="exact").execute()
-        all_sections = client.table("sections").select("id", count="exact").execute()
-        try:
-            all_charts = client.table("charts").select("id", count="exact").execute()
-            db_charts = all_charts.count or 0
-        except Exception:
-            db_charts = 0
-
-        db_tables = all_tables.count or 0
-        db_sections = all_sections.count or 0
-
-        checks_passed = True
-        if total_tables != db_tables:
-            f.write(f"  [AVVIKELSE] Tabeller: summerat={total_tables}, databas={db_tables}\n")
-            checks_passed = False
-        if total_sections != db_sections:
-            f.write(f"  [AVVIKELSE] Sektioner: summerat={total_sections}, databas={db_sections}\n")
-            checks_passed = False
-        if total_charts != db_charts:
-            f.write(f"  [AVVIKELSE] Grafer: summerat={total_charts}, databas={db_charts}\n")
-            checks_passed = False
-
-        if checks_passed:
-            f.write(f"  [OK] Tabeller: {total_tables} | Sektioner: {total_sections} | Grafer: {total_charts}\n")
-
-        # ===== EMBEDDING-STATUS =====
-        from supabase_client import VOYAGE_MODEL
-
-        # Räkna sections med embedding
-        sections_with_emb = client.table("sections").select("id", count="exact").not_.is_("embedding", "null").execute()
-        emb_count = sections_with_emb.count or 0
-
-        f.write(f"\nEMBEDDINGS (modell: {VOYAGE_MODEL}):\n")
-        if db_sections == 0:
-            f.write("  Inga sektioner att generera embeddings for.\n")
-        elif emb_count == db_sections:
-            f.write(f"  [OK] {emb_count}/{db_sections} sektioner har embeddings\n")
-        else:
-            missing = db_sections - emb_count
-            f.write(f"  [SAKNAS] {emb_count}/{db_sections} sektioner har embeddings ({missing} saknas)\n")
+    buf.append(f"\nEMBEDDINGS (modell: {VOYAGE_MODEL}):\n")
+    if db_sections == 0:
+        buf.append("  Inga sektioner att generera embeddings for.\n")
+    elif emb_count == db_sections:
+        buf.append(f"  [OK] {emb_count}/{db_sections} sektioner har embeddings\n")
+    else:
+        missing = db_sections - emb_count
+        buf.append(f"  [SAKNAS] {emb_count}/{db_sections} sektioner har embeddings ({missing} saknas)\n")
+
+    log_path.write_text("".join(buf), encoding="utf-8")
 
     print(f"[OK] Summeringslogg skapad: {log_path}")
 
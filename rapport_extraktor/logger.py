@@ -20,9 +20,16 @@ Användning:
     logger.error("[FEL] Kunde inte extrahera tabell")
 """
 
+import atexit
+import functools
 import logging
+import logging.handlers
 import os
+import queue
+import re
 import sys
+import time
+import unicodedata
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
@@ -31,6 +38,21 @@ from typing import Optional
 _logger: Optional[logging.Logger] = None
 _log_file_path: Optional[Path] = None
 
+# Förkompilerade regex för slugify
+_SLUG_STRIP_RE = re.compile(r'[^\w\s-]')
+_SLUG_DASH_RE = re.compile(r'[-\s]+')
+
+
+@functools.lru_cache(maxsize=None)
+def _module_column(name: str) -> str:
+    """Sista delen av loggernamnet, begränsad och utfylld till 20 tecken (cachas per logger)."""
+    return f"{name.rpartition('.')[2][:20]:<20}"
+
+
+def _format_timestamp(created: float) -> str:
+    """Tidsstämpel för loggraden, utan att skapa ett datetime-objekt per rad."""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(created))
+
 
 class ColoredFormatter(logging.Formatter):
     """Formatter med ANSI-färger för konsol-output."""
@@ -45,31 +67,37 @@ class ColoredFormatter(logging.Formatter):
         'RESET': '\033[0m',      # Reset
     }
 
-    def format(self, record: logging.LogRecord) -> str:
-        # Lägg till färg baserat på nivå
-        color = self.COLORS.get(record.levelname, self.COLORS['RESET'])
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Färgkodade nivåer byggs en gång istället för per loggrad
         reset = self.COLORS['RESET']
+        self._colored_levels = {
+            level: f"{color}{level:<8}{reset}"
+            for level, color in self.COLORS.items()
+            if level != 'RESET'
+        }
 
-        # Formatera meddelandet
-        timestamp = datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S')
+    def format(self, record: logging.LogRecord) -> str:
         level = record.levelname
-        module = record.name.split('.')[-1][:20]  # Begränsa modulnamn till 20 tecken
-
-        # Färgkoda nivå
-        colored_level = f"{color}{level:<8}{reset}"
+        colored_level = self._colored_levels.get(level)
+        if colored_level is None:
+            reset = self.COLORS['RESET']
+            colored_level = f"{reset}{level:<8}{reset}"
 
-        return f"{timestamp} | {colored_level} | {module:<20} | {record.getMessage()}"
+        return (
+            f"{_format_timestamp(record.created)} | {colored_level} | "
+            f"{_module_column(record.name)} | {record.getMessage()}"
+        )
 
 
 class PlainFormatter(logging.Formatter):
     """Formatter utan färger för fil-output."""
 
     def format(self, record: logging.LogRecord) -> str:
-        timestamp = datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S')
-        level = record.levelname
-        module = record.name.split('.')[-1][:20]
-
-        return f"{timestamp} | {level:<8} | {module:<20} | {record.getMessage()}"
+        return (
+            f"{_format_timestamp(record.created)} | {record.levelname:<8} | "
+            f"{_module_column(record.name)} | {record.getMessage()}"
+        )
 
 
 class SupabaseHandler(logging.Handler):
@@ -91,7 +119,8 @@ class SupabaseHandler(logging.Handler):
                 log_level=record.levelname,
                 module=record.name.split('.')[-1],
                 message=record.getMessage(),
-                period_id=self.period_id,
+                # period_id stämplas när posten köas (se _stamp_period_id)
+                period_id=getattr(record, 'period_id', self.period_id),
                 company_id=self.company_id,
             )
         except Exception:
@@ -101,6 +130,30 @@ class SupabaseHandler(logging.Handler):
 # Global Supabase handler (för att kunna sätta period_id senare)
 _supabase_handler: Optional[SupabaseHandler] = None
 
+# Loggposter buffras i minnet och skrivs till fil i klump (tidigare vid WARNING+)
+FILE_LOG_BUFFER_RECORDS = 1024
+
+# Bakgrundstråd som skickar köade loggposter till Supabase
+_supabase_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _stamp_period_id(record: logging.LogRecord) -> bool:
+    """Spara aktuellt period_id på posten innan den köas, så att den kopplas rätt."""
+    if _supabase_handler is not None:
+        record.period_id = _supabase_handler.period_id
+    return True
+
+
+def _stop_supabase_listener() -> None:
+    """Stoppa bakgrundstråden och skicka kvarvarande loggposter."""
+    global _supabase_listener
+    if _supabase_listener is not None:
+        _supabase_listener.stop()
+        _supabase_listener = None
+
+
+atexit.register(_stop_supabase_listener)
+
 
 def set_period_id(period_id: str):
     """Sätt period_id på Supabase-handler för att koppla loggar till extraktion."""
@@ -129,13 +182,15 @@ def setup_logger(
     Returns:
         Konfigurerad logger-instans
     """
-    global _logger, _log_file_path, _supabase_handler
+    global _logger, _log_file_path, _supabase_handler, _supabase_listener
 
     # Skapa eller återanvänd logger
     logger = logging.getLogger('rapport_extraktor')
     logger.setLevel(logging.DEBUG)  # Sätt lägsta nivå
 
-    # Ta bort befintliga handlers för att undvika dubbletter
+    # Ta bort befintliga handlers för att undvika dubbletter (close tömmer filbufferten)
+    for handler in logger.handlers:
+        handler.close()
     logger.handlers.clear()
 
     # === KONSOL HANDLER ===
@@ -166,19 +221,38 @@ def setup_logger(
         log_filename = f"extraction_run_{timestamp}.log"
         _log_file_path = log_folder / log_filename
 
-        # Skapa file handler
+        # Skapa file handler, buffrad så att varje post inte blir ett eget write-anrop
         file_handler = logging.FileHandler(_log_file_path, encoding='utf-8')
         file_handler.setLevel(file_level)
         file_handler.setFormatter(PlainFormatter())
-        logger.addHandler(file_handler)
+        buffered_handler = logging.handlers.MemoryHandler(
+            capacity=FILE_LOG_BUFFER_RECORDS,
+            flushLevel=logging.WARNING,
+            target=file_handler,
+        )
+        buffered_handler.setLevel(file_level)
+        logger.addHandler(buffered_handler)
 
         logger.info(f"[LOGG] Loggfil skapad: {_log_file_path}")
 
     # === SUPABASE HANDLER (om cloud-läge och company_id finns) ===
+    # Tidigare listener (från förra setup_logger) töms innan en ny startas
+    _stop_supabase_listener()
     if os.getenv("STORAGE_MODE") == "cloud" and company_id:
         _supabase_handler = SupabaseHandler(company_id=company_id)
         _supabase_handler.setLevel(logging.INFO)  # Endast INFO+ till Supabase
-        logger.addHandler(_supabase_handler)
+
+        # HTTP-anropet görs i en bakgrundstråd - logger.info() köar bara posten
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        queue_handler.setLevel(logging.INFO)
+        queue_handler.addFilter(_stamp_period_id)
+        logger.addHandler(queue_handler)
+
+        _supabase_listener = logging.handlers.QueueListener(
+            log_queue, _supabase_handler, respect_handler_level=True
+        )
+        _supabase_listener.start()
         logger.info("[LOGG] Supabase-loggning aktiverad")
 
     _logger = logger
@@ -212,6 +286,12 @@ def get_logger(name: str = 'rapport_extraktor') -> logging.Logger:
             _logger.addHandler(handler)
 
     # Returnera child logger för modulen
+    return _child_logger(name)
+
+
+@functools.lru_cache(maxsize=None)
+def _child_logger(name: str) -> logging.Logger:
+    """Child logger per modulnamn, cachad så att logging-managerns lås bara tas första gången."""
     return logging.getLogger(f'rapport_extraktor.{name}')
 
 
@@ -230,17 +310,14 @@ def slugify(text: str) -> str:
     Returns:
         Slug-version av texten
     """
-    import re
-    import unicodedata
-
     # Normalisera unicode (t.ex. å -> a)
     text = unicodedata.normalize('NFKD', text)
     text = text.encode('ascii', 'ignore').decode('ascii')
 
     # Lowercase och ersätt mellanslag/specialtecken med bindestreck
     text = text.lower()
-    text = re.sub(r'[^\w\s-]', '', text)
-    text = re.sub(r'[-\s]+', '-', text).strip('-')
+    text = _SLUG_STRIP_RE.sub('', text)
+    text = _SLUG_DASH_RE.sub('-', text).strip('-')
 
     return text
 
@@ -252,11 +329,12 @@ def slugify(text: str) -> str:
 def log_extraction_start(pdf_path: str, company_name: str, pipeline: str) -> None:
     """Logga start av extraktion."""
     logger = get_logger('extraction')
-    filename = Path(pdf_path).name
-    logger.info(f"{'=' * 60}")
-    logger.info(f"[START] Extraherar: {filename}")
-    logger.info(f"[START] Bolag: {company_name} | Pipeline: {pipeline}")
-    logger.info(f"{'=' * 60}")
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    logger.info('=' * 60)
+    logger.info("[START] Extraherar: %s", Path(pdf_path).name)
+    logger.info("[START] Bolag: %s | Pipeline: %s", company_name, pipeline)
+    logger.info('=' * 60)
 
 
 def log_extraction_complete(
@@ -269,19 +347,20 @@ def log_extraction_complete(
 ) -> None:
     """Logga slutförd extraktion."""
     logger = get_logger('extraction')
-    filename = Path(pdf_path).name
-    logger.info(f"[RESULTAT] {filename}")
-    logger.info(f"   Tabeller: {tables} | Sektioner: {sections} | Grafer: {charts}")
-    logger.info(f"   Kostnad: {cost_sek:.4f} SEK | Tid: {elapsed_seconds:.1f}s")
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    logger.info("[RESULTAT] %s", Path(pdf_path).name)
+    logger.info("   Tabeller: %s | Sektioner: %s | Grafer: %s", tables, sections, charts)
+    logger.info("   Kostnad: %.4f SEK | Tid: %.1fs", cost_sek, elapsed_seconds)
 
 
 def log_ocr_progress(page_num: int, total_pages: int, elapsed: float = 0) -> None:
     """Logga OCR-progress per sida."""
     logger = get_logger('ocr')
     if elapsed > 0:
-        logger.info(f"[OCR] Sida {page_num}/{total_pages} klar ({elapsed:.1f}s)")
+        logger.info("[OCR] Sida %s/%s klar (%.1fs)", page_num, total_pages, elapsed)
     else:
-        logger.info(f"[OCR] Sida {page_num}/{total_pages} klar")
+        logger.info("[OCR] Sida %s/%s klar", page_num, total_pages)
 
 
 def log_embedding_progress(
@@ -293,9 +372,9 @@ def log_embedding_progress(
     """Logga embedding-generering progress."""
     logger = get_logger('embeddings')
     if success:
-        logger.info(f"[EMBEDDING] Batch {batch_num}: {processed}/{total} sektioner")
+        logger.info("[EMBEDDING] Batch %s: %s/%s sektioner", batch_num, processed, total)
     else:
-        logger.warning(f"[EMBEDDING] Batch {batch_num}: FEL vid generering")
+        logger.warning("[EMBEDDING] Batch %s: FEL vid generering", batch_num)
 
 
 def log_validation_result(
@@ -309,30 +388,34 @@ def log_validation_result(
     logger = get_logger('validation')
 
     if is_valid:
-        logger.info(f"[VALIDERING] OK - {tables_extracted}/{tables_expected} tabeller")
+        logger.info("[VALIDERING] OK - %s/%s tabeller", tables_extracted, tables_expected)
     else:
-        logger.warning(f"[VALIDERING] PROBLEM - {tables_extracted}/{tables_expected} tabeller")
+        logger.warning("[VALIDERING] PROBLEM - %s/%s tabeller", tables_extracted, tables_expected)
 
     for warning in warnings:
-        logger.warning(f"   VARNING: {warning}")
+        logger.warning("   VARNING: %s", warning)
 
     for error in errors:
-        logger.error(f"   FEL: {error}")
+        logger.error("   FEL: %s", error)
 
 
 def log_api_request(model: str, operation: str, tokens_in: int = 0, tokens_out: int = 0) -> None:
     """Logga API-request (DEBUG-nivå)."""
     logger = get_logger('api')
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
     if tokens_in > 0 or tokens_out > 0:
-        logger.debug(f"[API] {model} - {operation}: {tokens_in} in / {tokens_out} ut tokens")
+        logger.debug("[API] %s - %s: %s in / %s ut tokens", model, operation, tokens_in, tokens_out)
     else:
-        logger.debug(f"[API] {model} - {operation}")
+        logger.debug("[API] %s - %s", model, operation)
 
 
 def log_file_operation(operation: str, source: str, destination: str = "") -> None:
     """Logga filoperationer."""
     logger = get_logger('files')
+    if not logger.isEnabledFor(logging.INFO):
+        return
     if destination:
-        logger.info(f"[FIL] {operation}: {Path(source).name} -> {destination}")
+        logger.info("[FIL] %s: %s -> %s", operation, Path(source).name, destination)
     else:
-        logger.info(f"[FIL] {operation}: {Path(source).name}")
+        logger.info("[FIL] %s: %s", operation, Path(source).name)
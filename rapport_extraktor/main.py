@@ -12,6 +12,9 @@ Användning:
     # Full extraktion - extrahera ALL text och alla tabeller
     python main.py ./rapporter/ --company "Freemelt" -o databok.xlsx --full
 
+    # Claude-anrop via Message Batches API (halva priset, svar inom 24h)
+    python main.py ./rapporter/ --company "Freemelt" -o databok.xlsx --batch-api
+
     # Lägg till nya rapporter till befintlig databok
     python main.py --company "Freemelt" --add ny_rapport.pdf -o databok.xlsx
 
@@ -25,8 +28,11 @@ Användning:
 import argparse
 import asyncio
 import gc
+import re
 import sys
+import threading
 import time
+from datetime import datetime
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -34,20 +40,80 @@ from dotenv import load_dotenv
 from pipeline import extract_all_pdfs_multi_pass
 from pipeline_mistral_v2 import extract_pdf_mistral_v2, get_mistral_client
 from excel_builder import build_databook
-from supabase_client import list_companies, get_or_create_company, slugify, check_database_setup, load_all_periods
+from supabase_client import (
+    list_companies,
+    get_or_create_company,
+    slugify,
+    check_database_setup,
+    load_all_periods,
+    list_periods_by_company,
+    period_exists,
+    get_pdf_hash_cached,
+)
+from extraction_log import sync_files_with_database
 from logger import setup_logger, get_logger
 from checkpoint import (
     generate_batch_id,
     save_checkpoint,
     get_completed_files,
-    add_completed_file,
-    add_failed_file,
+    add_files,
     get_batch_progress,
 )
 
 # Ladda miljövariabler
 load_dotenv()
 
+# Max antal PDFs i arbete samtidigt i Mistral-batchen (OCR-steget har egen gräns)
+MISTRAL_PARALLEL_PDFS = 4
+
+# GC-trösklar under en batch: färre gen-0-svep av tillfälliga PDF-buffertar
+BATCH_GC_THRESHOLD = (50_000, 50, 50)
+
+# Checkpoint skrivs i klump: efter så många händelser eller så många sekunder
+CHECKPOINT_FLUSH_EVENTS = 16
+CHECKPOINT_FLUSH_SECONDS = 2.0
+
+# Databok-mappar som redan skapats i denna process (get_databook_path)
+_DATABOOK_DIRS: set[Path] = set()
+
+# Hur ofta progress-vyn ritas om när något har ändrats (sekunder)
+PROGRESS_RENDER_INTERVAL = 0.1
+
+
+async def _checkpoint_writer(batch_id: str, events: asyncio.Queue) -> None:
+    """
+    Töm kön med checkpoint-händelser och skriv dem i klump.
+
+    Händelser är ("done", sökväg) eller ("failed", sökväg, fel). Varje
+    skrivning samlar upp till CHECKPOINT_FLUSH_EVENTS händelser, eller det
+    som hunnit komma inom CHECKPOINT_FLUSH_SECONDS.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await events.get()]
+        deadline = loop.time() + CHECKPOINT_FLUSH_SECONDS
+        while len(batch) < CHECKPOINT_FLUSH_EVENTS:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(events.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        completed = [event[1] for event in batch if event[0] == "done"]
+        failed = [
+            {"path": event[1], "error": event[2], "timestamp": datetime.now().isoformat()}
+            for event in batch if event[0] == "failed"
+        ]
+        try:
+            await asyncio.to_thread(add_files, batch_id, completed, failed)
+        except Exception as e:
+            get_logger('batch_mistral').warning(f"[CHECKPOINT] Kunde inte spara: {e}")
+        finally:
+            for _ in batch:
+                events.task_done()
+
 
 async def extract_all_pdfs_mistral(
     pdf_paths: list[str],
@@ -57,7 +123,8 @@ async def extract_all_pdfs_mistral(
     base_folder: str | None = None,
     quiet: bool = False,
     resume: bool = False,
-    batch_size: int = 5,
+    gc_every_n: int = 10,
+    pdf_hashes: dict[str, str] | None = None,
 ) -> tuple[list[dict], list[tuple[str, str]]]:
     """
     Wrapper för Mistral v2-pipelinen med checkpoint-stöd.
@@ -71,10 +138,9 @@ async def extract_all_pdfs_mistral(
         base_folder: Basmapp för fillagring
         quiet: Undertryck utskrifter
         resume: Återuppta från checkpoint om True
-        batch_size: Antal PDFs per batch
+        gc_every_n: Kör en (gen 0-1) GC efter så här många klara PDFs
+        pdf_hashes: Redan beräknade hashar {sökväg: hash} så att PDF:en inte hashas igen
     """
-    from supabase_client import get_or_create_company
-
     company = get_or_create_company(company_name)
     logger = get_logger('batch_mistral')
 
@@ -92,39 +158,67 @@ async def extract_all_pdfs_mistral(
             logger.info(f"[CHECKPOINT] Återupptar batch - hoppar över {original_count - len(pdf_paths)} redan extraherade")
 
     client = get_mistral_client()
-    semaphore = asyncio.Semaphore(2)  # Max 2 parallella PDFs
+    semaphore = asyncio.Semaphore(2)  # Max 2 PDFs i OCR-steget samtidigt
+    pdf_semaphore = asyncio.Semaphore(MISTRAL_PARALLEL_PDFS)
+
+    # Resultat per index så att ordningen blir densamma som pdf_paths
+    outcomes: list[dict | tuple[str, str] | None] = [None] * len(pdf_paths)
+    done_count = 0
 
-    successful = []
-    failed = []
+    # Checkpoint-händelser skrivs av en bakgrundstask istället för en fil-skrivning per PDF
+    checkpoint_events: asyncio.Queue = asyncio.Queue()
+    checkpoint_writer = asyncio.create_task(_checkpoint_writer(batch_id, checkpoint_events))
 
     logger.info(f"[BATCH] Startar extraktion av {len(pdf_paths)} PDFs med Mistral")
 
-    for i, pdf_path in enumerate(pdf_paths):
-        try:
-            result = await extract_pdf_mistral_v2(
-                pdf_path=pdf_path,
-                client=client,
-                semaphore=semaphore,
-                company_id=company["id"],
-                company_name=company_name,
-                progress_callback=progress_callback,
-                use_cache=use_cache,
-                base_folder=base_folder,
-                quiet=quiet,
-            )
-            successful.append(result)
-            add_completed_file(batch_id, str(pdf_path))
-            logger.info(f"[BATCH] {i+1}/{len(pdf_paths)} klar: {Path(pdf_path).name}")
-        except Exception as e:
-            failed.append((pdf_path, str(e)))
-            add_failed_file(batch_id, str(pdf_path), str(e))
-            logger.error(f"[BATCH] {i+1}/{len(pdf_paths)} FEL: {Path(pdf_path).name} - {e}")
-            if progress_callback:
-                progress_callback(pdf_path, f"failed: {e}", None)
+    async def run_one(index: int, pdf_path: str) -> None:
+        nonlocal done_count
+        async with pdf_semaphore:
+            try:
+                result = await extract_pdf_mistral_v2(
+                    pdf_path=pdf_path,
+                    client=client,
+                    semaphore=semaphore,
+                    company_id=company["id"],
+                    company_name=company_name,
+                    progress_callback=progress_callback,
+                    use_cache=use_cache,
+                    base_folder=base_folder,
+                    quiet=quiet,
+                    pdf_hash=pdf_hashes.get(str(pdf_path)) if pdf_hashes else None,
+                )
+                outcomes[index] = result
+                done_count += 1
+                checkpoint_events.put_nowait(("done", str(pdf_path)))
+                logger.info(f"[BATCH] {done_count}/{len(pdf_paths)} klar: {Path(pdf_path).name}")
+            except Exception as e:
+                outcomes[index] = (pdf_path, str(e))
+                done_count += 1
+                checkpoint_events.put_nowait(("failed", str(pdf_path), str(e)))
+                logger.error(f"[BATCH] {done_count}/{len(pdf_paths)} FEL: {Path(pdf_path).name} - {e}")
+                if progress_callback:
+                    progress_callback(pdf_path, f"failed: {e}", None)
+
+            # Minnesrensning av unga generationer - långlivad data är frusen
+            if done_count % gc_every_n == 0:
+                gc.collect(1)
+
+    # PDFs körs parallellt - OCR-steget begränsas av semaphore, övriga steg överlappar
+    # Frys befintliga (långlivade) objekt och höj gen-0-tröskeln under batchen,
+    # så att GC inte går igenom bolags-/perioddata för varje ny PDF-buffert
+    old_gc_threshold = gc.get_threshold()
+    gc.freeze()
+    gc.set_threshold(*BATCH_GC_THRESHOLD)
+    try:
+        await asyncio.gather(*(run_one(i, p) for i, p in enumerate(pdf_paths)), return_exceptions=True)
+        await checkpoint_events.join()
+    finally:
+        checkpoint_writer.cancel()
+        gc.set_threshold(*old_gc_threshold)
+        gc.unfreeze()
 
-        # Minnesrensning var 5:e fil
-        if (i + 1) % batch_size == 0:
-            gc.collect()
+    successful = [o for o in outcomes if isinstance(o, dict)]
+    failed = [o for o in outcomes if isinstance(o, tuple)]
 
     # Spara slutlig checkpoint
     save_checkpoint(batch_id, [str(p) for p in pdf_paths if any(r.get("_source_file") == str(p) for r in successful)],
@@ -141,14 +235,17 @@ SONNET_INPUT_PRICE = 3.00  # $3.00 per 1M input tokens
 SONNET_OUTPUT_PRICE = 15.00  # $15.00 per 1M output tokens
 USD_TO_SEK = 10.50   # Ungefärlig växelkurs
 
+# SEK per token (input, output), förberäknat per modell
+SEK_PER_TOKEN = {
+    "haiku": (HAIKU_INPUT_PRICE / 1_000_000 * USD_TO_SEK, HAIKU_OUTPUT_PRICE / 1_000_000 * USD_TO_SEK),
+    "sonnet": (SONNET_INPUT_PRICE / 1_000_000 * USD_TO_SEK, SONNET_OUTPUT_PRICE / 1_000_000 * USD_TO_SEK),
+}
+
 
 def calculate_cost(input_tokens: int, output_tokens: int, model: str = "sonnet") -> float:
     """Beräkna kostnad i SEK baserat på modell."""
-    if model == "haiku":
-        usd = (input_tokens * HAIKU_INPUT_PRICE + output_tokens * HAIKU_OUTPUT_PRICE) / 1_000_000
-    else:
-        usd = (input_tokens * SONNET_INPUT_PRICE + output_tokens * SONNET_OUTPUT_PRICE) / 1_000_000
-    return usd * USD_TO_SEK
+    input_sek, output_sek = SEK_PER_TOKEN["haiku" if model == "haiku" else "sonnet"]
+    return input_tokens * input_sek + output_tokens * output_sek
 
 
 def get_databook_path(
@@ -179,50 +276,74 @@ def get_databook_path(
     # Sökväg till ligger_i_databasen
     target_folder = base_folder / company_slug / "ligger_i_databasen"
 
-    # Skapa mappen om den inte finns
-    target_folder.mkdir(parents=True, exist_ok=True)
+    # Skapa mappen om den inte finns - bara en gång per process och mapp
+    if target_folder not in _DATABOOK_DIRS:
+        target_folder.mkdir(parents=True, exist_ok=True)
+        _DATABOOK_DIRS.add(target_folder)
 
     return target_folder / filename
 
 
 def print_pipeline_details(results: list[dict]):
     """Visa detaljerad timing och kostnad per pass for multi-pass extraktion."""
+    # Alla rader samlas och skrivs med ett anrop
+    lines = []
     for result in results:
         pipeline_info = result.get("_pipeline_info")
         if not pipeline_info:
             continue
 
         period = result.get("metadata", {}).get("period", "?")
-        print(f"\n[i] {period} - Pipeline detaljer:")
-        print(f"   {'Pass':<8} {'Modell':<8} {'Tid':<8} {'Input':<10} {'Output':<10} {'Kostnad':<10}")
-        print(f"   {'-'*54}")
-
-        total_time = 0
-        for p in pipeline_info.get("passes", []):
-            pass_num = p.get("pass", "?")
-            model = p.get("model", "?")
-            elapsed = p.get("elapsed_seconds", 0)
-            input_tok = p.get("input_tokens", 0)
-            output_tok = p.get("output_tokens", 0)
-            cost = p.get("cost_sek", 0)
-            total_time += elapsed
-
-            print(f"   Pass {pass_num:<3} {model:<8} {elapsed:>5.1f}s   {input_tok:>8,}   {output_tok:>8,}   {cost:>7.4f} kr")
+        lines.append(f"\n[i] {period} - Pipeline detaljer:")
+        lines.append(f"   {'Pass':<8} {'Modell':<8} {'Tid':<8} {'Input':<10} {'Output':<10} {'Kostnad':<10}")
+        lines.append(f"   {'-'*54}")
+
+        rows = [
+            (
+                p.get("pass", "?"),
+                p.get("model", "?"),
+                p.get("elapsed_seconds", 0),
+                p.get("input_tokens", 0),
+                p.get("output_tokens", 0),
+                p.get("cost_sek", 0),
+            )
+            for p in pipeline_info.get("passes", [])
+        ]
+        total_time = sum(row[2] for row in rows)
+        lines.extend(
+            f"   Pass {pass_num:<3} {model:<8} {elapsed:>5.1f}s   {input_tok:>8,}   {output_tok:>8,}   {cost:>7.4f} kr"
+            for pass_num, model, elapsed, input_tok, output_tok, cost in rows
+        )
 
         # Visa retry-statistik om det finns
         retry_stats = pipeline_info.get("retry_stats", {})
-        if retry_stats.get("retry_count", 0) > 0:
+        retry_count = retry_stats.get("retry_count", 0)
+        if retry_count > 0:
             retry_time = retry_stats.get("elapsed_seconds", 0)
             retry_input = retry_stats.get("input_tokens", 0)
             retry_output = retry_stats.get("output_tokens", 0)
             retry_cost = retry_stats.get("cost_sek", 0)
-            retry_count = retry_stats.get("retry_count", 0)
             total_time += retry_time
-            print(f"   Retry({retry_count}) {'haiku':<8} {retry_time:>5.1f}s   {retry_input:>8,}   {retry_output:>8,}   {retry_cost:>7.4f} kr")
+            lines.append(f"   Retry({retry_count}) {'haiku':<8} {retry_time:>5.1f}s   {retry_input:>8,}   {retry_output:>8,}   {retry_cost:>7.4f} kr")
 
         total_cost = pipeline_info.get("total_cost_sek", 0)
-        print(f"   {'-'*54}")
-        print(f"   {'Totalt':<17} {total_time:>5.1f}s   {'':>8}   {'':>8}   {total_cost:>7.2f} kr")
+        lines.append(f"   {'-'*54}")
+        lines.append(f"   {'Totalt':<17} {total_time:>5.1f}s   {'':>8}   {'':>8}   {total_cost:>7.2f} kr")
+
+    if lines:
+        sys.stdout.write("\n".join(lines) + "\n")
+
+
+_PERIOD_YEAR_RE = re.compile(r'(\d{4})')
+_PERIOD_QUARTER_RE = re.compile(r'Q(\d)')
+
+
+def _period_key(period_data: dict) -> tuple[int, int]:
+    """Sorteringsnyckel (år, kvartal) för en period från load_all_periods."""
+    period = period_data.get("metadata", {}).get("period", "")
+    year = _PERIOD_YEAR_RE.search(period)
+    quarter = _PERIOD_QUARTER_RE.search(period)
+    return (int(year.group(1)) if year else 0, int(quarter.group(1)) if quarter else 0)
 
 
 def format_time(seconds: float) -> str:
@@ -238,10 +359,9 @@ def create_progress_tracker(pdf_paths: list[str]):
     """
     Skapa progress-callback för terminal-output med en rad per fil.
     Visar tokens, kostnad och tid för varje fil.
-    Inkluderar bakgrundstimer som uppdaterar UI var 0.5 sekund.
+    Händelser markerar bara UI:t som ändrat - en bakgrundstimer ritar om
+    högst var PROGRESS_RENDER_INTERVAL sekund (och var 0.5 s för löpande tider).
     """
-    import threading
-
     # Behåll ordning med lista av sökvägar
     path_order = [str(p) for p in pdf_paths]
     files = {str(p): {
@@ -263,12 +383,20 @@ def create_progress_tracker(pdf_paths: list[str]):
         "failed": 0,
         "start_time": time.time(),
         "running": True,  # För att stoppa bakgrundstimern
+        "dirty": False,  # Satt av on_progress, ritas om av timern
+        "last_render": 0.0,
     }
+    render_lock = threading.Lock()
 
     def render():
-        # Flytta cursor upp till första progress-raden
+        # Nollställ dirty innan filerna läses - en händelse som kommer medan
+        # skärmen byggs markerar den igen och ritas i nästa varv
+        state["dirty"] = False
+
+        # Bygg hela skärmen i en buffert och skriv den med ett enda anrop
         num_lines = len(files) + 1  # +1 för total-rad
-        sys.stdout.write(f"\033[{num_lines}A")
+        # Flytta cursor upp till första progress-raden
+        out = [f"\033[{num_lines}A"]
 
         for path in path_order:
             info = files[path]
@@ -307,14 +435,18 @@ def create_progress_tracker(pdf_paths: list[str]):
                 details = ""
 
             # Rensa ENDAST denna rad, skriv sedan innehåll
-            sys.stdout.write(f"\033[2K{icon} {info['name']:<35} {details}\n")
+            out.append(f"\033[2K{icon} {info['name']:<35} {details}\n")
 
         # Totalt - rensa endast denna rad
         total_tokens = state["total_input_tokens"] + state["total_output_tokens"]
         total_cost = state["total_cost"]
         elapsed = time.time() - state["start_time"]
-        sys.stdout.write(f"\033[2K    Totalt: {total_tokens:,} tokens | {total_cost:.2f} kr | {format_time(elapsed)}\n")
-        sys.stdout.flush()
+        out.append(f"\033[2K    Totalt: {total_tokens:,} tokens | {total_cost:.2f} kr | {format_time(elapsed)}\n")
+
+        with render_lock:
+            state["last_render"] = time.time()
+            sys.stdout.write("".join(out))
+            sys.stdout.flush()
 
     def on_progress(pdf_path: str, status: str, token_info: dict | None = None):
         path_key = str(pdf_path)
@@ -345,7 +477,8 @@ def create_progress_tracker(pdf_paths: list[str]):
             # Uppdatera pass-info utan att ändra status
             files[path_key]["pass_info"] = status
 
-        render()
+        # Rita inte om per händelse - timern samlar ihop ändringarna
+        state["dirty"] = True
 
     # Initial render - skapa plats för alla rader (files + 1 total-rad)
     for _ in range(len(files) + 1):
@@ -355,18 +488,25 @@ def create_progress_tracker(pdf_paths: list[str]):
     # Bakgrundstimer för regelbundna uppdateringar
     def timer_loop():
         while state["running"]:
-            time.sleep(0.5)
+            time.sleep(PROGRESS_RENDER_INTERVAL)
             if state["running"]:  # Kolla igen efter sleep
-                # Bara rendera om något pågår
-                any_extracting = any(f["status"] == "extracting" for f in files.values())
-                if any_extracting:
+                if state["dirty"]:
                     render()
+                elif time.time() - state["last_render"] >= 0.5:
+                    # Uppdatera löpande tider bara om något pågår
+                    if any(f["status"] == "extracting" for f in files.values()):
+                        render()
 
     timer_thread = threading.Thread(target=timer_loop, daemon=True)
     timer_thread.start()
 
     def stop_timer():
         state["running"] = False
+        # Vänta ut timerns pågående varv så att den inte skriver en äldre bild
+        # efter den sista. Ändringar efter dess senaste varv ritas här.
+        timer_thread.join()
+        if state["dirty"]:
+            render()
 
     return on_progress, state, stop_timer
 
@@ -375,7 +515,6 @@ def guess_company_name(pdf_path: str) -> str:
     """Försök gissa bolagsnamn från filnamn."""
     filename = Path(pdf_path).stem.lower()
     # Ta bort vanliga suffix som q1, q2, 2024, 2025, etc.
-    import re
     name = re.sub(r'[-_]?q\d[-_]?\d{4}', '', filename)
     name = re.sub(r'[-_]\d{4}', '', name)
     name = re.sub(r'[-_]', ' ', name).strip()
@@ -394,10 +533,6 @@ def run_interactive_mode(pdf_path: str | None = None, model: str = "claude"):
         pdf_path: Valfri PDF-fil att extrahera
         model: "claude" eller "mistral" för val av extraktionspipeline
     """
-    import re
-    from supabase_client import get_or_create_company, period_exists, get_pdf_hash, load_all_periods
-    from extraction_log import sync_files_with_database
-
     # Verifiera databas först
     ok, message = check_database_setup()
     if not ok:
@@ -419,12 +554,12 @@ def run_interactive_mode(pdf_path: str | None = None, model: str = "claude"):
         return
 
     # Visa bolag att välja mellan
+    # Periodnamn för alla bolag i en query istället för full laddning per bolag
+    periods_by_company = list_periods_by_company([company["id"] for company in companies])
+
     print("\nVälj bolag:")
     for i, company in enumerate(companies, 1):
-        # Hämta antal perioder för detta bolag
-        periods = load_all_periods(company["id"])
-        period_count = len(periods)
-        period_names = [p.get("metadata", {}).get("period", "?") for p in periods]
+        period_names = periods_by_company.get(company["id"], [])
         period_str = ", ".join(period_names) if period_names else "inga perioder"
         print(f"   {i}) {company['name']} ({period_str})")
 
@@ -504,13 +639,7 @@ def run_interactive_mode(pdf_path: str | None = None, model: str = "claude"):
         period_names = [p.get("metadata", {}).get("period", "?") for p in all_periods]
 
         # Generera filnamn
-        periods_sorted = sorted(
-            data_to_export,
-            key=lambda x: (
-                int(re.search(r'(\d{4})', x.get("metadata", {}).get("period", "0")).group(1)) if re.search(r'(\d{4})', x.get("metadata", {}).get("period", "0")) else 0,
-                int(re.search(r'Q(\d)', x.get("metadata", {}).get("period", "Q0")).group(1)) if re.search(r'Q(\d)', x.get("metadata", {}).get("period", "Q0")) else 0
-            )
-        )
+        periods_sorted = sorted(data_to_export, key=_period_key)
         first_period = periods_sorted[0].get("metadata", {}).get("period", "")
         last_period = periods_sorted[-1].get("metadata", {}).get("period", "")
         first_short = re.sub(r'(\d{2})(\d{2})$', r'\2', first_period)
@@ -543,13 +672,7 @@ def run_interactive_mode(pdf_path: str | None = None, model: str = "claude"):
 
         print("\nVälj kvartal:")
         # Sortera perioder kronologiskt
-        periods_sorted = sorted(
-            all_periods,
-            key=lambda x: (
-                int(re.search(r'(\d{4})', x.get("metadata", {}).get("period", "0")).group(1)) if re.search(r'(\d{4})', x.get("metadata", {}).get("period", "0")) else 0,
-                int(re.search(r'Q(\d)', x.get("metadata", {}).get("period", "Q0")).group(1)) if re.search(r'Q(\d)', x.get("metadata", {}).get("period", "Q0")) else 0
-            )
-        )
+        periods_sorted = sorted(all_periods, key=_period_key)
 
         for i, period_data in enumerate(periods_sorted, 1):
             period_name = period_data.get("metadata", {}).get("period", "?")
@@ -615,7 +738,7 @@ def run_interactive_mode(pdf_path: str | None = None, model: str = "claude"):
             print("\nAnvänder Claude pipeline (Haiku + Sonnet + Haiku)")
 
         # === KONTROLLERA CACHE ===
-        pdf_hash = get_pdf_hash(str(path))
+        pdf_hash = get_pdf_hash_cached(str(path))
 
         # Försök hitta period från filnamn (stöd både "q1-2025" och "2025-q1")
         period_match = re.search(r'[qQ](\d)[_-]?(\d{4})', path.stem)
@@ -672,6 +795,7 @@ def run_interactive_mode(pdf_path: str | None = None, model: str = "claude"):
                         use_cache=False,
                         base_folder=base_folder,
                         quiet=True,
+                        pdf_hashes={str(path): pdf_hash},
                     )
                 )
             else:
@@ -755,13 +879,7 @@ def run_interactive_mode(pdf_path: str | None = None, model: str = "claude"):
         else:
             # Fullständig databok
             data_to_export = all_periods
-            periods_sorted = sorted(
-                data_to_export,
-                key=lambda x: (
-                    int(re.search(r'(\d{4})', x.get("metadata", {}).get("period", "0")).group(1)) if re.search(r'(\d{4})', x.get("metadata", {}).get("period", "0")) else 0,
-                    int(re.search(r'Q(\d)', x.get("metadata", {}).get("period", "Q0")).group(1)) if re.search(r'Q(\d)', x.get("metadata", {}).get("period", "Q0")) else 0
-                )
-            )
+            periods_sorted = sorted(data_to_export, key=_period_key)
             first_period = periods_sorted[0].get("metadata", {}).get("period", "")
             last_period = periods_sorted[-1].get("metadata", {}).get("period", "")
             first_short = re.sub(r'(\d{2})(\d{2})$', r'\2', first_period)
@@ -921,13 +1039,7 @@ def run_interactive_mode(pdf_path: str | None = None, model: str = "claude"):
 
             if databok_choice == "1":
                 all_periods_updated = load_all_periods(company["id"])
-                periods_sorted = sorted(
-                    all_periods_updated,
-                    key=lambda x: (
-                        int(re.search(r'(\d{4})', x.get("metadata", {}).get("period", "0")).group(1)) if re.search(r'(\d{4})', x.get("metadata", {}).get("period", "0")) else 0,
-                        int(re.search(r'Q(\d)', x.get("metadata", {}).get("period", "Q0")).group(1)) if re.search(r'Q(\d)', x.get("metadata", {}).get("period", "Q0")) else 0
-                    )
-                )
+                periods_sorted = sorted(all_periods_updated, key=_period_key)
                 first_period = periods_sorted[0].get("metadata", {}).get("period", "")
                 last_period = periods_sorted[-1].get("metadata", {}).get("period", "")
                 first_short = re.sub(r'(\d{2})(\d{2})$', r'\2', first_period)
@@ -962,6 +1074,7 @@ def main():
 Exempel:
   python main.py ./rapporter/ --company "Freemelt" -o databok.xlsx
   python main.py ./rapporter/ --company "Freemelt" -o databok.xlsx --full
+  python main.py ./rapporter/ --company "Freemelt" -o databok.xlsx --batch-api
   python main.py --company "Freemelt" --add q4_rapport.pdf -o databok.xlsx
   python main.py --company "Freemelt" --from-db -o databok.xlsx
   python main.py --list-companies
@@ -1032,6 +1145,11 @@ Exempel:
         action="store_true",
         help="Interaktivt läge - guidat flöde för att skapa databöcker"
     )
+    parser.add_argument(
+        "--batch-api",
+        action="store_true",
+        help="Skicka Claude-anropen via Message Batches API (halva priset, svar inom 24h)"
+    )
     parser.add_argument(
         "--model", "-m",
         choices=["claude", "mistral"],
@@ -1177,6 +1295,7 @@ Exempel:
                     use_cache=not args.no_cache,
                     base_folder=base_folder,
                     quiet=True,
+                    use_batch_api=args.batch_api,
                 )
             )
         stop_timer()
@@ -1275,6 +1394,7 @@ Exempel:
                 use_cache=not args.no_cache,
                 base_folder=base_folder,
                 quiet=True,
+                use_batch_api=args.batch_api,
             )
         )
     stop_timer()
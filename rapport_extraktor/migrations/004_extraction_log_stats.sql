@@ -0,0 +1,218 @@
+-- ============================================
+-- MIGRATION 004: Statistik för extraktionsloggar
+-- ============================================
+--
+-- Kör denna migration i Supabase SQL Editor EFTER migration 003.
+-- Funktionerna används av extraction_log.py. Om de saknas faller
+-- loggen tillbaka på vanliga PostgREST-queries.
+-- ============================================
+
+-- ============================================
+-- STEG 1: Index (om de saknas i äldre databaser)
+-- ============================================
+
+CREATE INDEX IF NOT EXISTS idx_tables_period ON report_tables(period_id);
+CREATE INDEX IF NOT EXISTS idx_sections_period ON sections(period_id);
+CREATE INDEX IF NOT EXISTS idx_charts_period ON charts(period_id);
+
+-- Bolag listas sorterade på namn (summeringslogg, list_companies)
+CREATE INDEX IF NOT EXISTS idx_companies_name ON companies(name);
+
+-- ============================================
+-- STEG 2: Antal tabeller/sektioner/grafer per period
+-- ============================================
+-- Ersätter nedladdning av alla period_id-rader med N små rader i 1 query
+
+CREATE OR REPLACE FUNCTION period_counts(p_period_ids UUID[])
+RETURNS TABLE (
+    period_id UUID,
+    tables_count BIGINT,
+    sections_count BIGINT,
+    charts_count BIGINT
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT
+        p.id AS period_id,
+        (SELECT COUNT(*) FROM report_tables rt WHERE rt.period_id = p.id) AS tables_count,
+        (SELECT COUNT(*) FROM sections s WHERE s.period_id = p.id) AS sections_count,
+        (SELECT COUNT(*) FROM charts ch WHERE ch.period_id = p.id) AS charts_count
+    FROM unnest(p_period_ids) AS p(id);
+$$;
+
+-- ============================================
+-- STEG 3: Allt underlag för ett bolags extraktionslogg
+-- ============================================
+-- Ersätter ~10 queries (perioder, räkningar, totaler, embeddings) med 1 query
+
+CREATE OR REPLACE FUNCTION company_report_bundle(p_company_id UUID)
+RETURNS JSONB
+LANGUAGE SQL
+STABLE
+AS $$
+    WITH company_periods AS (
+        SELECT
+            p.id,
+            p.quarter,
+            p.year,
+            p.source_file,
+            -- Bara de extraction_meta-nycklar som loggen läser
+            (SELECT jsonb_object_agg(m.key, m.value)
+             FROM jsonb_each(p.extraction_meta) m
+             WHERE m.key IN ('pass1_counts', 'validation', 'missing_tables',
+                             'total_cost_sek', 'total_elapsed_seconds')) AS extraction_meta,
+            p.created_at,
+            (SELECT COUNT(*) FROM report_tables rt WHERE rt.period_id = p.id) AS tables,
+            (SELECT COUNT(*) FROM sections s WHERE s.period_id = p.id) AS sections,
+            (SELECT COUNT(*) FROM charts ch WHERE ch.period_id = p.id) AS charts
+        FROM periods p
+        WHERE p.company_id = p_company_id
+    )
+    SELECT jsonb_build_object(
+        'periods', COALESCE(
+            (SELECT jsonb_agg(to_jsonb(cp) ORDER BY cp.year DESC, cp.quarter DESC) FROM company_periods cp),
+            '[]'::jsonb
+        ),
+        -- Totaler räknas separat (inte som summa av perioderna) för verifieringen
+        'totals', jsonb_build_object(
+            'tables', (SELECT COUNT(*) FROM report_tables rt
+                       JOIN periods p ON p.id = rt.period_id WHERE p.company_id = p_company_id),
+            'sections', (SELECT COUNT(*) FROM sections s
+                         JOIN periods p ON p.id = s.period_id WHERE p.company_id = p_company_id),
+            'charts', (SELECT COUNT(*) FROM charts ch
+                       JOIN periods p ON p.id = ch.period_id WHERE p.company_id = p_company_id)
+        ),
+        'embeddings', (
+            SELECT jsonb_build_object(
+                'sections_total', COUNT(*),
+                'sections_with_embedding', COUNT(s.embedding)
+            )
+            FROM sections s
+            JOIN periods p ON p.id = s.period_id
+            WHERE p.company_id = p_company_id
+        )
+    );
+$$;
+
+-- ============================================
+-- STEG 4: Totalt antal tabeller/sektioner/grafer för ett bolag
+-- ============================================
+-- Ersätter 1+3 queries (period_ids + tre .in_()-räkningar) med 1 query
+
+CREATE OR REPLACE FUNCTION company_totals(p_company_id UUID)
+RETURNS TABLE (
+    kind TEXT,
+    n BIGINT
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT 'tables', COUNT(*) FROM report_tables rt
+    JOIN periods p ON p.id = rt.period_id WHERE p.company_id = p_company_id
+    UNION ALL
+    SELECT 'sections', COUNT(*) FROM sections s
+    JOIN periods p ON p.id = s.period_id WHERE p.company_id = p_company_id
+    UNION ALL
+    SELECT 'charts', COUNT(*) FROM charts ch
+    JOIN periods p ON p.id = ch.period_id WHERE p.company_id = p_company_id;
+$$;
+
+-- ============================================
+-- STEG 5: Sammanställning per bolag för summeringsloggen
+-- ============================================
+-- Ersätter N * (perioder + 1+3 räkningar) queries med 1 query.
+-- Räknar direkt mot tabellerna (inte de denormaliserade kolumnerna från
+-- migration 003) eftersom loggen verifierar mot faktiska rader.
+
+CREATE OR REPLACE FUNCTION company_summary()
+RETURNS TABLE (
+    company_id UUID,
+    name TEXT,
+    slug TEXT,
+    reports BIGINT,
+    tables BIGINT,
+    sections BIGINT,
+    charts BIGINT,
+    cost NUMERIC,
+    time_seconds NUMERIC
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT
+        c.id AS company_id,
+        c.name,
+        c.slug,
+        (SELECT COUNT(*) FROM periods p WHERE p.company_id = c.id) AS reports,
+        (SELECT COUNT(*) FROM report_tables rt
+         JOIN periods p ON p.id = rt.period_id WHERE p.company_id = c.id) AS tables,
+        (SELECT COUNT(*) FROM sections s
+         JOIN periods p ON p.id = s.period_id WHERE p.company_id = c.id) AS sections,
+        (SELECT COUNT(*) FROM charts ch
+         JOIN periods p ON p.id = ch.period_id WHERE p.company_id = c.id) AS charts,
+        (SELECT COALESCE(SUM((p.extraction_meta->>'total_cost_sek')::NUMERIC), 0)
+         FROM periods p WHERE p.company_id = c.id) AS cost,
+        (SELECT COALESCE(SUM((p.extraction_meta->>'total_elapsed_seconds')::NUMERIC), 0)
+         FROM periods p WHERE p.company_id = c.id) AS time_seconds
+    FROM companies c
+    ORDER BY c.name;
+$$;
+
+-- ============================================
+-- STEG 6: Embedding-statistik för ett bolag
+-- ============================================
+-- Ersätter periods-select + 2 räkningar med 1 query (en scan av sections)
+
+CREATE OR REPLACE FUNCTION embedding_stats(p_company_id UUID)
+RETURNS TABLE (
+    sections_total BIGINT,
+    sections_with_embedding BIGINT
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT
+        COUNT(*) AS sections_total,
+        COUNT(s.embedding) AS sections_with_embedding
+    FROM sections s
+    JOIN periods p ON p.id = s.period_id
+    WHERE p.company_id = p_company_id;
+$$;
+
+-- ============================================
+-- STEG 7: Globala totaler för summeringsloggens verifiering
+-- ============================================
+-- Ersätter 4 count-queries med 1 query
+
+CREATE OR REPLACE FUNCTION stats_summary()
+RETURNS TABLE (
+    tables BIGINT,
+    sections BIGINT,
+    charts BIGINT,
+    sections_with_embedding BIGINT
+)
+LANGUAGE SQL
+STABLE
+AS $$
+    SELECT
+        (SELECT COUNT(*) FROM report_tables) AS tables,
+        s.sections,
+        (SELECT COUNT(*) FROM charts) AS charts,
+        s.sections_with_embedding
+    FROM (
+        SELECT COUNT(*) AS sections, COUNT(embedding) AS sections_with_embedding
+        FROM sections
+    ) s;
+$$;
+
+-- ============================================
+-- VERIFIERING
+-- ============================================
+
+-- SELECT * FROM period_counts(ARRAY(SELECT id FROM periods LIMIT 5));
+-- SELECT company_report_bundle((SELECT id FROM companies LIMIT 1));
+-- SELECT * FROM company_totals((SELECT id FROM companies LIMIT 1));
+-- SELECT * FROM company_summary();
+-- SELECT * FROM embedding_stats((SELECT id FROM companies LIMIT 1));
+-- SELECT * FROM stats_summary();
@@ -7,19 +7,31 @@ Pipeline:
   Pass 3 (Haiku): Extrahera narrativ text
 
 Pass 2 och 3 körs parallellt efter Pass 1.
+
+Med use_batch_api skickas anropen istället via Message Batches API
+(halva priset, svar inom 24h) - för stora körningar som inte är brådskande.
 """
 
 import asyncio
 import base64
+import importlib.util
 import io
+import itertools
 import json
+import mmap
 import os
+import random
 import re
+import sys
+import threading
 import time
+import weakref
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Callable, TypedDict
+from typing import AsyncIterator, Callable, NotRequired, TypedDict
 
-from anthropic import AsyncAnthropic
+import httpx
+from anthropic import APIConnectionError, APIStatusError, AsyncAnthropic, RateLimitError
 from dotenv import load_dotenv
 from pypdf import PdfReader, PdfWriter
 
@@ -32,8 +44,10 @@ from supabase_client import (
     save_period,
     save_period_atomic_async,
     update_period_status,
-    get_pdf_hash,
-    period_exists,
+    get_pdf_hash_cached,
+    get_pdf_hash_from_buffer,
+    get_period_hash,
+    get_period_hashes,
     load_period,
 )
 from validation import (
@@ -63,8 +77,22 @@ SONNET_MODEL = "claude-sonnet-4-5-20250929"
 MAX_CONCURRENT = 4    # 4 samtida × 75K = 300K tokens, säker marginal under 450K limit
 MAX_RETRIES = 3
 API_TIMEOUT = 300     # 5 minuter timeout per API-anrop
-BATCH_SIZE = 10       # Antal PDFs att processa åt gången
-BATCH_TIMEOUT = 3600  # 1 timme max per batch
+BATCH_SIZE = 10       # Max antal PDFs i arbete samtidigt (glidande fönster)
+BATCH_TIMEOUT = 3600  # 1 timme max per PDF
+MIN_TOKENS_HEADROOM = 75_000  # ~1 PDF - vänta på reset om kvoten understiger detta
+REQUESTS_PER_MINUTE = 50      # Anthropic tier-gräns för requests/min (token bucket)
+REQUEST_BURST = MAX_CONCURRENT  # Antal anrop som får starta direkt efter varandra
+RETRYABLE_STATUS = {408, 409, 429}  # 4xx-fel som är värda att försöka igen (plus alla 5xx)
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None  # httpx kräver h2 för HTTP/2
+
+# Message Batches API (valfritt läge för stora körningar som inte är brådskande)
+BATCH_API_WINDOW = 50          # Max antal PDFs i arbete samtidigt i batch-läge
+BATCH_API_MAX_REQUESTS = 100   # Max anrop per skickad batch (PDF:erna ligger base64 i varje anrop)
+BATCH_API_MAX_BYTES = 200 * 1024 * 1024  # Max JSON-storlek per batch (API:ts gräns är 256 MB)
+BATCH_API_COLLECT_DELAY = 2.0  # Sekunder att vänta in fler anrop innan batchen skickas
+BATCH_API_POLL_INTERVAL = 10   # Första poll-intervallet (sekunder), fördubblas upp till max
+BATCH_API_POLL_MAX = 300
+BATCH_API_TIMEOUT = 3 * 24 * 3600  # Pass 1, Pass 2+3 och retry är var sin batch, max 24h styck
 
 # Priser (USD per 1M tokens)
 HAIKU_INPUT_PRICE = 0.80
@@ -72,6 +100,377 @@ HAIKU_OUTPUT_PRICE = 4.00
 SONNET_INPUT_PRICE = 3.00
 SONNET_OUTPUT_PRICE = 15.00
 USD_TO_SEK = 10.50
+# Prompt caching: skrivning kostar 1.25x, läsning 0.1x ordinarie input-pris
+CACHE_WRITE_MULTIPLIER = 1.25
+CACHE_READ_MULTIPLIER = 0.10
+# Message Batches API debiteras till halva priset
+BATCH_API_MULTIPLIER = 0.50
+
+# SEK per token (input, output), förberäknat per modell
+SEK_PER_TOKEN = {
+    "haiku": (HAIKU_INPUT_PRICE / 1_000_000 * USD_TO_SEK, HAIKU_OUTPUT_PRICE / 1_000_000 * USD_TO_SEK),
+    "sonnet": (SONNET_INPUT_PRICE / 1_000_000 * USD_TO_SEK, SONNET_OUTPUT_PRICE / 1_000_000 * USD_TO_SEK),
+}
+
+# Förkompilerade regex (används för varje svar/PDF)
+_TRAILING_COMMA_RE = re.compile(r',(\s*[}\]])')
+_TRAILING_ARRAY_COMMA_RE = re.compile(r',\s*\]')
+_PERIOD_RE = re.compile(r'[qQ](\d)[_-]?(\d{4})')
+_PERIOD_YEAR_FIRST_RE = re.compile(r'(\d{4})[_-]?[qQ](\d)')
+_JSON_DECODER = json.JSONDecoder()
+
+# Serialiserar filflytt/loggskrivning när den körs i trådar
+_extraction_log_lock = threading.Lock()
+
+# Håller ihop flerradiga rapporter när flera PDFs körs parallellt
+_print_lock = threading.Lock()
+
+# Delad Anthropic-klient per event-loop: loop -> (api-nyckel, klient).
+# Svag nyckel så att en avslutad loop (och dess post) inte hålls vid liv.
+_anthropic_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, tuple[str, AsyncAnthropic]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class RateLimiter:
+    """
+    Begränsar anrop mot Anthropic utifrån svarens rate limit-headers.
+
+    Används som en Semaphore (`async with limiter:`). Utöver ett tak för
+    samtidiga anrop läses `anthropic-ratelimit-*` från varje svar, och nya
+    anrop väntar till reset-tiden när request- eller token-kvoten är slut.
+
+    Taket kan ändras under körning med set_limit (t.ex. halveras vid 429),
+    därför räknas aktiva anrop med en Condition istället för en Semaphore.
+    Starttiderna sprids dessutom ut med en token bucket, så att alla lediga
+    platser inte skickar sina anrop i samma millisekund.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT,
+        requests_per_minute: float = REQUESTS_PER_MINUTE,
+        burst: int = REQUEST_BURST,
+    ):
+        self.max_concurrent = max_concurrent
+        self.limit = max_concurrent
+        self._active = 0
+        self._cond = asyncio.Condition()
+        self.requests_remaining: int | None = None
+        self.tokens_remaining: int | None = None
+        self.reset_at = 0.0  # time.monotonic()-tid då kvoten fylls på
+        self._rate = requests_per_minute / 60
+        self._burst = burst
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+
+    async def __aenter__(self) -> "RateLimiter":
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._active < self.limit)
+            self._active += 1
+        try:
+            await self._wait_for_quota()
+            await self._wait_for_token()
+        except BaseException:
+            await self._release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self._release()
+
+    async def _release(self) -> None:
+        async with self._cond:
+            self._active -= 1
+            self._cond.notify(1)
+
+    async def set_limit(self, limit: int) -> None:
+        """Ändra taket för samtidiga anrop (1..max_concurrent). Pågående anrop avbryts inte."""
+        async with self._cond:
+            self.limit = max(1, min(limit, self.max_concurrent))
+            self._cond.notify_all()
+
+    async def _wait_for_token(self) -> None:
+        """Ta en token ur bucketen och vänta tills den hade funnits (reserveras direkt)."""
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._last_refill) * self._rate)
+        self._last_refill = now
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self._rate)
+
+    async def _wait_for_quota(self) -> None:
+        exhausted = (
+            (self.requests_remaining is not None and self.requests_remaining <= 0)
+            or (self.tokens_remaining is not None and self.tokens_remaining < MIN_TOKENS_HEADROOM)
+        )
+        wait = self.reset_at - time.monotonic()
+        if exhausted and wait > 0:
+            print(f"   [RATE LIMIT] Kvoten slut - väntar {wait:.1f}s", flush=True)
+            await asyncio.sleep(wait)
+        if exhausted:
+            # Kvoten är återställd - okänd tills nästa svar
+            self.requests_remaining = None
+            self.tokens_remaining = None
+
+    def update_from_headers(self, headers) -> None:
+        """Uppdatera kvoter från ett svars headers."""
+        requests = headers.get("anthropic-ratelimit-requests-remaining")
+        tokens = (
+            headers.get("anthropic-ratelimit-input-tokens-remaining")
+            or headers.get("anthropic-ratelimit-tokens-remaining")
+        )
+        if requests is not None:
+            self.requests_remaining = int(requests)
+        if tokens is not None:
+            self.tokens_remaining = int(tokens)
+
+        resets = [
+            _seconds_until(headers.get(name))
+            for name in (
+                "anthropic-ratelimit-requests-reset",
+                "anthropic-ratelimit-input-tokens-reset",
+                "anthropic-ratelimit-tokens-reset",
+            )
+        ]
+        resets = [r for r in resets if r is not None]
+        if resets:
+            self.reset_at = time.monotonic() + max(resets)
+
+    def pause(self, seconds: float) -> None:
+        """Blockera nya anrop i `seconds` sekunder (efter 429)."""
+        self.requests_remaining = 0
+        self.reset_at = max(self.reset_at, time.monotonic() + seconds)
+
+
+class MessageBatcher:
+    """
+    Samlar anrop från parallella extraktioner och skickar dem via Message Batches API.
+
+    Används istället för RateLimiter (`async with batcher:` är en no-op) och
+    anropen går via submit(). Anrop som kommer inom BATCH_API_COLLECT_DELAY
+    från varandra hamnar i samma batch, så Pass 1 för alla PDFs skickas ihop,
+    sedan Pass 2 och 3 o.s.v. Halva priset mot att svaren kan dröja (max 24h).
+
+    En batch skickas även när den når BATCH_API_MAX_REQUESTS anrop eller
+    BATCH_API_MAX_BYTES - varje anrop bär hela PDF:en som base64.
+    """
+
+    def __init__(self, client: AsyncAnthropic):
+        self._client = client
+        self._pending: list[tuple[dict, asyncio.Future]] = []
+        self._pending_bytes = 0
+        self._flush_timer: asyncio.TimerHandle | None = None
+        self._flush_tasks: set[asyncio.Task] = set()
+        self._ids = itertools.count()
+
+    async def __aenter__(self) -> "MessageBatcher":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+    async def submit(self, params: dict):
+        """Lägg ett anrop (samma parametrar som messages.create) i nästa batch och vänta på svaret."""
+        future = asyncio.get_running_loop().create_future()
+        size = len(json.dumps(params))
+
+        # Skicka det som redan väntar om det här anropet skulle spräcka storleksgränsen
+        if self._pending and self._pending_bytes + size > BATCH_API_MAX_BYTES:
+            self._start_flush()
+        self._pending.append((params, future))
+        self._pending_bytes += size
+
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        if len(self._pending) >= BATCH_API_MAX_REQUESTS or self._pending_bytes >= BATCH_API_MAX_BYTES:
+            self._start_flush()
+        else:
+            self._flush_timer = asyncio.get_running_loop().call_later(
+                BATCH_API_COLLECT_DELAY, self._start_flush
+            )
+        return await future
+
+    def _start_flush(self) -> None:
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        self._flush_timer = None
+        pending, self._pending = self._pending, []
+        self._pending_bytes = 0
+        if pending:
+            task = asyncio.create_task(self._run_batch(pending))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    async def _run_batch(self, pending: list[tuple[dict, asyncio.Future]]) -> None:
+        # custom_id får bara innehålla [a-zA-Z0-9_-], max 64 tecken
+        requests = {f"req-{next(self._ids)}": item for item in pending}
+        try:
+            batch = await self._client.messages.batches.create(requests=[
+                {"custom_id": custom_id, "params": params}
+                for custom_id, (params, _) in requests.items()
+            ])
+            print(f"   [BATCH API] {batch.id}: {len(requests)} anrop skickade", flush=True)
+
+            poll_interval = BATCH_API_POLL_INTERVAL
+            while batch.processing_status != "ended":
+                await asyncio.sleep(poll_interval)
+                poll_interval = min(poll_interval * 2, BATCH_API_POLL_MAX)
+                batch = await self._client.messages.batches.retrieve(batch.id)
+
+            async for entry in await self._client.messages.batches.results(batch.id):
+                _, future = requests.pop(entry.custom_id, (None, None))
+                if future is None or future.done():
+                    continue
+                if entry.result.type == "succeeded":
+                    future.set_result(entry.result.message)
+                else:
+                    error = getattr(entry.result, "error", None)
+                    future.set_exception(RuntimeError(
+                        f"Batch-anrop {entry.result.type}" + (f": {error}" if error else "")
+                    ))
+        except Exception as e:
+            for _, future in requests.values():
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for _, future in requests.values():
+                if not future.done():
+                    future.set_exception(RuntimeError(f"Batch {batch.id} saknar svar för anropet"))
+
+
+def _seconds_until(reset: str | None) -> float | None:
+    """Sekunder kvar till en RFC 3339-tidsstämpel (None om ogiltig)."""
+    if not reset:
+        return None
+    try:
+        reset_time = datetime.fromisoformat(reset.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, (reset_time - datetime.now(timezone.utc)).total_seconds())
+
+
+def _retry_after_seconds(error: RateLimitError) -> float | None:
+    """Läs retry-after (sekunder) från ett 429-svar."""
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    """
+    Bara nätverksfel, timeouts, 429 och 5xx är värda en retry.
+
+    En anslutning som bryts mitt i en streamad respons kommer som ett rått
+    httpx.TransportError (t.ex. RemoteProtocolError, ReadError) från
+    SSE-iteratorn, inte som APIConnectionError - även det är ett nätverksfel.
+
+    Klientfel (400, 401, 403, 404, 413 ...), ogiltig JSON och övriga fel
+    blir inte bättre av att köra om hela PDF:en - faila direkt.
+    """
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500 or error.status_code in RETRYABLE_STATUS
+    return isinstance(error, (APIConnectionError, httpx.TransportError))
+
+
+def _update_rate_limits(limiter, stream) -> None:
+    """Mata limitern med headers från ett stream-svar (no-op för Semaphore)."""
+    if isinstance(limiter, RateLimiter):
+        response = getattr(stream, "response", None)
+        if response is not None:
+            limiter.update_from_headers(response.headers)
+
+
+async def _create_message(
+    client: AsyncAnthropic,
+    semaphore: asyncio.Semaphore | RateLimiter | MessageBatcher,
+    params: dict,
+) -> tuple[str, object]:
+    """
+    Kör ett anrop mot Claude och returnera (svarstext, usage).
+
+    Streamas normalt (undviker timeout på långa svar) innanför semaforen.
+    Med en MessageBatcher går anropet istället via Message Batches API.
+    """
+    if isinstance(semaphore, MessageBatcher):
+        message = await semaphore.submit(params)
+        text = "".join(block.text for block in message.content if block.type == "text")
+        return text, message.usage
+
+    response_parts: list[str] = []
+    async with semaphore:
+        async with client.messages.stream(**params) as stream:
+            async for text in stream.text_stream:
+                response_parts.append(text)
+            final_message = await stream.get_final_message()
+            _update_rate_limits(semaphore, stream)
+    return "".join(response_parts), final_message.usage
+
+
+def _print_block(lines: list[str]) -> None:
+    """Skriv en flerradig rapport med ett write-anrop så att rader från olika PDFs inte blandas."""
+    with _print_lock:
+        sys.stdout.write("\n".join(lines) + "\n")
+        sys.stdout.flush()
+
+
+def _process_extraction_complete_locked(pdf_path: str, company_name: str, base_folder: str) -> None:
+    """Kör process_extraction_complete en i taget (anropas via asyncio.to_thread)."""
+    with _extraction_log_lock:
+        process_extraction_complete(pdf_path, company_name, base_folder)
+
+
+def create_anthropic_client(api_key: str) -> AsyncAnthropic:
+    """
+    Skapa en AsyncAnthropic-klient med anpassad connection pool.
+
+    Anroparen äger klienten och stänger den med `await client.close()`.
+    """
+    http_client = httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        limits=httpx.Limits(
+            max_keepalive_connections=MAX_CONCURRENT * 2,
+            max_connections=MAX_CONCURRENT * 4,
+        ),
+        timeout=httpx.Timeout(API_TIMEOUT, connect=10.0),
+    )
+    return AsyncAnthropic(api_key=api_key, http_client=http_client)
+
+
+def get_anthropic_client(api_key: str) -> AsyncAnthropic:
+    """
+    Hämta delad AsyncAnthropic-klient för den körande event-loopen.
+
+    För långlivade loopar (API-servern) där många jobb ska dela en pool.
+    httpx-anslutningar kan inte delas mellan loopar, så varje loop får egen
+    klient. Byts API-nyckeln stängs den ersatta klienten.
+    Måste anropas inifrån en körande event-loop.
+    """
+    loop = asyncio.get_running_loop()
+    cached = _anthropic_clients.get(loop)
+    if cached is not None and cached[0] == api_key:
+        return cached[1]
+
+    client = create_anthropic_client(api_key)
+    _anthropic_clients[loop] = (api_key, client)
+    if cached is not None:
+        loop.create_task(cached[1].close())
+    return client
+
+
+def _encode_pdf_base64(pdf_path: str | Path) -> tuple[str, str]:
+    """
+    Läs PDF via mmap och base64-koda utan mellanliggande bytes-kopia.
+
+    Hashen beräknas från samma mappning, så filen läses bara en gång.
+    Körs med asyncio.to_thread så att kodningen inte blockerar event-loopen.
+
+    Returns:
+        Tuple av (base64-data, pdf_hash)
+    """
+    with open(pdf_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return base64.b64encode(mm).decode("ascii"), get_pdf_hash_from_buffer(mm)
 
 
 def extract_pdf_pages(pdf_bytes: bytes, pages: list[int]) -> bytes:
@@ -106,8 +505,11 @@ class PassResult(TypedDict):
     model: str
     input_tokens: int
     output_tokens: int
+    cache_creation_input_tokens: int
+    cache_read_input_tokens: int
     elapsed_seconds: float
     data: dict
+    batch_api: NotRequired[bool]  # Kördes via Message Batches API (halva priset)
 
 
 class RetryStats(TypedDict):
@@ -130,24 +532,73 @@ class PipelineResult(TypedDict):
     total_cost_sek: float
 
 
+def _find_json_span(text: str) -> tuple[int, int] | None:
+    """
+    Hitta första JSON-objektet i texten med en linjär klammerräkning.
+
+    Hoppar över klamrar inuti strängar (med escapes). Om objektet aldrig
+    stängs (trunkerat svar) returneras spannet till sista '}' så att
+    reparationsstegen i parse_json_response får hela texten.
+    """
+    start = text.find("{")
+    if start < 0:
+        return None
+
+    depth = 0
+    in_string = False
+    escape_next = False
+    for i in range(start, len(text)):
+        char = text[i]
+        if escape_next:
+            escape_next = False
+        elif char == "\\":
+            escape_next = in_string
+        elif char == '"':
+            in_string = not in_string
+        elif not in_string:
+            if char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    return start, i + 1
+
+    end = text.rfind("}")
+    return (start, end + 1) if end > start else None
+
+
 def parse_json_response(text: str) -> dict:
     """Extrahera JSON från Claude-svar med robust felhantering."""
     text = text.strip()
 
+    # Snabbväg: svaret är redan ren JSON
+    try:
+        result = json.loads(text)
+        if isinstance(result, dict):
+            return result
+    except json.JSONDecodeError:
+        pass
+
     # Ta bort markdown code blocks
+    # (find/rfind på strängen - ingen lista med rader allokeras)
     if text.startswith("```"):
-        lines = text.split("\n")
-        start = 1 if lines[0].startswith("```") else 0
-        end = len(lines)
-        for i in range(len(lines) - 1, -1, -1):
-            if lines[i].strip() == "```":
-                end = i
-                break
-        text = "\n".join(lines[start:end])
+        first_newline = text.find("\n")
+        text = text[first_newline + 1:] if first_newline >= 0 else ""
+        last_fence = text.rfind("```")
+        if last_fence >= 0:
+            text = text[:last_fence]
+
+    # Parsa från första { (ignorerar text efter objektet) utan regex-skanning
+    start = text.find("{")
+    if start >= 0:
+        try:
+            return _JSON_DECODER.raw_decode(text, start)[0]
+        except json.JSONDecodeError:
+            pass
 
-    json_match = re.search(r'\{[\s\S]*\}', text)
-    if json_match:
-        json_str = json_match.group()
+    json_span = _find_json_span(text)
+    if json_span:
+        json_str = text[json_span[0]:json_span[1]]
 
         # Försök parsa direkt
         try:
@@ -157,10 +608,10 @@ def parse_json_response(text: str) -> dict:
             fixed = json_str
 
             # 1. Ta bort trailing commas före } eller ]
-            fixed = re.sub(r',(\s*[}\]])', r'\1', fixed)
+            fixed = _TRAILING_COMMA_RE.sub(r'\1', fixed)
 
             # 2. Fixa problem med avslutande komma i arrays
-            fixed = re.sub(r',\s*\]', ']', fixed)
+            fixed = _TRAILING_ARRAY_COMMA_RE.sub(']', fixed)
 
             # 3. Hantera oavslutade strängar (t.ex. om output trunkeras)
             # Om JSON slutar mitt i en sträng, försök stänga den
@@ -227,24 +678,23 @@ def parse_json_response(text: str) -> dict:
 
 
 def calculate_pass_cost(pass_result: PassResult) -> float:
-    """Beräkna kostnad för ett pass i SEK."""
-    if pass_result["model"] == "haiku":
-        cost_usd = (
-            pass_result["input_tokens"] * HAIKU_INPUT_PRICE +
-            pass_result["output_tokens"] * HAIKU_OUTPUT_PRICE
-        ) / 1_000_000
-    else:
-        cost_usd = (
-            pass_result["input_tokens"] * SONNET_INPUT_PRICE +
-            pass_result["output_tokens"] * SONNET_OUTPUT_PRICE
-        ) / 1_000_000
-    return cost_usd * USD_TO_SEK
+    """Beräkna kostnad för ett pass i SEK (inkl. prompt cache-tokens)."""
+    input_sek, output_sek = SEK_PER_TOKEN["haiku" if pass_result["model"] == "haiku" else "sonnet"]
+    input_equivalent = (
+        pass_result["input_tokens"]
+        + pass_result.get("cache_creation_input_tokens", 0) * CACHE_WRITE_MULTIPLIER
+        + pass_result.get("cache_read_input_tokens", 0) * CACHE_READ_MULTIPLIER
+    )
+    cost = input_equivalent * input_sek + pass_result["output_tokens"] * output_sek
+    if pass_result.get("batch_api"):
+        cost *= BATCH_API_MULTIPLIER
+    return cost
 
 
 async def run_pass_1(
-    pdf_base64: str,
+    pdf_source: dict,
     client: AsyncAnthropic,
-    semaphore: asyncio.Semaphore,
+    semaphore: asyncio.Semaphore | RateLimiter | MessageBatcher,
 ) -> PassResult:
     """
     Pass 1: Strukturidentifiering med Haiku.
@@ -253,57 +703,48 @@ async def run_pass_1(
     sektioner och grafer identifierade.
     """
     start_time = time.perf_counter()
-    async with semaphore:
-        # Använd streaming för att undvika timeout
-        full_response_text = ""
-        input_tokens = 0
-        output_tokens = 0
-
-        async with client.messages.stream(
-            model=HAIKU_MODEL,
-            max_tokens=16000,
-            messages=[{
-                "role": "user",
-                "content": [
-                    {
-                        "type": "document",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "application/pdf",
-                            "data": pdf_base64
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": PASS_1_STRUCTURE_PROMPT
-                    }
-                ]
-            }]
-        ) as stream:
-            async for text in stream.text_stream:
-                full_response_text += text
-            final_message = await stream.get_final_message()
-            input_tokens = final_message.usage.input_tokens
-            output_tokens = final_message.usage.output_tokens
 
-        result = parse_json_response(full_response_text)
-        elapsed = time.perf_counter() - start_time
-
-        return PassResult(
-            pass_number=1,
-            model="haiku",
-            input_tokens=input_tokens,
-            output_tokens=output_tokens,
-            elapsed_seconds=elapsed,
-            data=result
-        )
+    response_text, usage = await _create_message(client, semaphore, {
+        "model": HAIKU_MODEL,
+        "max_tokens": 16000,
+        "messages": [{
+            "role": "user",
+            "content": [
+                {
+                    "type": "document",
+                    "source": pdf_source,
+                    # Samma PDF-prefix i Pass 1 och 3 (Haiku) - Pass 3 läser från cache
+                    "cache_control": {"type": "ephemeral"}
+                },
+                {
+                    "type": "text",
+                    "text": PASS_1_STRUCTURE_PROMPT
+                }
+            ]
+        }]
+    })
+
+    result = parse_json_response(response_text)
+    elapsed = time.perf_counter() - start_time
+
+    return PassResult(
+        pass_number=1,
+        model="haiku",
+        input_tokens=usage.input_tokens,
+        output_tokens=usage.output_tokens,
+        cache_creation_input_tokens=usage.cache_creation_input_tokens or 0,
+        cache_read_input_tokens=usage.cache_read_input_tokens or 0,
+        elapsed_seconds=elapsed,
+        data=result,
+        batch_api=isinstance(semaphore, MessageBatcher),
+    )
 
 
 async def run_pass_2(
-    pdf_base64: str,
+    pdf_source: dict,
     structure_map: dict,
     client: AsyncAnthropic,
-    semaphore: asyncio.Semaphore,
+    semaphore: asyncio.Semaphore | RateLimiter | MessageBatcher,
 ) -> PassResult:
     """
     Pass 2: Tabellextraktion med Sonnet.
@@ -326,6 +767,8 @@ async def run_pass_2(
             model="sonnet",
             input_tokens=0,
             output_tokens=0,
+            cache_creation_input_tokens=0,
+            cache_read_input_tokens=0,
             elapsed_seconds=0.0,
             data={"tables": [], "charts": []}
         )
@@ -343,58 +786,47 @@ async def run_pass_2(
         number_format=number_format
     )
 
-    async with semaphore:
-        # Använd streaming för att undvika timeout
-        full_response_text = ""
-        input_tokens = 0
-        output_tokens = 0
-
-        async with client.messages.stream(
-            model=SONNET_MODEL,
-            max_tokens=60000,
-            messages=[{
-                "role": "user",
-                "content": [
-                    {
-                        "type": "document",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "application/pdf",
-                            "data": pdf_base64
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": prompt
-                    }
-                ]
-            }]
-        ) as stream:
-            async for text in stream.text_stream:
-                full_response_text += text
-            final_message = await stream.get_final_message()
-            input_tokens = final_message.usage.input_tokens
-            output_tokens = final_message.usage.output_tokens
-
-        result = parse_json_response(full_response_text)
-        elapsed = time.perf_counter() - start_time
-
-        return PassResult(
-            pass_number=2,
-            model="sonnet",
-            input_tokens=input_tokens,
-            output_tokens=output_tokens,
-            elapsed_seconds=elapsed,
-            data=result
-        )
+    response_text, usage = await _create_message(client, semaphore, {
+        "model": SONNET_MODEL,
+        "max_tokens": 60000,
+        "messages": [{
+            "role": "user",
+            "content": [
+                {
+                    "type": "document",
+                    "source": pdf_source
+                },
+                {
+                    "type": "text",
+                    "text": prompt
+                }
+            ]
+        }]
+    })
+
+    result = parse_json_response(response_text)
+    elapsed = time.perf_counter() - start_time
+
+    return PassResult(
+        pass_number=2,
+        model="sonnet",
+        input_tokens=usage.input_tokens,
+        output_tokens=usage.output_tokens,
+        cache_creation_input_tokens=usage.cache_creation_input_tokens or 0,
+        cache_read_input_tokens=usage.cache_read_input_tokens or 0,
+        elapsed_seconds=elapsed,
+        data=result,
+        batch_api=isinstance(semaphore, MessageBatcher),
+    )
 
 
 async def validate_and_retry_with_sonnet(
-    pdf_bytes: bytes,
+    pdf_path: str,
     tables: list[dict],
     structure_map: dict,
     client: AsyncAnthropic,
-    semaphore: asyncio.Semaphore,
+    semaphore: asyncio.Semaphore | RateLimiter | MessageBatcher,
+    full_pdf_source: dict | None = None,
 ) -> tuple[list[dict], ValidationResult, RetryStats]:
     """
     Validera tabeller och kör ETT retry med Sonnet på relevanta sidor.
@@ -409,11 +841,13 @@ async def validate_and_retry_with_sonnet(
     3. Om något saknas ELLER har fel → extrahera relevanta sidor + Sonnet-anrop
 
     Args:
-        pdf_bytes: Rå PDF-data (bytes, inte base64)
+        pdf_path: Sökväg till PDF (läses bara om retry behövs)
         tables: Lista med extraherade tabeller från Pass 2
         structure_map: Strukturkarta från Pass 1
         client: Anthropic async-klient
         semaphore: För rate-limiting
+        full_pdf_source: Redan byggd dokumentkälla för hela PDF:en (från
+            passen). Återanvänds om hela PDF:en ska skickas vid retry.
 
     Returns:
         Tuple av (slutgiltiga tabeller, ValidationResult, RetryStats)
@@ -446,21 +880,23 @@ async def validate_and_retry_with_sonnet(
         return current_tables, validation_result, retry_stats
 
     # Logga vad som behöver fixas
+    report = []
     if missing_table_ids:
-        print(f"\n   [VALIDERING] {len(missing_table_ids)} tabeller saknas", flush=True)
+        report.append(f"\n   [VALIDERING] {len(missing_table_ids)} tabeller saknas")
         for tid in sorted(missing_table_ids):
             for t in structure_map.get("structure_map", {}).get("tables", []):
                 if t["id"] == tid:
-                    print(f"      - {tid}: {t.get('title', 'Okänd')} (sida {t.get('page', '?')})", flush=True)
+                    report.append(f"      - {tid}: {t.get('title', 'Okänd')} (sida {t.get('page', '?')})")
                     break
 
     if tables_with_errors:
-        print(f"   [VALIDERING] {len(tables_with_errors)} tabeller har fel", flush=True)
+        report.append(f"   [VALIDERING] {len(tables_with_errors)} tabeller har fel")
         for tid in sorted(tables_with_errors):
             for t in current_tables:
                 if t.get("id") == tid:
-                    print(f"      - {tid}: {t.get('title', 'Okänd')}", flush=True)
+                    report.append(f"      - {tid}: {t.get('title', 'Okänd')}")
                     break
+    _print_block(report)
 
     # Steg 4: Bygg prompt och samla sidor
     start_time = time.perf_counter()
@@ -517,6 +953,7 @@ async def validate_and_retry_with_sonnet(
                 break
 
     # Steg 5: Extrahera relevanta sidor från PDF
+    pdf_bytes = await asyncio.to_thread(Path(pdf_path).read_bytes)
     reader = PdfReader(io.BytesIO(pdf_bytes))
     total_pages = len(reader.pages)
 
@@ -526,15 +963,27 @@ async def validate_and_retry_with_sonnet(
     # Extrahera bara relevanta sidor om det sparar >50% av PDF:en
     if pages_needed and len(pages_needed) < total_pages * 0.5:
         partial_pdf_bytes = extract_pdf_pages(pdf_bytes, sorted(pages_needed))
-        partial_pdf_base64 = base64.standard_b64encode(partial_pdf_bytes).decode()
+        retry_source = {
+            "type": "base64",
+            "media_type": "application/pdf",
+            "data": base64.standard_b64encode(partial_pdf_bytes).decode("ascii"),
+        }
+        del partial_pdf_bytes
         pages_info = f" (sidor: {sorted(pages_needed)})"
         page_note = f"\n\nVIKTIGT: Denna PDF innehåller endast sidorna {sorted(pages_needed)} från originaldokumentet."
     else:
-        # Använd hela PDF:en
-        partial_pdf_base64 = base64.standard_b64encode(pdf_bytes).decode()
+        # Använd hela PDF:en - återanvänd redan kodad källa om den finns
+        retry_source = full_pdf_source or {
+            "type": "base64",
+            "media_type": "application/pdf",
+            "data": base64.standard_b64encode(pdf_bytes).decode("ascii"),
+        }
         pages_info = f" (hela PDF:en, {total_pages} sidor)"
         page_note = ""
 
+    # Släpp rå-PDF:en innan Sonnet-anropet - bara base64 behövs under streamingen
+    del reader, pdf_bytes
+
     tables_json = json.dumps(tables_to_fix, ensure_ascii=False, indent=2)
     all_ids = sorted(list(missing_table_ids | tables_with_errors))
 
@@ -573,95 +1022,86 @@ KRITISKA REGLER:
 {page_note}"""
 
     # Steg 6: Kör Sonnet retry
-    async with semaphore:
-        try:
-            full_response_text = ""
-            input_tokens = 0
-            output_tokens = 0
-
-            print(f"\n   [RETRY] Kör Sonnet för {len(tables_to_fix)} tabeller{pages_info}...", flush=True)
-
-            async with client.messages.stream(
-                model=SONNET_MODEL,
-                max_tokens=32000,
-                messages=[{
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "document",
-                            "source": {
-                                "type": "base64",
-                                "media_type": "application/pdf",
-                                "data": partial_pdf_base64
-                            }
-                        },
-                        {
-                            "type": "text",
-                            "text": prompt
-                        }
-                    ]
-                }]
-            ) as stream:
-                async for text in stream.text_stream:
-                    full_response_text += text
-                final_message = await stream.get_final_message()
-                input_tokens = final_message.usage.input_tokens
-                output_tokens = final_message.usage.output_tokens
-
-            elapsed = time.perf_counter() - start_time
-            result = parse_json_response(full_response_text)
-
-            # Steg 7: Uppdatera tabeller med resultat
-            fixed_tables = result.get("tables", [])
-            fixed_ids = {t.get("id") for t in fixed_tables}
-
-            # Ta bort gamla versioner av fixade tabeller
-            current_tables = [t for t in current_tables if t.get("id") not in fixed_ids]
-
-            # Lägg till fixade tabeller
-            current_tables.extend(fixed_tables)
-
-            # Beräkna kostnad (Sonnet-priser)
-            retry_cost = (input_tokens * SONNET_INPUT_PRICE + output_tokens * SONNET_OUTPUT_PRICE) / 1_000_000 * USD_TO_SEK
-
-            print(f"      [RETRY KLAR] {len(fixed_tables)}/{len(tables_to_fix)} tabeller fixade "
-                  f"({elapsed:.1f}s, {input_tokens:,}+{output_tokens:,} tokens, {retry_cost:.2f} SEK)", flush=True)
-
-            # Validera igen (med struktur för kolumnjämförelse)
-            final_validation = validate_tables(current_tables, structure_map)
-
-            retry_stats = {
-                "retry_count": 1,
-                "tables_retried": len(tables_to_fix),
-                "input_tokens": input_tokens,
-                "output_tokens": output_tokens,
-                "elapsed_seconds": round(elapsed, 2),
-                "cost_sek": round(retry_cost, 4),
-            }
+    try:
+        print(f"\n   [RETRY] Kör Sonnet för {len(tables_to_fix)} tabeller{pages_info}...", flush=True)
+
+        response_text, usage = await _create_message(client, semaphore, {
+            "model": SONNET_MODEL,
+            "max_tokens": 32000,
+            "messages": [{
+                "role": "user",
+                "content": [
+                    {
+                        "type": "document",
+                        "source": retry_source
+                    },
+                    {
+                        "type": "text",
+                        "text": prompt
+                    }
+                ]
+            }]
+        })
+        input_tokens = usage.input_tokens
+        output_tokens = usage.output_tokens
 
-            return current_tables, final_validation, retry_stats
+        elapsed = time.perf_counter() - start_time
+        result = parse_json_response(response_text)
 
-        except Exception as e:
-            elapsed = time.perf_counter() - start_time
-            print(f"   [VARNING] Sonnet retry misslyckades: {e}", flush=True)
-
-            retry_stats = {
-                "retry_count": 1,
-                "tables_retried": 0,
-                "input_tokens": 0,
-                "output_tokens": 0,
-                "elapsed_seconds": round(elapsed, 2),
-                "cost_sek": 0.0,
-            }
+        # Steg 7: Uppdatera tabeller med resultat
+        fixed_tables = result.get("tables", [])
+        fixed_ids = {t.get("id") for t in fixed_tables}
+
+        # Ta bort gamla versioner av fixade tabeller
+        current_tables = [t for t in current_tables if t.get("id") not in fixed_ids]
+
+        # Lägg till fixade tabeller
+        current_tables.extend(fixed_tables)
+
+        # Beräkna kostnad (Sonnet-priser)
+        sonnet_input_sek, sonnet_output_sek = SEK_PER_TOKEN["sonnet"]
+        retry_cost = input_tokens * sonnet_input_sek + output_tokens * sonnet_output_sek
+        if isinstance(semaphore, MessageBatcher):
+            retry_cost *= BATCH_API_MULTIPLIER
 
-            return current_tables, validation_result, retry_stats
+        print(f"      [RETRY KLAR] {len(fixed_tables)}/{len(tables_to_fix)} tabeller fixade "
+              f"({elapsed:.1f}s, {input_tokens:,}+{output_tokens:,} tokens, {retry_cost:.2f} SEK)", flush=True)
+
+        # Validera igen (med struktur för kolumnjämförelse)
+        final_validation = validate_tables(current_tables, structure_map)
+
+        retry_stats = {
+            "retry_count": 1,
+            "tables_retried": len(tables_to_fix),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "elapsed_seconds": round(elapsed, 2),
+            "cost_sek": round(retry_cost, 4),
+        }
+
+        return current_tables, final_validation, retry_stats
+
+    except Exception as e:
+        elapsed = time.perf_counter() - start_time
+        print(f"   [VARNING] Sonnet retry misslyckades: {e}", flush=True)
+
+        retry_stats = {
+            "retry_count": 1,
+            "tables_retried": 0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "elapsed_seconds": round(elapsed, 2),
+            "cost_sek": 0.0,
+        }
+
+        return current_tables, validation_result, retry_stats
 
 
 async def run_pass_3(
-    pdf_base64: str,
+    pdf_source: dict,
     structure_map: dict,
     client: AsyncAnthropic,
-    semaphore: asyncio.Semaphore,
+    semaphore: asyncio.Semaphore | RateLimiter | MessageBatcher,
 ) -> PassResult:
     """
     Pass 3: Textextraktion med Haiku.
@@ -679,6 +1119,8 @@ async def run_pass_3(
             model="haiku",
             input_tokens=0,
             output_tokens=0,
+            cache_creation_input_tokens=0,
+            cache_read_input_tokens=0,
             elapsed_seconds=0.0,
             data={"sections": [], "quotes": [], "contacts": [], "calendar": [], "footnotes": []}
         )
@@ -693,50 +1135,40 @@ async def run_pass_3(
         language=language
     )
 
-    async with semaphore:
-        # Använd streaming för att undvika timeout
-        full_response_text = ""
-        input_tokens = 0
-        output_tokens = 0
-
-        async with client.messages.stream(
-            model=HAIKU_MODEL,
-            max_tokens=32000,
-            messages=[{
-                "role": "user",
-                "content": [
-                    {
-                        "type": "document",
-                        "source": {
-                            "type": "base64",
-                            "media_type": "application/pdf",
-                            "data": pdf_base64
-                        }
-                    },
-                    {
-                        "type": "text",
-                        "text": prompt
-                    }
-                ]
-            }]
-        ) as stream:
-            async for text in stream.text_stream:
-                full_response_text += text
-            final_message = await stream.get_final_message()
-            input_tokens = final_message.usage.input_tokens
-            output_tokens = final_message.usage.output_tokens
-
-        result = parse_json_response(full_response_text)
-        elapsed = time.perf_counter() - start_time
-
-        return PassResult(
-            pass_number=3,
-            model="haiku",
-            input_tokens=input_tokens,
-            output_tokens=output_tokens,
-            elapsed_seconds=elapsed,
-            data=result
-        )
+    response_text, usage = await _create_message(client, semaphore, {
+        "model": HAIKU_MODEL,
+        "max_tokens": 32000,
+        "messages": [{
+            "role": "user",
+            "content": [
+                {
+                    "type": "document",
+                    "source": pdf_source,
+                    # Samma PDF-prefix i Pass 1 och 3 (Haiku) - Pass 3 läser från cache
+                    "cache_control": {"type": "ephemeral"}
+                },
+                {
+                    "type": "text",
+                    "text": prompt
+                }
+            ]
+        }]
+    })
+
+    result = parse_json_response(response_text)
+    elapsed = time.perf_counter() - start_time
+
+    return PassResult(
+        pass_number=3,
+        model="haiku",
+        input_tokens=usage.input_tokens,
+        output_tokens=usage.output_tokens,
+        cache_creation_input_tokens=usage.cache_creation_input_tokens or 0,
+        cache_read_input_tokens=usage.cache_read_input_tokens or 0,
+        elapsed_seconds=elapsed,
+        data=result,
+        batch_api=isinstance(semaphore, MessageBatcher),
+    )
 
 
 def merge_results(
@@ -773,12 +1205,14 @@ def merge_results(
 async def extract_pdf_multi_pass(
     pdf_path: str,
     client: AsyncAnthropic,
-    semaphore: asyncio.Semaphore,
+    semaphore: asyncio.Semaphore | RateLimiter | MessageBatcher,
     company_id: str,
     company_name: str,
     progress_callback: Callable[[str, str, dict | None], None] | None = None,
     use_cache: bool = True,
     base_folder: str | None = None,
+    period_hashes: dict[tuple[int, int], str | None] | None = None,
+    pdf_url: str | None = None,
 ) -> dict:
     """
     Multi-pass extraktion av en PDF.
@@ -792,31 +1226,48 @@ async def extract_pdf_multi_pass(
         progress_callback: Callback för progress
         use_cache: Om True, använd cachad data
         base_folder: Basmapp för rapporter (för filflyttning efter extraktion)
+        period_hashes: Förhämtade {(quarter, year): pdf_hash} för bolaget.
+            Om angivet görs ingen egen cache-query mot databasen.
+        pdf_url: Publik/signerad URL till samma PDF. Om angiven skickas URL:en
+            till Anthropic istället för base64 (lokala filen används ändå för
+            hash, retry-sidor och filflytt).
 
     Returns:
         Dict kompatibelt med excel_builder.py
     """
-    pdf_hash = get_pdf_hash(pdf_path)
     filename = Path(pdf_path).stem
 
+    # Hasha PDF:en lat - bara när hashen faktiskt behövs
+    _pdf_hash: str | None = None
+
+    async def pdf_hash() -> str:
+        nonlocal _pdf_hash
+        if _pdf_hash is None:
+            _pdf_hash = await asyncio.to_thread(get_pdf_hash_cached, pdf_path)
+        return _pdf_hash
+
     # Cache-kontroll
     if use_cache:
         # Stöd både "q1-2025" och "2025-q1" format
-        period_match = re.search(r'[qQ](\d)[_-]?(\d{4})', filename)
+        period_match = _PERIOD_RE.search(filename)
         if period_match:
             quarter = int(period_match.group(1))
             year = int(period_match.group(2))
         else:
             # Alternativt format: 2025-q1
-            period_match = re.search(r'(\d{4})[_-]?[qQ](\d)', filename)
+            period_match = _PERIOD_YEAR_FIRST_RE.search(filename)
             if period_match:
                 year = int(period_match.group(1))
                 quarter = int(period_match.group(2))
         if period_match:
-            if period_exists(company_id, quarter, year, pdf_hash):
+            if period_hashes is not None:
+                stored_hash = period_hashes.get((quarter, year))
+            else:
+                stored_hash = await asyncio.to_thread(get_period_hash, company_id, quarter, year)
+            if stored_hash and stored_hash == await pdf_hash():
                 if progress_callback:
                     progress_callback(pdf_path, "cached", None)
-                data = load_period(company_id, quarter, year)
+                data = await asyncio.to_thread(load_period, company_id, quarter, year)
                 if data:
                     data["_source_file"] = str(pdf_path)
                     return data
@@ -824,9 +1275,19 @@ async def extract_pdf_multi_pass(
     if progress_callback:
         progress_callback(pdf_path, "extracting", None)
 
-    # Läs PDF
-    pdf_bytes = Path(pdf_path).read_bytes()
-    pdf_base64 = base64.standard_b64encode(pdf_bytes).decode()
+    # PDF-källa: URL (Anthropic hämtar filen själv) eller base64 av lokal fil
+    if pdf_url:
+        pdf_source = {"type": "url", "url": pdf_url}
+    else:
+        # Läs, koda och hasha PDF i ett svep utanför event-loopen
+        pdf_data, file_hash = await asyncio.to_thread(_encode_pdf_base64, pdf_path)
+        if _pdf_hash is None:
+            _pdf_hash = file_hash
+        pdf_source = {
+            "type": "base64",
+            "media_type": "application/pdf",
+            "data": pdf_data,
+        }
 
     last_error = None
     for attempt in range(MAX_RETRIES):
@@ -837,7 +1298,7 @@ async def extract_pdf_multi_pass(
             if progress_callback:
                 progress_callback(pdf_path, "pass_1", None)
 
-            pass_1 = await run_pass_1(pdf_base64, client, semaphore)
+            pass_1 = await run_pass_1(pdf_source, client, semaphore)
             p1_cost = calculate_pass_cost(pass_1)
             print(f"   Pass 1 (Haiku):  {pass_1['elapsed_seconds']:.1f}s | "
                   f"{pass_1['input_tokens']:,}+{pass_1['output_tokens']:,} tokens | "
@@ -848,10 +1309,10 @@ async def extract_pdf_multi_pass(
                 progress_callback(pdf_path, "pass_2_3", None)
 
             pass_2_task = asyncio.create_task(
-                run_pass_2(pdf_base64, pass_1["data"], client, semaphore)
+                run_pass_2(pdf_source, pass_1["data"], client, semaphore)
             )
             pass_3_task = asyncio.create_task(
-                run_pass_3(pdf_base64, pass_1["data"], client, semaphore)
+                run_pass_3(pdf_source, pass_1["data"], client, semaphore)
             )
 
             pass_2, pass_3 = await asyncio.gather(pass_2_task, pass_3_task)
@@ -863,7 +1324,9 @@ async def extract_pdf_multi_pass(
                   f"{p2_cost:.2f} SEK", flush=True)
             print(f"   Pass 3 (Haiku):  {pass_3['elapsed_seconds']:.1f}s | "
                   f"{pass_3['input_tokens']:,}+{pass_3['output_tokens']:,} tokens | "
-                  f"{p3_cost:.2f} SEK", flush=True)
+                  f"{p3_cost:.2f} SEK"
+                  + (f" | cache: {pass_3['cache_read_input_tokens']:,}" if pass_3['cache_read_input_tokens'] else ""),
+                  flush=True)
 
             # === VALIDERING & RETRY (Sonnet med sidextraktion) ===
             if progress_callback:
@@ -871,7 +1334,7 @@ async def extract_pdf_multi_pass(
 
             tables = pass_2["data"].get("tables", [])
             validated_tables, validation_result, retry_stats = await validate_and_retry_with_sonnet(
-                pdf_bytes, tables, pass_1["data"], client, semaphore
+                str(pdf_path), tables, pass_1["data"], client, semaphore, pdf_source
             )
 
             # Uppdatera pass_2 med validerade tabeller
@@ -889,27 +1352,29 @@ async def extract_pdf_multi_pass(
             retry_count = retry_stats['retry_count']
             tables_fixed = retry_stats['tables_retried']
 
-            print(f"\n   [VALIDERING]", flush=True)
+            report = ["\n   [VALIDERING]"]
 
             # Tabeller
             if error_count == 0 and retry_count == 0:
-                print(f"      Tabeller: {table_count} st - OK", flush=True)
+                report.append(f"      Tabeller: {table_count} st - OK")
             elif error_count == 0 and retry_count > 0:
-                print(f"      Tabeller: {table_count} st - OK ({tables_fixed} fixade efter {retry_count} retry)", flush=True)
+                report.append(f"      Tabeller: {table_count} st - OK ({tables_fixed} fixade efter {retry_count} retry)")
             else:
-                print(f"      Tabeller: {table_count} st - {error_count} FEL kvarstar", flush=True)
+                report.append(f"      Tabeller: {table_count} st - {error_count} FEL kvarstar")
                 for e in validation_result.errors:
-                    print(f"         [FEL] {e.table_title}: {e.message}", flush=True)
+                    report.append(f"         [FEL] {e.table_title}: {e.message}")
 
             if warning_count > 0:
-                print(f"      Varningar: {warning_count} minor (paverkar ej data)", flush=True)
+                report.append(f"      Varningar: {warning_count} minor (paverkar ej data)")
 
             # Sections
             section_warning_count = len(section_validation.warnings) if section_validation.has_warnings else 0
             if section_warning_count == 0:
-                print(f"      Sections: {section_count} st - OK", flush=True)
+                report.append(f"      Sections: {section_count} st - OK")
             else:
-                print(f"      Sections: {section_count} st - {section_warning_count} varningar (minor)", flush=True)
+                report.append(f"      Sections: {section_count} st - {section_warning_count} varningar (minor)")
+
+            _print_block(report)
 
             # Kombinera resultat
             result = merge_results(pass_1, pass_2, pass_3)
@@ -955,6 +1420,7 @@ async def extract_pdf_multi_pass(
                             "model": p["model"],
                             "input_tokens": p["input_tokens"],
                             "output_tokens": p["output_tokens"],
+                            "cache_read_input_tokens": p.get("cache_read_input_tokens", 0),
                             "elapsed_seconds": round(p["elapsed_seconds"], 2),
                             "cost_sek": round(calculate_pass_cost(p), 4)
                         }
@@ -1007,11 +1473,14 @@ async def extract_pdf_multi_pass(
             total_input = sum(p["input_tokens"] for p in result["pass_info"]) + retry_stats["input_tokens"]
             total_output = sum(p["output_tokens"] for p in result["pass_info"]) + retry_stats["output_tokens"]
 
-            print(f"\n   --- {filename} KLAR ---")
-            print(f"   Tid: {total_elapsed:.1f}s | Tokens: {total_input:,}+{total_output:,} | Kostnad: {total_cost_with_retries:.2f} SEK")
+            summary = [
+                f"\n   --- {filename} KLAR ---",
+                f"   Tid: {total_elapsed:.1f}s | Tokens: {total_input:,}+{total_output:,} | Kostnad: {total_cost_with_retries:.2f} SEK",
+            ]
             if retry_stats["retry_count"] > 0:
-                print(f"   Retry (Sonnet): {retry_stats['tables_retried']} tabeller ({retry_stats['cost_sek']:.2f} SEK)")
-            print(f"   Tabeller: {len(result['tables'])} | Sektioner: {len(result['sections'])} | Grafer: {len(result['charts'])}")
+                summary.append(f"   Retry (Sonnet): {retry_stats['tables_retried']} tabeller ({retry_stats['cost_sek']:.2f} SEK)")
+            summary.append(f"   Tabeller: {len(result['tables'])} | Sektioner: {len(result['sections'])} | Grafer: {len(result['charts'])}")
+            _print_block(summary)
 
             # Samla alla fel för explicit loggning
             all_errors = []
@@ -1047,7 +1516,7 @@ async def extract_pdf_multi_pass(
                 })
 
             # Spara till Supabase med atomisk sparning (async för att inte blockera)
-            period_id, section_ids = await save_period_atomic_async(company_id, output, pdf_hash, str(pdf_path))
+            period_id, section_ids = await save_period_atomic_async(company_id, output, await pdf_hash(), str(pdf_path))
 
             # Generera embeddings med explicit felhantering (async för att inte blockera)
             embeddings_count = 0
@@ -1078,8 +1547,9 @@ async def extract_pdf_multi_pass(
                         final_status = "partial"
                     print(f"   [EMBEDDING] Kunde inte generera embeddings: {emb_err}")
 
-            # Uppdatera slutstatus
-            update_period_status(
+            # Uppdatera slutstatus (utanför event-loopen)
+            await asyncio.to_thread(
+                update_period_status,
                 period_id,
                 status=final_status,
                 errors=all_errors if all_errors else None,
@@ -1094,10 +1564,14 @@ async def extract_pdf_multi_pass(
             # Flytta fil och uppdatera logg (om base_folder är satt)
             if base_folder:
                 try:
-                    process_extraction_complete(pdf_path, company_name, base_folder)
+                    await asyncio.to_thread(_process_extraction_complete_locked, pdf_path, company_name, base_folder)
                 except Exception as log_err:
                     print(f"   [VARNING] Kunde inte flytta/logga: {log_err}")
 
+            # Återställ samtidigheten stegvis efter en sänkning vid 429
+            if isinstance(semaphore, RateLimiter) and semaphore.limit < semaphore.max_concurrent:
+                await semaphore.set_limit(semaphore.limit + 1)
+
             if progress_callback:
                 progress_callback(pdf_path, "done", {
                     "input_tokens": total_input,
@@ -1109,11 +1583,22 @@ async def extract_pdf_multi_pass(
 
         except Exception as e:
             last_error = e
-            if attempt < MAX_RETRIES - 1:
+            if attempt < MAX_RETRIES - 1 and _is_retryable(e):
                 print(f"\n[VARNING] Fel vid extraktion av {filename}:")
                 print(f"   {type(e).__name__}: {e}")
                 print(f"   Retry {attempt + 1}/{MAX_RETRIES}...")
-                wait_time = 2 ** attempt
+                # Exponentiell backoff med jitter så att parallella PDFs inte krockar igen
+                wait_time = round(2 ** attempt + random.random(), 1)
+                if isinstance(e, RateLimitError):
+                    retry_after = _retry_after_seconds(e)
+                    if retry_after is not None:
+                        wait_time = max(wait_time, round(retry_after + random.uniform(0, 0.5), 1))
+                        if isinstance(semaphore, RateLimiter):
+                            semaphore.pause(retry_after)
+                    if isinstance(semaphore, RateLimiter):
+                        # Halvera samtidigheten tills anropen lyckas igen
+                        await semaphore.set_limit(semaphore.limit // 2)
+                        print(f"   [RATE LIMIT] Max samtidiga anrop: {semaphore.limit}")
                 print(f"   Väntar {wait_time}s innan retry...")
                 await asyncio.sleep(wait_time)
             else:
@@ -1124,7 +1609,7 @@ async def extract_pdf_multi_pass(
     raise last_error  # type: ignore
 
 
-async def extract_all_pdfs_multi_pass(
+async def iter_pdfs_multi_pass(
     pdf_paths: list[str],
     company_name: str,
     on_progress: Callable[[str, str], None] | None = None,
@@ -1133,25 +1618,19 @@ async def extract_all_pdfs_multi_pass(
     batch_id: str | None = None,
     resume: bool = True,
     quiet: bool = False,
-) -> tuple[list[dict], list[tuple[str, Exception]]]:
+    use_batch_api: bool = False,
+) -> AsyncIterator[tuple[str, dict | tuple[str, Exception]]]:
     """
-    Multi-pass extraktion av alla PDFs med batch-processning och checkpointing.
+    Multi-pass extraktion av alla PDFs, resultat strömmas ut i den ordning de blir klara.
 
-    Processerar PDFs i batchar om BATCH_SIZE för att kontrollera minnesanvändning.
+    Processerar PDFs i ett glidande fönster om BATCH_SIZE (BATCH_API_WINDOW i batch-läge)
+    för att kontrollera minnesanvändning.
     Sparar progress efter varje fil för att möjliggöra återstart vid avbrott.
+    Argumenten är desamma som för extract_all_pdfs_multi_pass.
 
-    Args:
-        pdf_paths: Lista med sökvägar till PDF-filer
-        company_name: Bolagsnamn för datalagring
-        on_progress: Callback för progress-uppdateringar
-        use_cache: Om True, använd cachad data från databasen
-        base_folder: Basmapp för rapporter (för filflyttning efter extraktion)
-        batch_id: Unikt ID för denna batch (genereras automatiskt om None)
-        resume: Om True, skippa redan processade filer från tidigare körning
-        quiet: Om True, undertryck progress-utskrifter (använd med progress-tracker)
-
-    Returns:
-        Tuple av (lyckade resultat, misslyckade med fel)
+    Yields:
+        Tuple av (sökväg, resultat) där resultat är extraherad data (dict)
+        eller (sökväg, exception) vid fel
     """
     import gc
 
@@ -1187,7 +1666,7 @@ async def extract_all_pdfs_multi_pass(
     if not remaining_paths:
         if not quiet:
             print(f"\n[CHECKPOINT] Alla {len(pdf_paths)} filer redan processade!")
-        return [], []
+        return
 
     # Initiera checkpoint med total count
     save_checkpoint(
@@ -1197,74 +1676,145 @@ async def extract_all_pdfs_multi_pass(
         total_files=len(pdf_paths)
     )
 
-    client = AsyncAnthropic(api_key=api_key, timeout=API_TIMEOUT)
-    semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+    # Hämta alla sparade hashar med en query istället för en per PDF
+    period_hashes = get_period_hashes(company_id) if use_cache else None
 
-    all_successful: list[dict] = []
-    all_failed: list[tuple[str, Exception]] = []
+    # Egen klient för körningen - stängs i finally så att poolen inte lämnas
+    # öppen när asyncio.run (en ny loop per extraktion i main.py) avslutas
+    client = create_anthropic_client(api_key)
+    if use_batch_api:
+        # Anropen samlas i batcher - fler PDFs i arbete, längre väntetid per PDF
+        semaphore = MessageBatcher(client)
+        window_size, timeout = BATCH_API_WINDOW, BATCH_API_TIMEOUT
+    else:
+        semaphore = RateLimiter(MAX_CONCURRENT)
+        window_size, timeout = BATCH_SIZE, BATCH_TIMEOUT
 
     async def safe_extract(path: str) -> dict | tuple[str, Exception]:
         """Wrapper som fångar fel istället för att krascha"""
         try:
             return await extract_pdf_multi_pass(
                 path, client, semaphore, company_id, company_name,
-                on_progress, use_cache, base_folder
+                on_progress, use_cache, base_folder, period_hashes
             )
         except Exception as e:
             return (path, e)
 
-    # Processa i batchar för minneskontroll
-    total_batches = (len(remaining_paths) + BATCH_SIZE - 1) // BATCH_SIZE
-    if not quiet:
-        print(f"\n[BATCH] Processerar {len(remaining_paths)} filer i {total_batches} batchar à {BATCH_SIZE}")
-
-    for batch_num, i in enumerate(range(0, len(remaining_paths), BATCH_SIZE), 1):
-        batch = remaining_paths[i:i + BATCH_SIZE]
-        if not quiet:
-            print(f"\n[BATCH {batch_num}/{total_batches}] Startar {len(batch)} filer...")
-
-        # Kör denna batch parallellt med timeout
+    async def run_one(path: str) -> tuple[str, dict | tuple[str, Exception]]:
         try:
-            results = await asyncio.wait_for(
-                asyncio.gather(*[safe_extract(p) for p in batch]),
-                timeout=BATCH_TIMEOUT
-            )
+            result = await asyncio.wait_for(safe_extract(path), timeout=timeout)
         except asyncio.TimeoutError:
             if not quiet:
-                print(f"   [TIMEOUT] Batch {batch_num} tog över {BATCH_TIMEOUT}s - markerar som misslyckade")
-            for path in batch:
-                all_failed.append((path, TimeoutError(f"Batch timeout efter {BATCH_TIMEOUT}s")))
-                add_failed_file(batch_id, str(path), f"Batch timeout efter {BATCH_TIMEOUT}s", len(pdf_paths))
-            continue
-
-        # Processa resultat och uppdatera checkpoint
-        for path, result in zip(batch, results):
-            if isinstance(result, dict):
-                all_successful.append(result)
-                add_completed_file(batch_id, str(path), len(pdf_paths))
-            else:
-                # result är tuple (path, exception)
-                all_failed.append(result)
-                _, error = result
-                add_failed_file(batch_id, str(path), str(error), len(pdf_paths))
+                print(f"   [TIMEOUT] {Path(path).name} tog över {timeout}s - markerar som misslyckad")
+            result = (path, TimeoutError(f"Timeout efter {timeout}s"))
+        return path, result
 
-        # Progress-rapport
-        completed, failed, total = get_batch_progress(batch_id)
-        if not quiet:
-            print(f"   Progress: {completed}/{total} klara, {failed} misslyckade")
-
-        # Explicit minnesrensning mellan batchar
-        gc.collect()
+    if not quiet:
+        print(f"\n[BATCH] Processerar {len(remaining_paths)} filer, max {window_size} åt gången"
+              + (" (Message Batches API)" if use_batch_api else ""))
+
+    # Glidande fönster: högst window_size PDFs i arbete (och i minnet) samtidigt.
+    # Nästa fil startar så fort en plats blir ledig, och varje resultat lämnas
+    # ut direkt istället för att vänta på den långsammaste filen.
+    queued = iter(remaining_paths)
+    pending: set[asyncio.Task] = set()
+    processed = succeeded = 0
+
+    def fill_window() -> None:
+        for path in queued:
+            pending.add(asyncio.create_task(run_one(path)))
+            if len(pending) >= window_size:
+                break
 
-        # Kort paus mellan batchar för att undvika rate limits
-        if i + BATCH_SIZE < len(remaining_paths):
-            await asyncio.sleep(2)
+    try:
+        fill_window()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                path, result = task.result()
+
+                # Uppdatera checkpoint direkt när en fil är klar (filskrivning utanför event-loopen)
+                if isinstance(result, dict):
+                    succeeded += 1
+                    await asyncio.to_thread(add_completed_file, batch_id, str(path), len(pdf_paths))
+                else:
+                    # result är tuple (path, exception)
+                    _, error = result
+                    await asyncio.to_thread(add_failed_file, batch_id, str(path), str(error), len(pdf_paths))
+
+                processed += 1
+                if processed % window_size == 0 or processed == len(remaining_paths):
+                    # Progress-rapport
+                    completed, failed, total = get_batch_progress(batch_id)
+                    if not quiet:
+                        print(f"   Progress: {completed}/{total} klara, {failed} misslyckade")
+
+                    # Explicit minnesrensning
+                    gc.collect()
+
+                yield path, result
+            fill_window()
+    finally:
+        # Konsumenten avbröt i förtid - stoppa pågående extraktioner
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await client.close()
 
     # Slutrapport
     if not quiet:
         print(f"\n[KLAR] Batch {batch_id} färdig:")
-        print(f"   Lyckade: {len(all_successful)}")
-        print(f"   Misslyckade: {len(all_failed)}")
+        print(f"   Lyckade: {succeeded}")
+        print(f"   Misslyckade: {processed - succeeded}")
+
+
+async def extract_all_pdfs_multi_pass(
+    pdf_paths: list[str],
+    company_name: str,
+    on_progress: Callable[[str, str], None] | None = None,
+    use_cache: bool = True,
+    base_folder: str | None = None,
+    batch_id: str | None = None,
+    resume: bool = True,
+    quiet: bool = False,
+    use_batch_api: bool = False,
+) -> tuple[list[dict], list[tuple[str, Exception]]]:
+    """
+    Multi-pass extraktion av alla PDFs med batch-processning och checkpointing.
+
+    Samlar resultaten från iter_pdfs_multi_pass i ursprunglig filordning.
+
+    Args:
+        pdf_paths: Lista med sökvägar till PDF-filer
+        company_name: Bolagsnamn för datalagring
+        on_progress: Callback för progress-uppdateringar
+        use_cache: Om True, använd cachad data från databasen
+        base_folder: Basmapp för rapporter (för filflyttning efter extraktion)
+        batch_id: Unikt ID för denna batch (genereras automatiskt om None)
+        resume: Om True, skippa redan processade filer från tidigare körning
+        quiet: Om True, undertryck progress-utskrifter (använd med progress-tracker)
+        use_batch_api: Om True, skicka anropen via Message Batches API (halva
+            priset, men svaren kan dröja upp till 24h per pass)
+
+    Returns:
+        Tuple av (lyckade resultat, misslyckade med fel)
+    """
+    outcomes: dict[str, dict | tuple[str, Exception]] = {}
+    async for path, result in iter_pdfs_multi_pass(
+        pdf_paths, company_name, on_progress, use_cache, base_folder, batch_id, resume, quiet,
+        use_batch_api,
+    ):
+        outcomes[str(path)] = result
+
+    # Behåll ursprunglig filordning i resultaten
+    all_successful: list[dict] = []
+    all_failed: list[tuple[str, Exception]] = []
+    for path in pdf_paths:
+        result = outcomes.get(str(path))
+        if isinstance(result, dict):
+            all_successful.append(result)
+        elif result is not None:
+            all_failed.append(result)
 
     return all_successful, all_failed
 
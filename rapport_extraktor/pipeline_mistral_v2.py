@@ -35,7 +35,7 @@ load_dotenv()
 from supabase_client import (
     save_period_atomic_async,
     update_period_status,
-    get_pdf_hash,
+    get_pdf_hash_cached,
     period_exists,
     load_period,
     slugify,
@@ -1097,6 +1097,7 @@ async def extract_pdf_mistral_v2(
     use_cache: bool = True,
     base_folder: str | None = None,
     quiet: bool = False,
+    pdf_hash: str | None = None,
 ) -> dict:
     """
     Extrahera data från PDF med sidvis bearbetning och annotations.
@@ -1111,13 +1112,15 @@ async def extract_pdf_mistral_v2(
         use_cache: Använd cache om PDF redan extraherats
         base_folder: Basmapp för fillagring
         quiet: Undertryck utskrifter
+        pdf_hash: Redan beräknad hash (get_pdf_hash_cached) - annars beräknas den här
 
     Returns:
         Dict med extraherad data
     """
     import re
 
-    pdf_hash = get_pdf_hash(pdf_path)
+    if pdf_hash is None:
+        pdf_hash = get_pdf_hash_cached(pdf_path)
     filename = Path(pdf_path).stem
     company_slug = slugify(company_name) if company_name else "unknown"
 
@@ -4,9 +4,12 @@ Hanterar bolag, perioder och finansiell data.
 """
 
 import asyncio
+import functools
 import hashlib
 import os
 import re
+import sqlite3
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
@@ -20,11 +23,27 @@ from logger import get_logger, log_embedding_progress
 # Thread pool för parallella DB-operationer
 _db_executor = ThreadPoolExecutor(max_workers=4)
 
+# Antal perioder som laddas samtidigt i load_all_periods
+LOAD_WORKERS = 8
+
+# Radgräns per sida vid listning av perioder (PostgREST max-rows är 1000 på Supabase)
+PERIOD_PAGE_SIZE = 1000
+
 # Ladda miljövariabler
 load_dotenv()
 
 # Supabase-klient (lazy initialization)
 _client: Client | None = None
+_client_lock = threading.Lock()
+
+# Lokal hash-cache (sökväg, storlek, mtime) -> pdf_hash, delas mellan körningar
+HASH_CACHE_PATH = Path(os.getenv("XDG_CACHE_HOME") or Path.home() / ".cache") / "rapport_extraktor" / "hash.sqlite"
+_hash_cache: sqlite3.Connection | None = None
+_hash_cache_lock = threading.Lock()
+
+# Förkompilerade regex för slugify
+_SLUG_STRIP_RE = re.compile(r'[^\w\s-]')
+_SLUG_DASH_RE = re.compile(r'[\s_-]+')
 
 # Voyage API för embeddings
 VOYAGE_API_KEY = os.getenv("VOYAGE_API_KEY")
@@ -54,12 +73,17 @@ def get_client() -> Client:
     Hämta eller skapa Supabase-klient med connection pooling.
 
     Använder lazy initialization med singleton-pattern för att
-    återanvända connections mellan anrop.
+    återanvända connections mellan anrop. Klientens httpx-session håller
+    anslutningarna vid liv (keep-alive), så TLS-handskakningen görs bara
+    en gång. Låset gör att parallella trådar (t.ex. regenerate_all_logs)
+    delar samma klient istället för att skapa varsin.
     """
     global _client
     if _client is None:
-        _client = _create_pooled_client()
-        print("   [DB] Supabase-klient skapad")
+        with _client_lock:
+            if _client is None:
+                _client = _create_pooled_client()
+                print("   [DB] Supabase-klient skapad")
     return _client
 
 
@@ -71,11 +95,12 @@ def reset_client() -> None:
     efter en stor batch-körning.
     """
     global _client
-    if _client is not None:
-        # Supabase-klienten har ingen explicit close-metod,
-        # men vi kan släppa referensen så GC kan städa
-        _client = None
-        print("   [DB] Supabase-klient återställd")
+    with _client_lock:
+        if _client is not None:
+            # Supabase-klienten har ingen explicit close-metod,
+            # men vi kan släppa referensen så GC kan städa
+            _client = None
+            print("   [DB] Supabase-klient återställd")
 
 
 def check_database_setup() -> tuple[bool, str]:
@@ -128,19 +153,96 @@ def verify_or_exit():
     return True
 
 
+@functools.lru_cache(maxsize=256)
 def slugify(name: str) -> str:
-    """Konvertera bolagsnamn till URL-vänlig slug."""
+    """Konvertera bolagsnamn till URL-vänlig slug (cachad - få unika bolagsnamn per körning)."""
     slug = name.lower().strip()
-    slug = re.sub(r'[^\w\s-]', '', slug)  # Ta bort specialtecken
-    slug = re.sub(r'[\s_-]+', '-', slug)  # Ersätt mellanslag med bindestreck
+    slug = _SLUG_STRIP_RE.sub('', slug)  # Ta bort specialtecken
+    slug = _SLUG_DASH_RE.sub('-', slug)  # Ersätt mellanslag med bindestreck
     slug = slug.strip('-')
     return slug
 
 
 def get_pdf_hash(pdf_path: str) -> str:
-    """Generera hash av PDF-innehåll för cache-validering."""
-    pdf_bytes = Path(pdf_path).read_bytes()
-    return hashlib.md5(pdf_bytes).hexdigest()[:12]
+    """
+    Generera hash av PDF-innehåll för cache-validering.
+
+    Strömmar filen genom hashlib.file_digest istället för att läsa in hela
+    PDF:en i minnet. Algoritmen (md5, 12 tecken) måste vara oförändrad
+    eftersom hashen lagras i periods.pdf_hash.
+    """
+    with open(pdf_path, "rb") as f:
+        return hashlib.file_digest(f, "md5").hexdigest()[:12]
+
+
+def get_pdf_hash_from_buffer(data) -> str:
+    """Samma hash som get_pdf_hash, för PDF-innehåll som redan finns i minnet (bytes/mmap)."""
+    return hashlib.md5(data).hexdigest()[:12]
+
+
+def _get_hash_cache() -> sqlite3.Connection | None:
+    """Öppna hash-cachen (lazy). None om den inte kan skapas, t.ex. skrivskyddad home."""
+    global _hash_cache
+    if _hash_cache is None:
+        try:
+            HASH_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(HASH_CACHE_PATH, check_same_thread=False)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pdf_file_hash "
+                "(path TEXT PRIMARY KEY, dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, hash TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_pdf_file_hash_inode ON pdf_file_hash (dev, ino)")
+            _hash_cache = conn
+        except (OSError, sqlite3.Error):
+            return None
+    return _hash_cache
+
+
+def get_pdf_hash_cached(pdf_path: str) -> str:
+    """
+    Som get_pdf_hash, men återanvänder hashen från en lokal sqlite-cache
+    så länge filens storlek och mtime är oförändrade.
+
+    Filen känns igen på (enhet, inode) när filsystemet har inoder, så en
+    PDF som flyttats (t.ex. skall_extractas -> ligger_i_databasen) eller
+    nås via symlänk behöver inte hashas om.
+    """
+    path = os.path.abspath(pdf_path)
+    stat = os.stat(path)
+
+    with _hash_cache_lock:
+        cache = _get_hash_cache()
+        if cache is not None:
+            try:
+                if stat.st_ino:
+                    row = cache.execute(
+                        "SELECT hash FROM pdf_file_hash WHERE dev = ? AND ino = ? AND size = ? AND mtime_ns = ?",
+                        (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns),
+                    ).fetchone()
+                else:
+                    row = cache.execute(
+                        "SELECT hash FROM pdf_file_hash WHERE path = ? AND size = ? AND mtime_ns = ?",
+                        (path, stat.st_size, stat.st_mtime_ns),
+                    ).fetchone()
+                if row:
+                    return row[0]
+            except sqlite3.Error:
+                cache = None
+
+    file_hash = get_pdf_hash(path)
+
+    if cache is not None:
+        with _hash_cache_lock:
+            try:
+                cache.execute(
+                    "INSERT OR REPLACE INTO pdf_file_hash (path, dev, ino, size, mtime_ns, hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (path, stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns, file_hash),
+                )
+                cache.commit()
+            except sqlite3.Error:
+                pass
+    return file_hash
 
 
 # === BOLAG ===
@@ -206,6 +308,30 @@ def period_exists(company_id: str, quarter: int, year: int, pdf_hash: str | None
     return True
 
 
+def get_period_hash(company_id: str, quarter: int, year: int) -> str | None:
+    """
+    Hämta sparad pdf_hash för en period (None om perioden saknas).
+    Låter anroparen hasha PDF:en först när det finns något att jämföra mot.
+    """
+    client = get_client()
+    result = client.table("periods").select("pdf_hash").eq(
+        "company_id", company_id
+    ).eq("quarter", quarter).eq("year", year).limit(1).execute()
+    return result.data[0].get("pdf_hash") if result.data else None
+
+
+def get_period_hashes(company_id: str) -> dict[tuple[int, int], str | None]:
+    """
+    Hämta sparade pdf_hash för alla perioder i ett bolag med en query.
+    Returnerar {(quarter, year): pdf_hash} för batch-kontroll av cache.
+    """
+    client = get_client()
+    result = client.table("periods").select("quarter, year, pdf_hash").eq(
+        "company_id", company_id
+    ).execute()
+    return {(r["quarter"], r["year"]): r.get("pdf_hash") for r in result.data or []}
+
+
 def get_period(company_id: str, quarter: int, year: int) -> dict | None:
     """Hämta en specifik period."""
     client = get_client()
@@ -732,13 +858,50 @@ def load_all_periods(company_id: str) -> list[dict]:
         "company_id", company_id
     ).order("year").order("quarter").execute()
 
-    results = []
-    for p in periods.data:
-        data = load_period(company_id, p["quarter"], p["year"])
-        if data:
-            results.append(data)
+    if not periods.data:
+        return []
 
-    return results
+    # Varje period kräver flera queries - ladda dem parallellt, ordningen behålls
+    with ThreadPoolExecutor(max_workers=min(len(periods.data), LOAD_WORKERS)) as executor:
+        results = executor.map(
+            lambda p: load_period(company_id, p["quarter"], p["year"]),
+            periods.data,
+        )
+        return [data for data in results if data]
+
+
+def list_periods_by_company(company_ids: list[str]) -> dict[str, list[str]]:
+    """
+    Hämta periodnamn för flera bolag i en gemensam query.
+    Används för bolagslistan så att inte varje bolag kräver egna rundresor.
+    Hämtas sidvis om PERIOD_PAGE_SIZE, eftersom PostgREST annars kapar
+    svaret tyst vid max-rows.
+
+    Returns:
+        Dict company_id -> periodnamn ("Q1 2025") sorterade kronologiskt
+    """
+    if not company_ids:
+        return {}
+
+    client = get_client()
+    grouped: dict[str, list[str]] = {company_id: [] for company_id in company_ids}
+
+    start = 0
+    while True:
+        # Fullständig sortering (id sist) så att sidorna inte överlappar
+        result = client.table("periods").select("id, company_id, quarter, year").in_(
+            "company_id", company_ids
+        ).order("year").order("quarter").order("id").range(
+            start, start + PERIOD_PAGE_SIZE - 1
+        ).execute()
+        rows = result.data or []
+
+        for row in rows:
+            grouped.setdefault(row["company_id"], []).append(f"Q{row['quarter']} {row['year']}")
+
+        if len(rows) < PERIOD_PAGE_SIZE:
+            return grouped
+        start += PERIOD_PAGE_SIZE
 
 
 # === SECTIONS OCH TABLES (FULL EXTRAKTION) ===
@@ -111,7 +111,21 @@ def validate_table(table: dict) -> list[ValidationError]:
 
     Returnerar lista med fel (tom om allt är OK).
     """
+    return _validate_table_rows(table)[0]
+
+
+def _validate_table_rows(table: dict) -> tuple[list[ValidationError], int, int]:
+    """
+    Radvalidering för validate_table i en enda loop över raderna.
+
+    Räknar samtidigt dataceller för datakomplethet (validate_tables) så att
+    raderna inte behöver gås igenom två gånger.
+
+    Returnerar (fel, antal dataceller, antal icke-null dataceller).
+    """
     errors = []
+    total_data_cells = 0
+    non_null_cells = 0
     table_id = table.get("id", "unknown")
     table_title = table.get("title", "Okänd tabell")
     columns = table.get("columns", [])
@@ -125,7 +139,7 @@ def validate_table(table: dict) -> list[ValidationError]:
             error_type="empty_table",
             message=f"Tabellen har inga rader"
         ))
-        return errors  # Ingen mening att fortsätta om inga rader finns
+        return errors, 0, 0  # Ingen mening att fortsätta om inga rader finns
 
     num_columns = len(columns)
 
@@ -185,7 +199,15 @@ def validate_table(table: dict) -> list[ValidationError]:
                     severity="warning"
                 ))
 
-    return errors
+            # Datakomplethet: en rad med bara ett värde räknas i sin helhet
+            if len(values) > 1:
+                total_data_cells += len(data_values)
+                non_null_cells += non_null_count
+            else:
+                total_data_cells += len(values)
+                non_null_cells += sum(1 for v in values if v is not None)
+
+    return errors, total_data_cells, non_null_cells
 
 
 def validate_tables(tables: list[dict], structure_map: dict | None = None) -> ValidationResult:
@@ -238,8 +260,8 @@ def validate_tables(tables: list[dict], structure_map: dict | None = None) -> Va
         rows = table.get("rows", [])
         columns = table.get("columns", [])
 
-        # Grundläggande validering (labels, values-längd, etc.)
-        errors = validate_table(table)
+        # Grundläggande validering (labels, values-längd, etc.) + datacellsräkning
+        errors, total_data_cells, non_null_cells = _validate_table_rows(table)
 
         # Hämta Pass 1-data om tillgänglig
         pass1_table = pass1_tables.get(table_id, {})
@@ -276,23 +298,8 @@ def validate_tables(tables: list[dict], structure_map: dict | None = None) -> Va
         # VALIDERING 3: DATAKOMPLETHET
         # Minst 50% av datacellerna ska ha värden (inte null)
         # ======================================================================
+        # (cellerna räknades redan i _validate_table_rows, header-rader exkluderade)
         if rows and columns:
-            total_data_cells = 0
-            non_null_cells = 0
-
-            for row in rows:
-                row_type = row.get("type", "data")
-                # Skippa header-rader från datakomplethet
-                if row_type == "header":
-                    continue
-
-                values = row.get("values", [])
-                # Exkludera label-kolumnen (första värdet som alltid är null)
-                data_values = values[1:] if len(values) > 1 else values
-
-                total_data_cells += len(data_values)
-                non_null_cells += sum(1 for v in data_values if v is not None)
-
             if total_data_cells > 0:
                 data_ratio = non_null_cells / total_data_cells
 